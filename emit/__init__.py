@@ -1,21 +1,22 @@
 from .globals import conf, Config, ConfigDescriptor
 from .event import Event
 from .adapters import Adapter
-from .transports import Transport, Worker, ThreadedWorker
+from .transports import Transport, Worker, ThreadedWorker, ProcessWorker, WorkerPool
 from .emitters import Emitter
 from . import (
     adapters, decorators, emitters, logger,
-    event, queue, transports, utils)
+    event, metrics, queue, tids, transports, utils)
 
 
 __all__ = [
 
     # Modules
     'adapters', 'decorators', 'logger', 'emitters',
-    'event', 'queue', 'transports', 'utils',
+    'event', 'metrics', 'queue', 'tids', 'transports', 'utils',
 
     # Top level classes
     'Adapter', 'Emitter', 'Event', 'Transport', 'Worker', 'ThreadedWorker',
+    'ProcessWorker', 'WorkerPool',
 
     # Conf
     'conf', 'Config', 'ConfigDescriptor']
@@ -1,9 +1,15 @@
 import sys
 import os
+import re
+import time
+import multiprocessing
 import pika
 import requests
+from copy import copy
+from json import loads, dumps
 from datetime import datetime
 from .globals import log, conf
+from .event import Event
 from pika.exceptions import (
     AMQPError, AMQPChannelError, AMQPConnectionError, ProtocolSyntaxError)
 from .utils import _is_string, _timeout_seconds
@@ -11,13 +17,21 @@ from .utils import _is_string, _timeout_seconds
 
 Adapters = [
     'Adapter', 'HttpAdapter', 'MultiAdapter', 'ListAdapter', 'FileAdapter',
-    'StdoutAdapter', 'StderrAdapter', 'AmqpAdapter', 'HttpAdapter']
+    'StdoutAdapter', 'StderrAdapter', 'AmqpAdapter', 'HttpAdapter',
+    'BulkHttpAdapter', 'ElasticsearchAdapter', 'ProcessAdapter']
 
 
 __all__ = Adapters + [
     'Adapters', 'AdapterError', 'AdapterClosedError', 'AdapterEmitError']
 
 
+def _is_error_class(event, errors):
+    """Returns True if event is one of the error classes in errors, which test
+    adapters raise when given one to emit. Payloads such as events may not be
+    hashable so only classes are looked up."""
+    return isinstance(event, type) and event in errors
+
+
 class AdapterError(Exception):
     """Normalized error for adapters to share."""
     def __init__(self, trigger=None):
@@ -51,6 +65,10 @@ class Adapter(object):
     a new thread."""
     errors = set([AdapterError, AdapterClosedError, AdapterEmitError, AdapterEmitPermanentError])
 
+    # Number of items the worker hands to emit_batch when the transport leaves
+    # max_batch_size at 1, adapters that send batches more cheaply raise it.
+    batch_size = 1
+
     @classmethod
     def __call__(cls):
         """Looks for an "EMIT_ADAPTER_URL" environment variable, if not set will
@@ -66,6 +84,10 @@ class Adapter(object):
                 return AmqpAdapter.from_url(url, *args, **kwargs)
             if url.startswith('list'):
                 return ListAdapter(*args, **kwargs)
+            if url.startswith(('http+bulk', 'https+bulk')):
+                return BulkHttpAdapter.from_url(url, *args, **kwargs)
+            if url.startswith(('es+http', 'es+https')):
+                return ElasticsearchAdapter.from_url(url, *args, **kwargs)
             if url.startswith('http'):
                 return HttpAdapter.from_url(url, *args, **kwargs)
             if url == 'std://out':
@@ -118,11 +140,19 @@ class Adapter(object):
     def emit(self, event):
         if self.closed:
             raise AdapterClosedError
-        if (event in self.errors):
+        if _is_error_class(event, self.errors):
             log.debug('Adapter.emit - event was of an error type {}, raising it'.format(event.__name__))
             raise event
         self._emit(event)
 
+    def emit_batch(self, events):
+        """Emits a sequence of events, returning a list with the outcome of each
+        event by index. An outcome is None when the event was emitted, otherwise
+        it is the AdapterError raised for it."""
+        if self.closed:
+            raise AdapterClosedError
+        return self._emit_batch(events)
+
     def _open(self):
         pass
 
@@ -135,6 +165,25 @@ class Adapter(object):
     def _emit(self, event):
         pass
 
+    def _emit_batch(self, events):
+        """Default implementation calls emit for each event, adapters that can
+        deliver many events at once should override this."""
+        errors = []
+
+        for event in events:
+            try:
+                self.emit(event)
+                errors.append(None)
+
+            # Nothing more can be sent once closed, the remaining events share
+            # the same outcome.
+            except AdapterClosedError as e:
+                errors.extend([e] * (len(events) - len(errors)))
+                break
+            except AdapterError as e:
+                errors.append(e)
+        return errors
+
 
 class MultiAdapter(Adapter):
     """Takes multiple adapters and emits to them, only for testing I would not use
@@ -191,6 +240,175 @@ class MultiAdapter(Adapter):
             raise errors.pop()
 
 
+def _process_adapter_error(e, default=AdapterClosedError):
+    """Adapter errors cross the pipe as their class, anything else is sent as
+    `default` since the adapter may be left in an unknown state."""
+    if isinstance(e, AdapterError):
+        return e.__class__
+    log.exception(e)
+    return default
+
+
+def _process_adapter_main(conn, factory):
+    """Entry point of a ProcessAdapter child, replies to each frame of
+    (seq, op, args) with (seq, result, error) until closed or the parent goes
+    away. Emit batch results are sent as a list of error classes."""
+    adapter = factory()
+
+    while True:
+        try:
+            (seq, op, args) = conn.recv()
+        except (EOFError, IOError):
+            break
+        result = error = None
+
+        try:
+            if op == 'emit_batch':
+                result = [None if e is None else _process_adapter_error(e)
+                          for e in adapter.emit_batch(*args)]
+            elif op in ProcessAdapter.ops:
+                getattr(adapter, op)(*args)
+        except Exception as e:
+            error = _process_adapter_error(e)
+        conn.send((seq, result, error))
+        if op == 'close':
+            break
+    conn.close()
+
+
+class ProcessAdapter(Adapter):
+    """Runs the adapter returned by calling `adapter` in a child process, so
+    it's network I/O and any encoding it does happen outside this interpreter
+    and it's GIL. Each call is sent to the child as a frame of pre-serialized
+    payloads over a pipe and waits for the child to acknowledge it with the
+    outcome, emit_batch sends a single frame for the whole batch.
+
+    When the child exits or does not reply within `timeout` seconds it's
+    killed, a new one is started and opened, and the unacknowledged frame is
+    replayed. After `max_respawns` attempts in a row the adapter raises
+    AdapterClosedError. A frame the child had delivered before exiting is
+    delivered again, so like a retry delivery is at least once."""
+    ops = ('open', 'close', 'flush', 'emit')
+    max_respawns = 3
+    timeout = 60
+
+    def __repr__(self):
+        return '{0}(adapter={1}, pid={2})'.format(
+            self.__class__.__name__, self.adapter,
+            self.process.pid if self.process is not None else None)
+
+    def __init__(self, adapter=None, max_respawns=None, timeout=None):
+        super(ProcessAdapter, self).__init__()
+        self.adapter = adapter if adapter is not None else Adapter()
+        if max_respawns is not None:
+            self.max_respawns = max_respawns
+        if timeout is not None:
+            self.timeout = timeout
+        self.process = None
+        self.conn = None
+        self.seq = 0
+        self.respawns = 0
+
+    def __call__(self):
+        return self.__class__(self.adapter, self.max_respawns, self.timeout)
+
+    def _open(self):
+        self._kill()
+        try:
+            self._spawn()
+        except AdapterError:
+            self._kill()
+            raise
+        except (EOFError, IOError) as e:
+            self._kill()
+            raise AdapterClosedError(e)
+
+    def _close(self):
+        try:
+            if self.process is not None and self.process.is_alive():
+                self._send(self.timeout, 'close')
+        except (EOFError, IOError, AdapterError):
+            pass
+        finally:
+            self._kill()
+
+    def _flush(self, timeout):
+        self._call(max(self.timeout, timeout), 'flush', timeout)
+
+    def _emit(self, json):
+        self._call(self.timeout, 'emit', json)
+
+    def _emit_batch(self, events):
+        errors = self._call(self.timeout, 'emit_batch', list(events))
+
+        # Events sharing an error class share the error, like the closed
+        # error given to each event after the adapter closed.
+        raised = dict((e, e()) for e in set(errors) if e is not None)
+        return [raised.get(e) for e in errors]
+
+    def _spawn(self):
+        """Starts a child process running the adapter and opens it."""
+        (self.conn, child) = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_process_adapter_main, args=(child, self.adapter))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self._send(self.timeout, 'open')
+
+    def _kill(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(.1)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.process = None
+
+    def _send(self, timeout, op, *args):
+        """Sends a frame and waits for it's acknowledgement, raises EOFError
+        when the child exits or fails to reply within timeout."""
+        self.seq += 1
+        self.conn.send((self.seq, op, args))
+
+        while True:
+            if not self.conn.poll(timeout):
+                raise EOFError('adapter process did not reply within {0} seconds'.format(timeout))
+            (seq, result, error) = self.conn.recv()
+
+            # Replies to frames we stopped waiting on are stale
+            if seq == self.seq:
+                break
+        if error is not None:
+            raise error()
+        return result
+
+    def _call(self, timeout, op, *args):
+        """Sends a frame, replaying it to a new child whenever the child exits
+        before the frame is acknowledged."""
+        respawns = 0
+
+        while True:
+            try:
+                if self.conn is None:
+                    raise EOFError('adapter process is not running')
+                return self._send(timeout, op, *args)
+            except (EOFError, IOError) as e:
+                log.error('ProcessAdapter - adapter process exited before '
+                          'acknowledging {0}: {1}'.format(op, e))
+                self._kill()
+                if respawns >= self.max_respawns:
+                    raise AdapterClosedError(e)
+            respawns += 1
+            self.respawns += 1
+            try:
+                self._spawn()
+            except (EOFError, IOError):
+                self._kill()
+
+
 class FileAdapter(Adapter):
     """If _file is set, will write the event json plus a single new line. If
     instantiated with `open_args` will call python's open() with them on
@@ -232,72 +450,223 @@ class StderrAdapter(FileAdapter):
 
 
 class AmqpAdapter(Adapter):
-    """Uses pika amqp python library to send events."""
+    """Uses pika amqp python library to send events.
+
+    The adapter owns a `pika.SelectConnection` and runs it's ioloop on the
+    calling thread while it waits on the broker. The channel is put in confirm
+    mode and messages are published as mandatory without waiting, so up to
+    `confirm_window` of them may await their confirm at once. The window is
+    also the batch_size, so the worker hands over batches that keep it full.
+
+    emit_batch returns once every message of the batch was acked, nacked,
+    returned as unroutable or went `timeout` seconds without a confirm. The
+    latter three are given a AdapterEmitError to be retried by the transport,
+    emit is a batch of one. _flush waits for confirms still outstanding."""
+    connection_class = pika.SelectConnection
+    timeout = 10
+
     @classmethod
     def from_url(cls, url):
         return cls(pika.URLParameters(url))
 
-    def __init__(self, parameters):
+    def __init__(self, parameters, confirm_window=None):
         super(AmqpAdapter, self).__init__()
         self.parameters = parameters if isinstance(
             parameters, pika.connection.Parameters) else pika.URLParameters(parameters)
+        self.confirm_window = max(confirm_window if confirm_window is not None
+                                  else conf.amqp_confirm_window, 1)
+        self.batch_size = self.confirm_window
         self.connection = None
         self.channel = None
         self.properties = pika.BasicProperties(
             content_type='application/json', delivery_mode=1)
+        self._done = None
+        self._reset()
 
     def __call__(self):
-        return AmqpAdapter(self.parameters)
+        return self.__class__(self.parameters, self.confirm_window)
 
     def _open(self):
+        self._reset()
         try:
-            self.connection = pika.BlockingConnection(self.parameters)
-            self.channel = self.connection.channel()
-            self.channel.confirm_delivery()
+            self.connection = self.connection_class(
+                self.parameters, on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_closed, on_close_callback=self._on_closed,
+                stop_ioloop_on_close=False)
+            if self._wait(lambda: self.channel is not None or self._reason is not None):
+                if self.channel is not None:
+                    return self
         except (AMQPChannelError, AMQPConnectionError, ProtocolSyntaxError) as e:
-            raise AdapterClosedError(e)
-        return self
+            self._reason = e
+        reason = self._reason or 'no channel was opened within {0} seconds'.format(self.timeout)
+        self._close()
+        raise AdapterClosedError(reason)
 
     def _close(self):
-        self._close_channel()
-        self._close_connection()
-
-    def _close_channel(self):
-        if self.channel:
-            try:
-                self.channel.close()
-            except (pika.ChannelClosed, pika.ChannelAlreadyClosing):
-                pass
-            finally:
-                self.channel = None
-
-    def _close_connection(self):
-        if self.connection:
-            try:
-                self.connection.close()
-            # Connection close calls channel close, though it says it can't raise
-            # these are here just in case.
-            except (pika.ChannelClosed, pika.ChannelAlreadyClosing):
-                pass
-            finally:
-                self.connection = None
+        connection = self.connection
+        (self.connection, self.channel) = (None, None)
+        self._reset()
+        if connection is None:
+            return
+        try:
+            if not connection.is_closed:
+                connection.close()
+                self._wait(lambda: connection.is_closed, connection=connection)
+        except AMQPError:
+            pass
+        finally:
+            connection.ioloop.close()
 
     def _flush(self, timeout):
-        pass
+        if not len(self._outstanding):
+            return
+        if self.channel is None:
+            raise AdapterClosedError(self._reason)
+        self._wait(lambda: self.channel is None or not len(self._outstanding), timeout)
+        if self.channel is None:
+            raise AdapterClosedError(self._reason)
+        if len(self._outstanding):
+            log('AmqpAdapter._flush - {0} messages still awaiting a confirm'.format(
+                len(self._outstanding)))
 
     def _emit(self, json):
-        if not self.channel:
-            raise AdapterClosedError
+        error = self._emit_batch([json])[0]
+        if error is not None:
+            raise error
+
+    def _emit_batch(self, events):
+        if self.channel is None:
+            raise AdapterClosedError(self._reason)
+        expires = time.time() + self.timeout
+        errors = [None] * len(events)
+        published = []
+
+        for (index, event) in enumerate(events):
+            if _is_error_class(event, self.errors):
+                errors[index] = event()
+                if isinstance(errors[index], AdapterClosedError):
+                    errors[index:] = [errors[index]] * (len(events) - index)
+                    break
+                continue
+
+            # Keep at most confirm_window messages awaiting a confirm, a window
+            # that stays full means the broker stopped confirming.
+            self._wait(lambda: self.channel is None or len(self._outstanding) < self.confirm_window,
+                       expires - time.time())
+            if self.channel is None or len(self._outstanding) >= self.confirm_window:
+                errors[index:] = [AdapterClosedError(
+                    self._reason or 'confirm window is full')] * (len(events) - index)
+                break
+            try:
+                published.append((index, self._publish(event)))
+            except (AMQPChannelError, AMQPConnectionError, ProtocolSyntaxError) as e:
+                errors[index:] = [AdapterClosedError(e)] * (len(events) - index)
+                break
+            except AMQPError as e:
+                errors[index] = AdapterEmitError(e)
+            except Exception as e:
+                errors[index] = AdapterEmitPermanentError(e)
+
+        self._wait(lambda: self.channel is None or len(self._confirmed) == len(published),
+                   expires - time.time())
+        (confirmed, self._confirmed) = (self._confirmed, {})
+        self._awaiting.clear()
+        for (index, tag) in published:
+            if not (tag in confirmed):
+                errors[index] = AdapterClosedError(self._reason) if self.channel is None \
+                    else AdapterEmitError('message {0} was not confirmed'.format(tag))
+            elif confirmed[tag] is False:
+                errors[index] = AdapterEmitError('message {0} was nacked or returned'.format(tag))
+        return errors
+
+    def _publish(self, json):
+        """Publishes json without waiting, returns it's delivery tag. The tag is
+        the message_id so a returned message can be matched to it's confirm."""
+        tag = self._tag + 1
+        properties = copy(self.properties)
+        properties.message_id = str(tag)
+        self.channel.basic_publish(
+            exchange='events', routing_key='emit.events', body=json,
+            properties=properties, mandatory=True)
+        self._tag = tag
+        self._outstanding.add(tag)
+        self._awaiting.add(tag)
+        return tag
+
+    def _wait(self, done, timeout=None, connection=None):
+        """Runs the ioloop of the connection on this thread until done() returns
+        True or timeout seconds pass, callbacks stop it through _wake. Returns
+        the last result of done()."""
+        connection = connection or self.connection
+        timeout = _timeout_seconds(timeout, self.timeout)
+        if done() or timeout <= 0:
+            return done()
+        expired = []
+
+        def expire():
+            expired.append(True)
+            connection.ioloop.stop()
+        timer = connection.ioloop.add_timeout(timeout, expire)
+        self._done = (connection, done)
         try:
-            self.channel.publish(
-                exchange='events', routing_key='emit.events', body=json,
-                properties=self.properties)
-        except (AMQPChannelError, AMQPConnectionError, ProtocolSyntaxError) as e:
-            raise AdapterClosedError(e)
-        except AMQPError as e:
-            raise AdapterEmitError(e)
-        except Exception as e:
-            raise AdapterEmitPermanentError(e)
+            connection.ioloop.start()
+        finally:
+            self._done = None
+            if not expired:
+                connection.ioloop.remove_timeout(timer)
+        return done()
+
+    def _wake(self):
+        if self._done is not None and self._done[1]():
+            self._done[0].ioloop.stop()
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_closed)
+        channel.add_on_return_callback(self._on_return)
+        channel.confirm_delivery(self._on_confirm)
+        self.channel = channel
+        self._wake()
+
+    def _on_closed(self, source, *reason):
+        """Called by pika when the connection or channel closed, or when the
+        connection could not be opened."""
+        self._reason = reason[0] if len(reason) == 1 else reason
+        self.channel = None
+        self._wake()
+
+    def _on_confirm(self, frame):
+        """Called by pika with a Basic.Ack or Basic.Nack method frame."""
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        tags = [method.delivery_tag]
+
+        if method.multiple:
+            tags = [tag for tag in self._outstanding if tag <= method.delivery_tag]
+        for tag in tags:
+            self._outstanding.discard(tag)
+            if tag in self._awaiting:
+                self._confirmed[tag] = acked and not (tag in self._returned)
+            self._returned.discard(tag)
+        self._wake()
+
+    def _on_return(self, channel, method, properties, body):
+        """Called by pika with a message the broker could not route, it is
+        followed by the confirm for the same delivery tag."""
+        try:
+            self._returned.add(int(properties.message_id))
+        except (TypeError, ValueError):
+            log.error('AmqpAdapter._on_return - unknown message returned: {0}'.format(method))
+
+    def _reset(self):
+        self._reason = None
+        self._tag = 0
+        self._outstanding = set()
+        self._awaiting = set()
+        self._returned = set()
+        self._confirmed = {}
 
 
 class HttpAdapter(Adapter):
@@ -341,20 +710,285 @@ class HttpAdapter(Adapter):
     def _emit(self, json):
         if not self.session:
             raise AdapterClosedError
+        self._post(json)
+
+    def _post(self, data, headers=None):
+        """Posts data to our url and returns the response, any failure is
+        raised as the matching AdapterError."""
         try:
-            res = self.session.post(self.url, data=json)
+            res = self.session.post(self.url, data=data, headers=headers)
             res.raise_for_status()
+            return res
         except HttpAdapter.transient as e:
-            log.exception('HttpAdapter._emit - http transient exception')
+            log.exception('HttpAdapter._post - http transient exception')
             raise AdapterEmitError(e)
         except HttpAdapter.reconnect as e:
-            log.exception('HttpAdapter._emit - http reconnect exception')
+            log.exception('HttpAdapter._post - http reconnect exception')
             raise AdapterClosedError(e)
         except HttpAdapter.permanent as e:
-            log.exception('HttpAdapter._emit - http permanent exception')
+            log.exception('HttpAdapter._post - http permanent exception')
             raise AdapterEmitPermanentError(e)
 
 
+class BulkHttpAdapter(HttpAdapter):
+    """Sends events to a http collector as newline delimited json bodies. Given
+    a url with a `http+bulk://` or `https+bulk://` scheme it posts to the same
+    url over plain http or https.
+
+    Each event becomes a record within the body, for this adapter the record is
+    the event json on a single line. Events given to emit_batch are sent in as
+    few bodies as `max_bytes` and `max_events` allow. With the transport
+    max_batch_size left at 1 the worker hands over batches of up to
+    `batch_size` ready items, set max_batch_linger to also wait for more. An
+    event given to emit is sent as a body of it's own. Nothing is buffered here,
+    each call returns once the collector responded so queue items are only
+    acknowledged after delivery and failed records are retried by the worker
+    through the queue's backoff schedule.
+
+    When the collector responds with a json object holding an `items` list of
+    the same length as the body, each entry is the status of the record at the
+    same index. An entry may be a status code or an object with a `status`.
+    Records with a 429 or 5xx status are retried, records with any other non
+    2xx status fail permanently."""
+    content_type = 'application/x-ndjson'
+    max_bytes = 1048576
+    max_events = 500
+    batch_size = 500
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(url.replace('+bulk', '', 1))
+
+    def __init__(self, url, max_bytes=None, max_events=None):
+        super(BulkHttpAdapter, self).__init__(url)
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if max_events is not None:
+            self.max_events = max_events
+        self.headers = {'Content-Type': self.content_type}
+
+    def __call__(self):
+        return self.__class__(self.url, self.max_bytes, self.max_events)
+
+    def _emit(self, json):
+        if not self.session:
+            raise AdapterClosedError
+        try:
+            record = self._record(json)
+        except ValueError as e:
+            raise AdapterEmitPermanentError(e)
+        error = self._send([record])[0]
+        if error is not None:
+            raise error
+
+    def _emit_batch(self, events):
+        if not self.session:
+            raise AdapterClosedError
+        errors = [None] * len(events)
+        (pending, records) = ([], [])
+
+        for (index, event) in enumerate(events):
+            if _is_error_class(event, self.errors):
+                errors[index] = event()
+                if isinstance(errors[index], AdapterClosedError):
+                    errors[index:] = [errors[index]] * (len(events) - index)
+                    break
+                continue
+            try:
+                records.append(self._record(event))
+                pending.append(index)
+            except ValueError as e:
+                errors[index] = AdapterEmitPermanentError(e)
+        for (position, indexes) in self._chunks(records):
+            try:
+                outcomes = self._send([records[i] for i in indexes])
+            except AdapterClosedError as e:
+                for index in pending[position:]:
+                    errors[index] = e
+                break
+            for (i, error) in zip(indexes, outcomes):
+                errors[pending[i]] = error
+        return errors
+
+    def _record(self, json):
+        """Returns the body record for an event, pretty printed events are
+        compacted to a single line. Raises ValueError for invalid json."""
+        if '\n' in json:
+            return dumps(loads(json))
+        return json
+
+    def _chunks(self, records):
+        """Yields (position, indexes) tuples splitting records into the fewest
+        bodies our limits allow, position is the index of the first record."""
+        (position, size) = (0, 0)
+
+        for (index, record) in enumerate(records):
+            count = index - position
+            if count and (count >= self.max_events or size + len(record) + 1 > self.max_bytes):
+                yield position, range(position, index)
+                (position, size) = (index, 0)
+            size += len(record) + 1
+        if position < len(records):
+            yield position, range(position, len(records))
+
+    def _send(self, records):
+        """Posts records as a single body and returns the outcome of each one,
+        only a AdapterClosedError is raised."""
+        try:
+            res = self._post('\n'.join(records) + '\n', self.headers)
+        except AdapterClosedError:
+            raise
+        except AdapterEmitError as e:
+            return [e] * len(records)
+        return self._outcomes(res, len(records))
+
+    def _outcomes(self, res, count):
+        """Returns the outcome of count records from a successful response."""
+        try:
+            items = res.json()['items']
+        except (ValueError, TypeError, KeyError):
+            items = None
+        if not isinstance(items, list) or len(items) != count:
+            return [None] * count
+        return [self._outcome(item) for item in items]
+
+    def _outcome(self, item):
+        """Returns the outcome of a single entry in the response items."""
+        status = self._status(item)
+
+        if 200 <= status < 300:
+            return None
+        if status == 429 or status >= 500:
+            return AdapterEmitError(item)
+        return AdapterEmitPermanentError(item)
+
+    def _status(self, item):
+        """Returns the status code of a response item, entries we don't
+        understand are considered a success like the response itself."""
+        try:
+            if isinstance(item, dict):
+                return int(item.get('status', 200))
+            return int(item)
+        except (TypeError, ValueError):
+            return 200
+
+
+class ElasticsearchAdapter(BulkHttpAdapter):
+    """Indexes events straight into Elasticsearch through the `_bulk` api. Given
+    a url with a `es+http://` or `es+https://` scheme, i.e.:
+
+      es+http://localhost:9200 -> posts to http://localhost:9200/_bulk
+
+    Each event is indexed into `{index_prefix}-{system}-{YYYY.MM.DD}` using the
+    event system and time. The per item results of the bulk response are used
+    so only the documents Elasticsearch rejected with a 429 or 5xx are retried.
+    Use `put_template` to install an index template mapping the `fields` keys
+    by their type suffix, see EVENT.md."""
+    index_prefix = 'emit'
+    doc_type = None
+    field_types = dict(
+        date='date', boolean='boolean', double='double', long='long',
+        string='keyword', array='keyword')
+    index_invalid = re.compile(r'[\\/*?"<>| ,#:]+')
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(url.replace('es+', '', 1))
+
+    def __init__(self, url, max_bytes=None, max_events=None,
+                 index_prefix=None, doc_type=None):
+        super(ElasticsearchAdapter, self).__init__(
+            url, max_bytes=max_bytes, max_events=max_events)
+        if index_prefix is not None:
+            self.index_prefix = index_prefix
+        if doc_type is not None:
+            self.doc_type = doc_type
+        self.base_url = self.url.rstrip('/')
+        self.url = self.base_url + '/_bulk'
+        self._actions = {}
+
+    def __call__(self):
+        return self.__class__(
+            self.base_url, self.max_bytes, self.max_events,
+            self.index_prefix, self.doc_type)
+
+    def index(self, system, time):
+        """Returns the index name for an event with the given system and json
+        time value."""
+        date = time[:10].replace('-', '.') if _is_string(time) and len(time) >= 10 \
+            else datetime.utcnow().strftime('%Y.%m.%d')
+        name = '-'.join([self.index_prefix, system or 'unknown', date])
+        return self.index_invalid.sub('_', name.lower()).lstrip('_-+')
+
+    def template(self):
+        """Returns an index template mapping the event keys, `fields` keys are
+        mapped by their type suffix."""
+        dynamic_templates = [
+            {'fields_' + lookup: {
+                'path_match': 'fields.*_' + lookup,
+                'mapping': {'type': self.field_types[lookup.split('_').pop()]}}}
+            for lookup in Event._fields_lookups]
+        dynamic_templates.append(
+            {'fields_default': {
+                'path_match': 'fields.*', 'mapping': {'type': 'keyword'}}})
+        mapping = {
+            'dynamic_templates': dynamic_templates,
+            'properties': {
+                'tid': {'type': 'keyword'},
+                'time': {'type': 'date'},
+                'system': {'type': 'keyword'},
+                'component': {'type': 'keyword'},
+                'operation': {'type': 'keyword'},
+                'name': {'type': 'keyword'},
+                'tags': {'type': 'keyword'},
+                'replay': {'type': 'keyword'},
+                'fields': {'type': 'object'},
+                'data': {'type': 'object', 'enabled': False}}}
+        if self.doc_type is not None:
+            mapping = {self.doc_type: mapping}
+        return {
+            'index_patterns': ['{0}-*'.format(self.index_prefix)],
+            'mappings': mapping}
+
+    def put_template(self, name=None):
+        """Installs the result of template() as index template `name`, which
+        defaults to the index_prefix."""
+        if not self.session:
+            raise AdapterClosedError
+        url = '{0}/_template/{1}'.format(self.base_url, name or self.index_prefix)
+        try:
+            res = self.session.put(url, data=dumps(self.template()), headers={
+                'Content-Type': 'application/json'})
+            res.raise_for_status()
+        except HttpAdapter.permanent as e:
+            log.exception('ElasticsearchAdapter.put_template - unable to put template')
+            raise AdapterEmitError(e)
+
+    def _record(self, json):
+        """Returns the action and source lines for an event."""
+        event = loads(json)
+        if not isinstance(event, dict):
+            raise ValueError('event json must be an object')
+        index = self.index(event.get('system'), event.get('time'))
+
+        if index not in self._actions:
+            if len(self._actions) > 1024:
+                self._actions.clear()
+            action = {'_index': index}
+            if self.doc_type is not None:
+                action['_type'] = self.doc_type
+            self._actions[index] = dumps({'index': action})
+        if '\n' in json:
+            json = dumps(event)
+        return self._actions[index] + '\n' + json
+
+    def _status(self, item):
+        """Bulk items are keyed by their action, i.e. {"index": {"status": 201}}."""
+        if isinstance(item, dict) and len(item) == 1 and 'status' not in item:
+            item = next(iter(item.values()))
+        return super(ElasticsearchAdapter, self)._status(item)
+
+
 class ListAdapter(Adapter, list):
     """Stores each emitted event in a list along with it's creation time and a
     boolean indicating if it has been flushed or not. Useful for debugging."""
@@ -26,8 +26,10 @@ def _class(k, v):
         event_class=importlib.import_module('emit.event'),
         logger_class=importlib.import_module('emit.logger'),
         queue_class=importlib.import_module('emit.queue'),
+        tid_generator_class=importlib.import_module('emit.tids'),
         transport_class=importlib.import_module('emit.transports'),
-        worker_class=importlib.import_module('emit.transports'))
+        worker_class=importlib.import_module('emit.transports'),
+        pool_worker_class=importlib.import_module('emit.transports'))
     return getattr(lookups[k], v)
 
 
@@ -36,18 +38,42 @@ _env_defaults = dict(
     # Default classes
     adapter_class=('Adapter', _class),
     event_stack_class=('EventStack', _class),
-    event_class=('Event', _class),
+    event_class=('Event', _class),  # Or EventRecord for a compact slotted event
     logger_class=('Logger', _class),
     queue_class=('Queue', _class),
+    tid_generator_class=('TidGenerator', _class),  # Or Uuid7TidGenerator for time ordered tids
     transport_class=('Transport', _class),
-    worker_class=('ThreadedWorker', _class),
+    worker_class=('ThreadedWorker', _class),  # Or WorkerPool / ProcessWorker, see transports
 
     # Default adapter url will be used by Adapter.__call__ when it has len()
     adapter_url=('', _str),
 
-    # Max size of queue before put/get blocks. -1 Means queue forever.
+    # AmqpAdapter: max number of published messages awaiting a publisher
+    # confirm, it's also the batch_size the worker hands to the adapter.
+    amqp_confirm_window=('100', _int),
+
+    # SpillQueue: directory holding the segment files of items past it's memory
+    # size, items left in a segment are replayed by the next process.
+    spill_dir=('', _str),
+
+    # WorkerPool: number of threaded workers, each with it's own adapter and a
+    # partition of the transport queue chosen by event tid.
+    worker_pool_size=('4', _int),
+
+    # WorkerPool: class of it's workers, ThreadedWorker or ProcessWorker.
+    pool_worker_class=('ThreadedWorker', _class),
+
+    # Max size of queue before the overflow policy applies. -1 Means queue forever.
     max_queue_size=('-1', _int),
 
+    # What a full queue does with new items, one of block, drop_newest,
+    # drop_oldest, drop_priority or sample. See Queue.OVERFLOW_POLICY.
+    overflow_policy=('block', _str),
+
+    # Max time Transport.emit blocks for room in a full queue with the block
+    # overflow policy before the item is dropped.
+    max_block_time=('.1', _timedelta),  # timedelta(seconds=.1)
+
     # Max time an adapter may spend flushing it's buffers.
     max_flush_time=('10', _timedelta),  # timedelta(seconds=10)
 
@@ -60,6 +86,27 @@ _env_defaults = dict(
     #   as it is greater than zero.
     max_work_time=('.5', _timedelta),  # timedelta(seconds=.5)
 
+    # Worker: max number of queue items handed to the adapter in a single
+    # emit_batch() call. A value of 1 leaves it to the adapter's batch_size,
+    # which is 1 so each item goes to emit() except for the bulk adapters
+    # (http+bulk://, es+http://) which take up to 500 ready items per body.
+    max_batch_size=('1', _int),
+
+    # Worker: max payload bytes in a batch before it is handed to the adapter,
+    # a batch always holds at least one item. 0 Means no limit.
+    max_batch_bytes=('1048576', _int),
+
+    # Worker: max time to wait for more items once a batch has its first one.
+    max_batch_linger=('0', _timedelta),  # timedelta(seconds=0)
+
+    # Emitter: enqueue a copy of each event and leave validation and json
+    # serialization to the transport worker instead of the emitting thread.
+    defer_serialization=('false', _bool),
+
+    # Event: json encoder used by Event.json, one of json or simplejson. When
+    # auto simplejson is used if it can be imported.
+    json_encoder=('auto', _str),
+
     # Debug mode
     debug=('false', _bool),
 
@@ -1,4 +1,3 @@
-from uuid import uuid4
 from .globals import log, conf, ConfigDescriptor
 from .utils import _debug_assert
 from .event import EventContext
@@ -16,11 +15,15 @@ class Emitter(object):
     event_class = ConfigDescriptor('event_class')
     adapter_class = ConfigDescriptor('adapter_class')
     transport_class = ConfigDescriptor('transport_class')
+    tid_generator_class = ConfigDescriptor('tid_generator_class')
+    defer_serialization = ConfigDescriptor('defer_serialization')
 
     def __init__(
             self, adapter=None, transport=None, event_stack=None,
             event_stack_class=None, event_class=None, adapter_class=None,
-            transport_class=None, callbacks=None, defaults=None, **kwargs):
+            transport_class=None, callbacks=None, defaults=None,
+            defer_serialization=None, tid_generator_class=None,
+            tid_generator=None, **kwargs):
 
         # If you do not pass any of these, then conf.<kwarg> is used instead
         # due to the `ConfigDescriptor`
@@ -32,6 +35,14 @@ class Emitter(object):
             self.adapter_class = adapter_class
         if transport_class is not None:
             self.transport_class = transport_class
+        if defer_serialization is not None:
+            self.defer_serialization = defer_serialization
+        if tid_generator_class is not None:
+            self.tid_generator_class = tid_generator_class
+
+        # Tid generator if not passed uses tid_generator_class, see new_tid
+        self.tid_generator = tid_generator if tid_generator is not None else \
+            self.tid_generator_class()
 
         # Event stack if not passed uses event_stack_class and pushes defaults to it.
         self.event_stack = event_stack if event_stack is not None else \
@@ -109,7 +120,7 @@ class Emitter(object):
         """Send open, ping and close events as a ping operation. Returns TID to
         look up at endpoint if desired. Will set system=test.pyemit,
         component=emitter and operation=ping."""
-        tid = str(uuid4())
+        tid = self.new_tid()
         event = conf.event_class(
             tid=tid, system='test.pyemit', component='emitter', operation='ping')
 
@@ -118,17 +129,29 @@ class Emitter(object):
         self.transport.emit(event(name='close').json)
         return tid
 
+    def new_tid(self, name=None):
+        """Returns a new transaction id from the tid generator, generators that
+        derive tids from shared state such as `Uuid5TidGenerator` use `name`."""
+        return self.tid_generator(name)
+
     def emit(self, *args, **kwargs):
         """Emit an event. It will use the current event stack for the events
         context. It returns a context manager which will use the emitted event
         as a base for this event stack as well as emit an 'enter' and 'exit'
         event."""
         event = self.event_stack | self.event_class(*args, **kwargs)
-        event.validate()
+
+        # When deferred the worker validates and serializes the event, an
+        # invalid event is logged and dropped there instead of raising here.
+        if self.defer_serialization:
+            payload = event.detach()
+        else:
+            event.validate()
+            payload = event.json
 
         if len(self.callbacks):
             map(lambda f: f(event), self.callbacks)
-        self.transport.emit(event.json)
+        self.transport.emit(payload)
         return self.enter(*args, **kwargs)
 
     """
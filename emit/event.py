@@ -1,25 +1,32 @@
+import re
 import inspect
 import itertools
-from json import dumps, loads, JSONEncoder
+from copy import copy, deepcopy
+from json import loads, JSONEncoder
 from datetime import datetime
-from dateutil import parser
 from collections import Mapping, Iterable
 from .globals import conf, log
-from .utils import (_is_string, _is_value, _is_date)
+from .utils import (_is_string, _is_value, _is_date, _time_format, _time_parse)
 
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
 
-Events = ['Event']
+
+Events = ['Event', 'EventRecord']
 EventStacks = ['EventStack']
 
 
-__all__ = Events + EventStacks + ['Events', 'EventStacks', 'EventJsonEncoder']
+__all__ = Events + EventStacks + [
+    'Events', 'EventStacks', 'EventJsonEncoder', 'EventEncoder']
 
 
 class EventJsonEncoder(JSONEncoder):
     """Just makes dates valid to spec."""
     def default(self, obj):
         if isinstance(obj, datetime):
-            return obj.isoformat('T') + 'Z'
+            return _time_format(obj)
         elif isinstance(obj, set):
             return list(obj)
         try:
@@ -38,6 +45,109 @@ class EventJsonEncoder(JSONEncoder):
             return dict(error='EventJsonEncoder', message=msg)
 
 
+class EventEncoder(object):
+    """Encodes the dict of an `Event` to json with a reusable encoder instance,
+    from the stdlib json module or simplejson. The `time` and `tags` values are
+    converted to json types before encoding, so `EventJsonEncoder.default` is
+    only reached for values held within fields or data."""
+    backends = ['json', 'simplejson']
+
+    def __init__(self, backend='auto', pretty=False):
+        kwargs = dict(indent=2, separators=(',', ': ')) if pretty else dict()
+
+        if backend == 'auto':
+            backend = 'json' if simplejson is None else 'simplejson'
+        if not (backend in self.backends):
+            raise ValueError('`{}` is not a known json encoder'.format(backend))
+        if backend == 'simplejson':
+            if simplejson is None:
+                raise ImportError('simplejson json encoder requested but it is not installed')
+
+            # Disable the simplejson extensions so output matches the stdlib,
+            # allow_nan defaults to False in newer releases of simplejson
+            self.encoder = simplejson.JSONEncoder(
+                default=EventJsonEncoder().default, namedtuple_as_object=False,
+                use_decimal=False, for_json=False, allow_nan=True, **kwargs)
+        else:
+            self.encoder = EventJsonEncoder(**kwargs)
+        self.backend = backend
+        self.pretty = pretty
+
+    def __repr__(self):
+        return '{}(backend={}, pretty={})'.format(
+            self.__class__.__name__, self.backend, self.pretty)
+
+    def encode(self, out):
+        """Returns the json string for the dict `out`, which is modified in
+        place to hold json types for `time` and `tags`."""
+        time = out.get('time')
+        if isinstance(time, datetime):
+            out['time'] = _time_format(time)
+        tags = out.get('tags')
+        if isinstance(tags, set):
+            out['tags'] = list(tags)
+        return self.encoder.encode(out)
+
+
+# Cache of EventEncoder instances by (backend, pretty)
+_event_encoders = dict()
+
+
+def _event_encoder():
+    """Returns the cached `EventEncoder` for conf.json_encoder, which will
+    output pretty JSON if conf.debug or conf.pretty is set."""
+    settings = conf.__dict__
+    key = (settings['json_encoder'], bool(settings['debug'] or settings['pretty']))
+    if not (key in _event_encoders):
+        _event_encoders[key] = EventEncoder(*key)
+    return _event_encoders[key]
+
+
+def _compile_fields_rules(rules):
+    """Returns a validator func for every `fields` lookup given the suffix
+    `rules`. Array lookups check the container then each value in one pass."""
+    def array_validator(rule):
+        def validate(value):
+            if (not isinstance(value, Iterable)) or _is_string(value):
+                return False
+            for v in value:
+                if not rule(v):
+                    return False
+            return True
+        return validate
+
+    validators = dict(('array_{}'.format(k), array_validator(rule))
+                      for k, rule in rules.iteritems() if k != 'array')
+    validators.update(rules)
+    validators['array'] = array_validator(rules['array'])
+    return validators
+
+
+def _compile_validator(cls):
+    """Returns a func validating events of `cls` the same way `validate()`
+    always has, with the key sets and the `EventProperty` getter and validator
+    of each allowed key resolved once up front."""
+    required = frozenset(cls.keys_required)
+    allowed = frozenset(cls.keys_allowed)
+    checks = []
+
+    for key in cls.keys_allowed:
+        prop = getattr(cls, key, None)
+        if not (isinstance(prop, EventProperty) and prop.fval):
+            prop = object.__getattribute__(Event, key)
+        checks.append((key, prop.fget, prop.fval))
+
+    def validator(event):
+        keys = event.viewkeys()
+        if not (keys >= required and keys <= allowed):
+            event._validate_keys()
+        for (key, fget, fval) in checks:
+            if key in event:
+                fval(event, fget(event), final=True)
+        return True
+    return validator
+
+
 class EventProperty(object):
     """Just like a @property, but adds a validator func, see:
          https://docs.python.org/2/howto/descriptor.html#properties"""
@@ -103,12 +213,32 @@ class Event(dict):
         [k] if k == 'array' else ['array_{}'.format(k), k]
         for k in _fields_rules.keys()))
 
+    # Matches the type suffix of a `fields` key, i.e. count_long or ids_array_long
+    _fields_suffix = re.compile(r'(?:^|_)(array(?:_(?:{0}))?|{0})$'.format(
+        '|'.join(k for k in _fields_rules.keys() if k != 'array')))
+    _fields_validators = _compile_fields_rules(_fields_rules)
+
+    # Lookup by `fields` key, cleared once it holds _fields_memo_size keys
+    _fields_memo = {}
+    _fields_memo_size = 4096
+
     @classmethod
     def from_json(cls, event_json):
-        event_dict = loads(str(event_json))
+        return cls._from_json_dict(loads(str(event_json)))
 
+    @classmethod
+    def iter_from_ndjson(cls, fileobj):
+        """Yields an event for each line of json in `fileobj`, reading a line at
+        a time so large event files are never loaded whole. Blank lines are
+        skipped."""
+        for line in fileobj:
+            if line.strip():
+                yield cls._from_json_dict(loads(line))
+
+    @classmethod
+    def _from_json_dict(cls, event_dict):
         if 'time' in event_dict:
-            event_dict['time'] = parser.parse(event_dict['time']).replace(tzinfo=None)
+            event_dict['time'] = _time_parse(event_dict['time'])
         return cls(**event_dict)
 
     def __call__(self, *args, **kwargs):
@@ -117,15 +247,86 @@ class Event(dict):
           base = Event(system='foo')
           event = base(name='foo')
         """
-        return type(self)(self, **self).update(*args, **kwargs)
+        event = self._derive()
+        if len(args) or len(kwargs):
+            event.update(*args, **kwargs)
+        return event
+
+    def _derive(self):
+        """Returns a new event inheriting all keys holding a value, like
+        `type(self)(self, **self)` would. The keys are copied in a single pass
+        without going through `update` again, they were validated when they
+        were set on this event. Tags are copied since they are updated in place,
+        other values are shared."""
+        event = dict.__new__(type(self))
+        dict.update(event, self)
+        event.__dict__.update(self.__dict__)
+
+        for key in self.keys_optional:
+            if key in event and not _is_value(event[key]):
+                dict.__delitem__(event, key)
+        if 'tags' in event:
+            dict.__setitem__(event, 'tags', set(event['tags']))
+
+        # Keys that are missing or not allowed are rare, keep __init__ behavior
+        keys = event.viewkeys()
+        for key in self.keys_required:
+            if not (key in keys):
+                dict.__setitem__(event, key, datetime.utcnow() if key == 'time' else '')
+        for key in list(keys - set(self.keys_allowed)):
+            value = dict.pop(event, key)
+            if _is_value(value):
+                setattr(event, key, value)
+        return event
+
+    def _merge(self, right):
+        """Sets the keys of the `right` mapping that hold a value, which were
+        validated when they were set on `right`."""
+        allowed = self.keys_allowed
+
+        for (key, value) in right.iteritems():
+            if not _is_value(value):
+                continue
+            if key == 'tags':
+                self[key] = set(value)
+            elif key in allowed:
+                self[key] = value
+            else:
+                setattr(self, key, value)
 
     def __repr__(self):
         return '{}(tid={})'.format(self.__class__.__name__, self.tid)
 
+    # Bumped on every key assignment so an `EventStack` can tell when a frame
+    # it has rolled up was mutated.
+    _version = 0
+
+    def __setitem__(self, key, value):
+        self._version += 1
+        super(Event, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._version += 1
+        super(Event, self).__delitem__(key)
+
     def __str__(self):
         """Returns json"""
         return self.json
 
+    def detach(self):
+        """Replaces the `tags`, `fields` and `data` containers with deep copies
+        so this event no longer shares them, or anything nested within them,
+        with the context it was derived from. Used to hand a snapshot of the
+        event to another thread. A container holding values that can't be
+        deep copied is copied shallowly instead. Returns itself."""
+        for key in ('tags', 'fields', 'data'):
+            if key in self:
+                try:
+                    self[key] = deepcopy(self[key])
+                except Exception:
+                    self[key] = copy(self[key])
+        return self
+
     def canonicalized(self, base):
         """Returns the canonical event name for this event when derived from a
         given base. I.E.:
@@ -153,7 +354,7 @@ class Event(dict):
         """In place __or__."""
         right = right.to_event
         canonicalized_name = right.canonicalized(self.name)
-        self.update(**right)
+        self._merge(right)
         self.name = canonicalized_name
         return self
 
@@ -165,7 +366,8 @@ class Event(dict):
 
     def __iadd__(self, other):
         """In place __add__."""
-        return self.update(**other.to_event)
+        self._merge(other.to_event)
+        return self
 
     def __init__(self, *args, **kwargs):
         """Makes sure the required keys exists, sets the time and calls `update`
@@ -266,8 +468,21 @@ class Event(dict):
         if not _is_value(getattr(self, key)):
             setattr(self, key, value)
 
+    @classmethod
+    def _validator(cls):
+        """Returns the validator compiled for this class on first use."""
+        validator = cls.__dict__.get('_validator_compiled')
+        if validator is None:
+            validator = _compile_validator(cls)
+            setattr(cls, '_validator_compiled', validator)
+        return validator
+
     def validate(self):
         """Performs valiations by calling the key validate methods."""
+        return self._validator()(self)
+
+    def _validate_keys(self):
+        """Raises a ValueError listing any missing or extraneous keys."""
         key_set = set(self.keys())
         keys_required_diff = self._list_from_sequence_by_allowed(
             set(self.keys_required) - key_set)
@@ -278,19 +493,12 @@ class Event(dict):
             raise ValueError('`Event` was missing required keys: {0}'.format(', '.join(keys_required_diff)))
         if len(keys_allowed_diff):
             raise ValueError('`Event` had extraneous keys: {0}'.format(', '.join(keys_allowed_diff)))
-        for key in self.keys_allowed:
-            if key in self:
-                # Event is a descriptor, returns self on class access, use self
-                # ref to call fval bound to this event instance
-                object.__getattribute__(Event, key).fval(
-                    self, getattr(self, key), final=True)
-        return True
 
     @property
     def valid(self):
         """Returns True if the Event is currently valid, False otherwise."""
         try:
-            self.validate()
+            self._validator()(self)
         except ValueError:
             return False
         return True
@@ -320,12 +528,7 @@ class Event(dict):
     def json(self):
         """Returns JSON string of the current `to_event` property. It will output
         pretty JSON if conf.debug is set."""
-        if conf.debug or conf.pretty:
-            return dumps(
-                self.to_dict, cls=EventJsonEncoder,
-                indent=2, separators=(',', ': '))
-        else:
-            return dumps(self.to_dict, cls=EventJsonEncoder)
+        return _event_encoder().encode(self.to_dict)
 
     # tid
     @EventProperty
@@ -507,21 +710,23 @@ class Event(dict):
                     raise ValueError('`{}` value `{}` did not match suffix type'.format(k, v))
 
     def fields_lookup(self, name):
-        for l in self._fields_lookups:
-            if name.rfind(l) >= 0:
-                return l
-        return 'string'
+        """Returns the lookup for the type suffix of `fields` key `name`, keys
+        without a known suffix are strings."""
+        memo = self._fields_memo
+        try:
+            return memo[name]
+        except KeyError:
+            pass
+        match = self._fields_suffix.search(name)
+        lookup = 'string' if match is None else match.group(1)
 
-    def fields_validate(self, name, value):
-        l = self.fields_lookup(name)
+        if len(memo) >= self._fields_memo_size:
+            memo.clear()
+        memo[name] = lookup
+        return lookup
 
-        if l.startswith('array'):
-            if (not isinstance(value, Iterable)) or _is_string(value):
-                return False
-            func = self._fields_rules[l.split('_').pop()]
-            return all(map(func, value))
-        else:
-            return self._fields_rules[l](value)
+    def fields_validate(self, name, value):
+        return self._fields_validators[self.fields_lookup(name)](value)
 
     @fields.normalize
     def fields(self):
@@ -550,6 +755,148 @@ class Event(dict):
             raise ValueError('`data` must be a Mapping')
 
 
+class EventRecord(object):
+    """Compact alternative to `Event` storing the spec keys in fixed slots rather
+    than a dict, optional containers are only allocated when first accessed. It
+    shares the behavior of `Event` and its mapping interface, so it may be used
+    as conf.event_class. Only the allowed keys may be stored."""
+    __slots__ = (
+        '_tid', '_time', '_system', '_component', '_operation', '_name',
+        '_tags', '_replay', '_fields', '_data', '_version')
+
+    keys_allowed = Event.keys_allowed
+    keys_required = Event.keys_required
+    keys_optional = Event.keys_optional
+
+    # Slot name by key
+    _slots = dict((key, '_' + key) for key in Event.keys_allowed)
+
+    _fields_rules = Event._fields_rules
+    _fields_lookups = Event._fields_lookups
+    _fields_suffix = Event._fields_suffix
+    _fields_validators = Event._fields_validators
+    _fields_memo = Event._fields_memo
+    _fields_memo_size = Event._fields_memo_size
+
+    @classmethod
+    def from_event(cls, event):
+        """Returns a record holding the keys of `event` without validating them
+        again."""
+        record = cls.__new__(cls)
+        record._version = 0
+        for key, value in event.iteritems():
+            record[key] = value
+        return record
+
+    def _derive(self):
+        """Returns a new record inheriting all keys holding a value."""
+        record = self.__class__()
+        for (key, value) in self.iteritems():
+            if _is_value(value):
+                record[key] = set(value) if key == 'tags' else value
+        return record
+
+    def as_event(self, event_class=Event):
+        """Returns an `event_class` holding the keys of this record without
+        validating them again."""
+        event = event_class.__new__(event_class)
+        dict.update(event, self.iteritems())
+        return event
+
+    def __init__(self, *args, **kwargs):
+        """Sets the required keys and time, then calls `update` with any
+        additional arguments."""
+        self._version = 0
+        self._tid = self._system = self._component = ''
+        self._operation = self._name = ''
+        self._time = datetime.utcnow()
+        if len(args) or len(kwargs):
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._slots[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if not (key in self._slots):
+            raise KeyError('`{0}` key is not allowed'.format(key))
+        self._version += 1
+        setattr(self, self._slots[key], value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, self._slots[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+        self._version += 1
+
+    def __contains__(self, key):
+        return key in self._slots and hasattr(self, self._slots[key])
+
+    def __iter__(self):
+        for key in self.keys_allowed:
+            if hasattr(self, self._slots[key]):
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.iteritems()) == dict(other.iteritems())
+
+    def __ne__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return not (self == other)
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        for key in self:
+            yield self[key]
+
+    def iteritems(self):
+        for key in self:
+            yield (key, self[key])
+
+    def viewkeys(self):
+        return set(self)
+
+
+# Behavior is shared with Event, only the storage differs
+for name in [
+        'from_json', 'iter_from_ndjson', '_from_json_dict', '_validator', '__call__',
+        '__repr__', '__str__', '__or__', '__ior__', '__add__', '__iadd__', '_merge',
+        'detach', 'canonicalized', '_list_from_sequence_by_allowed', '_args_slurp',
+        '_kwargs_slurp', 'update', 'defaults', 'default', 'validate', '_validate_keys',
+        'valid', 'to_dict', 'to_event', 'json', 'fields_lookup', 'fields_validate'] + Event.keys_allowed:
+    setattr(EventRecord, name, Event.__dict__[name])
+del name
+Mapping.register(EventRecord)
+
+
 class EventContext(Event):
     """Short lived object to bridge into a contextual event."""
     def __init__(self, event_stack, *args, **kwargs):
@@ -563,20 +910,71 @@ class EventContext(Event):
         self.event_stack.__exit__(exc_type, exc_value, tb)
 
 
+def _event_stamp(event, copy=deepcopy):
+    """Returns a fingerprint of an event used to detect mutation of a frame
+    after it was rolled up. Tags, fields and data may be mutated in place
+    without going through `__setitem__`, so the stamp holds copies of them
+    which are compared by value. Checking a stamp does not copy, see
+    `_event_unchanged`. Returns None when the event holds values that can't
+    be copied, such a frame is merged again on every rollup."""
+    try:
+        return (
+            getattr(event, '_version', None), len(event),
+            copy(event.get('tags')), copy(event.get('fields')), copy(event.get('data')))
+    except Exception:
+        return None
+
+
+def _event_unchanged(event, stamp):
+    if stamp is None:
+        return False
+    try:
+        return stamp == _event_stamp(event, copy=lambda value: value)
+    except Exception:
+        return False
+
+
 class EventStack(list):
     """Lifo stack of events for tracking context."""
 
-    @property
-    def to_event(self):
-        """Returns rolled up Event using this context stack."""
+    def __init__(self, *args):
+        super(EventStack, self).__init__(*args)
+
+        # Rolled up prefix of the stack at each depth as (frame, stamp, event)
+        self._rollups = []
+
+    def _rollup(self):
+        """Returns the rolled up Event for this stack, only merging the frames
+        that were pushed or mutated since the last call. The returned event is
+        shared with the cache and must not be modified."""
         if not len(self):
             return conf.event_class()
-        out = self[0]()
-
-        for event in self[1:]:
-            out |= event
+        rollups = self._rollups
+        depth = 0
+
+        for event in self:
+            if depth >= len(rollups):
+                break
+            frame, stamp, _ = rollups[depth]
+            if not (frame is event and _event_unchanged(event, stamp)):
+                break
+            depth += 1
+        del rollups[depth:]
+
+        for event in list.__getslice__(self, depth, len(self)):
+            if depth:
+                out = rollups[depth - 1][2]()
+                out |= event
+            else:
+                out = event()
+            rollups.append((event, _event_stamp(event), out))
+            depth += 1
+        return rollups[-1][2]
 
-        return out
+    @property
+    def to_event(self):
+        """Returns rolled up Event using this context stack."""
+        return self._rollup()()
 
     @property
     def bot(self):
@@ -596,11 +994,11 @@ class EventStack(list):
 
     def __or__(a, b):
         """Acts just like Event() __or__."""
-        return a.to_event | b.to_event
+        return a._rollup() | b.to_event
 
     def __add__(a, b):
         """Acts just like Event() __add__."""
-        return a.to_event + b.to_event
+        return a._rollup() + b.to_event
 
     def __enter__(self, evt=None):
         """Entering the event stack adds an event to it."""
@@ -627,11 +1025,11 @@ class EventStack(list):
         being `three` given a stack containing [name=base, one, ..three]."""
         if isinstance(k, int):
             return list.__getitem__(self, k)
-        return dict.__getitem__(self.to_event, k)
+        return self._rollup()[k]
 
     def __contains__(self, k):
         """Checks if a key exists in current event stack's full event."""
-        return dict.__contains__(self.to_event, k)
+        return k in self._rollup()
 
     def __getattr__(self, name):
         """EventStack.attribute will access the top item."""
@@ -642,8 +1040,8 @@ class EventStack(list):
 
     def __str__(self):
         """Returns a helpful view of the event stack for troubleshooting."""
-        evt = self.to_event
-        out = '{}({})'.format(self.__class__.__name__, dict.__getitem__(evt, 'tid'))
+        evt = self._rollup()
+        out = '{}({})'.format(self.__class__.__name__, evt['tid'])
 
         for index, evt in enumerate(reversed(self)):
             out += '\n{0}->{1}'.format(
@@ -0,0 +1,251 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+Metrics = ['Counter', 'Gauge', 'Histogram']
+
+
+__all__ = Metrics + ['Metrics', 'Metric', 'Registry']
+
+
+def _prometheus_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', r'\\').replace(
+        '"', r'\"').replace('\n', r'\n')) for (k, v) in sorted(labels.items())) + '}'
+
+
+class Metric(object):
+    """Base class for metrics held by a `Registry`. The value of a metric
+    created with `func` is the result of calling it, which lets state kept
+    elsewhere, like the length of a queue, be read only when it's collected."""
+    type = 'untyped'
+    suffix = ''
+
+    def __repr__(self):
+        return '{0}(name={1}, value={2})'.format(
+            self.__class__.__name__, self.name, self.snapshot())
+
+    def __init__(self, name, help='', func=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self):
+        if self.func is not None:
+            return self.func()
+        return self._value
+
+    def snapshot(self):
+        """Returns the current value of this metric."""
+        return self.value
+
+    def samples(self):
+        """Yields a (suffix, labels, value) tuple for each sample in the
+        Prometheus exposition of this metric."""
+        yield (self.suffix, {}, self.value)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, i.e. items delivered."""
+    type = 'counter'
+    suffix = '_total'
+
+    def inc(self, n=1):
+        with self.lock:
+            self._value += n
+
+
+class Gauge(Metric):
+    """Value which may go up and down, i.e. items in a queue."""
+    type = 'gauge'
+
+    def set(self, value):
+        with self.lock:
+            self._value = value
+
+    def inc(self, n=1):
+        with self.lock:
+            self._value += n
+
+    def dec(self, n=1):
+        with self.lock:
+            self._value -= n
+
+
+class Histogram(Metric):
+    """Distribution of durations in seconds, recorded with a microsecond
+    resolution into log-linear buckets like a HDR histogram. Every power of two
+    is split into 2 ** (sub_bucket_bits - 1) buckets, so reported quantiles are
+    within 2 ** -(sub_bucket_bits - 1) of the recorded value. Buckets are kept
+    in a dict holding only the ones recorded into, which is a few dozen for
+    latencies spanning microseconds to minutes."""
+    type = 'summary'
+    sub_bucket_bits = 5
+    quantiles = (.5, .9, .99, .999)
+
+    def __init__(self, name, help='', sub_bucket_bits=None):
+        super(Histogram, self).__init__(name, help)
+        if sub_bucket_bits is not None:
+            self.sub_bucket_bits = sub_bucket_bits
+        if self.sub_bucket_bits <= 0:
+            raise ValueError('`sub_bucket_bits` must be greater than zero')
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @property
+    def value(self):
+        return self.count
+
+    def index(self, micros):
+        """Returns the bucket for a value in integer microseconds, values below
+        2 ** sub_bucket_bits have a bucket each."""
+        shift = micros.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return micros
+        return (shift << (self.sub_bucket_bits - 1)) + (micros >> shift)
+
+    def highest(self, index):
+        """Returns the highest value in microseconds held by bucket index."""
+        half = 1 << (self.sub_bucket_bits - 1)
+        if index < 2 * half:
+            return index
+        shift = (index >> (self.sub_bucket_bits - 1)) - 1
+        return ((index - (shift << (self.sub_bucket_bits - 1)) + 1) << shift) - 1
+
+    def record(self, seconds):
+        micros = max(int(seconds * 1000000), 0)
+        index = self.index(micros)
+
+        with self.lock:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    @contextmanager
+    def time(self):
+        """Records the seconds spent within the with statement, including when
+        it raises."""
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.record(time.time() - start)
+
+    def quantile(self, q):
+        """Returns the highest value in seconds of the bucket holding quantile
+        `q` between 0 and 1, capped at the max recorded. None when empty."""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = max(int(q * self.count + .5), 1)
+            seen = 0
+
+            for index in sorted(self.buckets):
+                seen += self.buckets[index]
+                if seen >= rank:
+                    return min(self.highest(index) / 1000000.0, self.max)
+            return self.max
+
+    def snapshot(self):
+        snapshot = OrderedDict([
+            ('count', self.count), ('sum', self.sum), ('min', self.min), ('max', self.max)])
+        for q in self.quantiles:
+            snapshot['p' + '{0:g}'.format(q * 100).replace('.', '')] = self.quantile(q)
+        return snapshot
+
+    def samples(self):
+        for q in self.quantiles:
+            yield ('', {'quantile': repr(q)}, self.quantile(q))
+        yield ('_sum', {}, self.sum)
+        yield ('_count', {}, self.count)
+
+
+class Registry(object):
+    """Named metrics of a transport, metrics are created on first use by
+    counter(), gauge() and histogram() and then looked up by name."""
+    def __repr__(self):
+        return 'Registry(prefix={0}, metrics={1})'.format(self.prefix, list(self.metrics))
+
+    def __init__(self, prefix='emit'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def __iter__(self):
+        return iter(self.metrics.values())
+
+    def __contains__(self, name):
+        return name in self.metrics
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def counter(self, name, help='', func=None):
+        return self.register(Counter, name, help, func=func)
+
+    def gauge(self, name, help='', func=None):
+        return self.register(Gauge, name, help, func=func)
+
+    def histogram(self, name, help='', sub_bucket_bits=None):
+        return self.register(Histogram, name, help, sub_bucket_bits=sub_bucket_bits)
+
+    def register(self, metric_class, name, help='', **kwargs):
+        """Returns the metric called name, creating it if it does not exist. A
+        TypeError is raised if it exists as another type of metric."""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, help, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise TypeError('metric `{0}` is a {1}'.format(
+                    name, metric.__class__.__name__))
+            return metric
+
+    def snapshot(self):
+        """Returns a dict of each metric name to it's current value, histograms
+        give a dict of their count, sum, min, max and quantiles."""
+        return OrderedDict((metric.name, metric.snapshot()) for metric in self)
+
+    def prometheus(self, labels=None):
+        """Returns the metrics in the Prometheus text exposition format, names
+        are prefixed by `prefix` and every sample has the given labels."""
+        lines = []
+
+        for metric in self:
+            name = '{0}_{1}'.format(self.prefix, metric.name) if self.prefix else metric.name
+            family = name + metric.suffix
+            if metric.help:
+                lines.append('# HELP {0} {1}'.format(
+                    family, metric.help.replace('\\', r'\\').replace('\n', r'\n')))
+            lines.append('# TYPE {0} {1}'.format(family, metric.type))
+
+            for (suffix, sample_labels, value) in metric.samples():
+                sample_labels = dict(labels or {}, **sample_labels)
+                lines.append('{0}{1}{2} {3}'.format(
+                    name, suffix, _prometheus_labels(sample_labels),
+                    _prometheus_value(value)))
+        return '\n'.join(lines) + '\n'
@@ -1,10 +1,17 @@
 from __future__ import absolute_import
+import os
+import re
 import sys
 import time
-import operator
+import zlib
+import heapq
+import random
+import struct
+import itertools
+from collections import deque, Counter
 from datetime import datetime
-from .utils import Backoff, Tracker
-from .globals import log
+from .utils import Backoff, Tracker, _payload_size
+from .globals import log, conf
 
 
 try:
@@ -13,11 +20,12 @@ except ImportError:
     import Queue as queue
 
 
-Queues = ['Queue']
+Queues = ['Queue', 'SpillQueue']
 
 
 __all__ = Queues + [
-    'Queues', 'Empty', 'QueueItem', 'TailQueueItem', 'HeadQueueItem']
+    'Queues', 'Empty', 'QueueItem', 'TailQueueItem', 'HeadQueueItem',
+    'QueueSchedule']
 
 
 class QueueItem(Tracker, object):
@@ -25,6 +33,10 @@ class QueueItem(Tracker, object):
         return '{0}(attempts={1}, last={2}, payload={3})'.format(
             self.__class__.__name__, self.attempts, self.last_attempt, repr(self.payload))
 
+    # Set once the item is counted by the enqueued count of a queue, so it is
+    # not counted again when moved to another queue.
+    counted = False
+
     def __init__(self, payload, *args, **kwargs):
         super(QueueItem, self).__init__(*args, **kwargs)
         self.payload = payload
@@ -70,10 +82,174 @@ class QueueStat(object):
                 self.oldest = item
 
 
+class QueueSchedule(object):
+    """Holds the items of a Queue in the order they become eligible for
+    delivery. Items are kept in four tiers, each one is only visited once every
+    tier before it has nothing ready:
+
+      head: items with negative attempts (HeadQueueItem), first in first out
+      ready: items that have not been attempted yet, first in first out
+      retry: attempted items in a min-heap keyed by the time they expire
+      tail: TailQueueItem objects, first in first out
+
+    Items attempted while sitting in the ready tier are moved to the retry heap
+    when they reach the front of it. Entries in the heap are re-keyed when the
+    item expiry no longer matches the key it was pushed with, after a reset of
+    the items the schedule should be rebuilt with requeue()."""
+    def __repr__(self):
+        return '{0}(head={1}, ready={2}, retry={3}, tail={4})'.format(
+            self.__class__.__name__, len(self.head), len(self.ready),
+            len(self.retry), len(self.tail))
+
+    def __init__(self):
+        self.head = deque()
+        self.ready = deque()
+        self.retry = []
+        self.tail = deque()
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self.head) + len(self.ready) + len(self.retry) + len(self.tail)
+
+    def __iter__(self):
+        return itertools.chain(
+            self.head, self.ready, (entry[2] for entry in self.retry), self.tail)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    @staticmethod
+    def deadline(item):
+        """Returns the datetime the backoff period of item expires."""
+        if item.last_attempt is None:
+            return datetime.min
+        try:
+            return item.last_attempt + item.delta()
+        except OverflowError:
+            return datetime.max
+
+    def append(self, item):
+        attempts = getattr(item, 'attempts', 0)
+
+        if attempts < 0:
+            self.head.append(item)
+        elif isinstance(item, TailQueueItem):
+            self.tail.append(item)
+        elif attempts > 0:
+            self._push(item)
+        else:
+            self.ready.append(item)
+
+    def popleft(self):
+        """Removes and returns the next item eligible for delivery, or None if
+        every item is still within it's backoff period."""
+        if self.head:
+            return self.head.popleft()
+        while self.ready:
+            if getattr(self.ready[0], 'attempts', 0) <= 0:
+                return self.ready.popleft()
+            self._push(self.ready.popleft())
+        while self.retry:
+            (deadline, _, item) = self.retry[0]
+
+            if item.attempts <= 0:
+                return heapq.heappop(self.retry)[2]
+            if deadline != self.deadline(item):
+                heapq.heapreplace(
+                    self.retry, (self.deadline(item), next(self._counter), item))
+                continue
+            if item.expired():
+                return heapq.heappop(self.retry)[2]
+            break
+        if self.tail:
+            return self.tail.popleft()
+        return None
+
+    def expires(self):
+        """Returns the earliest datetime a retry item in the heap expires, None
+        when there are no retry items."""
+        if not self.retry:
+            return None
+        return self.retry[0][0]
+
+    def evict(self, predicate=None):
+        """Removes and returns the first ready item, or the retry item due
+        first, for which predicate is true. Head and tail items are never
+        evicted, None is returned when no item qualifies."""
+        if predicate is None:
+            if self.ready:
+                return self.ready.popleft()
+            if self.retry:
+                return heapq.heappop(self.retry)[2]
+            return None
+        for (index, item) in enumerate(self.ready):
+            if predicate(item):
+                del self.ready[index]
+                return item
+        for (index, entry) in enumerate(self.retry):
+            if predicate(entry[2]):
+                self.retry[index] = self.retry[-1]
+                self.retry.pop()
+                heapq.heapify(self.retry)
+                return entry[2]
+        return None
+
+    def requeue(self):
+        """Places every item into the tier it currently belongs to."""
+        items = list(self)
+        self.clear()
+        for item in items:
+            self.append(item)
+
+    def clear(self):
+        self.head.clear()
+        self.ready.clear()
+        del self.retry[:]
+        self.tail.clear()
+
+    def _push(self, item):
+        heapq.heappush(self.retry, (self.deadline(item), next(self._counter), item))
+
+
+# Name and tid of an event held in a json payload, used by the drop_priority policy
+_payload_name = re.compile(r'"name":\s*"([^"]*)"')
+_payload_tid = re.compile(r'"tid":\s*"([^"]*)"')
+
+
+def _payload_field(payload, key, pattern):
+    """Returns the string value of key in an event or its json payload."""
+    if isinstance(payload, basestring):
+        match = pattern.search(payload)
+        return match.group(1) if match else ''
+    return getattr(payload, 'get', lambda key: None)(key) or ''
+
+
 class Queue(queue.Queue):
     """Number of items which may be enqueued before blocking."""
     MAX_SIZE = 0  # Never block, queue forever
 
+    # What put() does with a new item once MAX_SIZE items are queued:
+    #   block: wait up to the put timeout for room, then drop the new item
+    #   drop_newest: drop the new item
+    #   drop_oldest: evict the item that would be delivered next
+    #   drop_priority: drop the new item or evict the oldest one if it is an
+    #     event named by shed_names, otherwise evict the oldest item. The
+    #     queued event paired with a shed one is shed along with it.
+    #   sample: keep a uniform sample of the items put while full
+    OVERFLOW_POLICY = 'block'
+    overflow_policies = ['block', 'drop_newest', 'drop_oldest', 'drop_priority', 'sample']
+
+    # Last component of event names shed first by drop_priority
+    shed_names = ('enter', 'exit')
+
+    # Last components of the names of events emitted in pairs for one tid,
+    # drop_priority never sheds one of them while the other stays queued.
+    paired_names = (('open', 'close'), ('enter', 'exit'))
+
+    # Payloads given to offer() on an unbounded queue are appended to an inbox
+    # without taking the mutex, get() moves them into the schedule.
+    buffered = True
+
     def __len__(self):
         return self.qsize()
 
@@ -84,16 +260,134 @@ class Queue(queue.Queue):
     def __init__(self, **kwargs):
         queue.Queue.__init__(self, kwargs.get('max_size', Queue.MAX_SIZE))
         self._backoff = kwargs.get('backoff', Backoff())
+        self.overflow_policy = kwargs.get('overflow_policy', Queue.OVERFLOW_POLICY)
+        if not (self.overflow_policy in self.overflow_policies):
+            raise ValueError('`{0}` is not a known overflow policy'.format(self.overflow_policy))
+
+        # Number of items shed by each overflow policy
+        self.shed = Counter()
+        self._overflowed = 0
 
     def put(self, payload, block=True, timeout=None, queue_item_class=QueueItem):
         return self.put_item(
             queue_item_class(payload, backoff=self._backoff), block, timeout)
 
     def put_item(self, item, block=True, timeout=None):
+        """Puts item into the queue and returns it, or None if the overflow
+        policy shed it. Items that were attempted and head or tail items are
+        always admitted, so a worker never blocks returning an item."""
         assert isinstance(item, QueueItem), '`item` must be a QueueItem obj'
-        queue.Queue.put(self, item, block, timeout)
+        if self.maxsize <= 0:
+            with self.mutex:
+                # Items are placed relative to those already offered
+                self._drain()
+                self._admit(item)
+            return item
+        if item.attempts != 0:
+            with self.mutex:
+                self._admit(item)
+            return item
+        if self.overflow_policy == 'block':
+            try:
+                queue.Queue.put(self, item, block, timeout)
+                return item
+            except queue.Full:
+                with self.mutex:
+                    self.shed['block'] += 1
+                return None
+        with self.mutex:
+            if self._qsize() < self.maxsize:
+                self._overflowed = 0
+            elif not self._overflow(item):
+                return None
+            self._admit(item)
+            return item
+
+    def offer(self, payload, timeout=None):
+        """Puts payload into the queue like put(), for callers that emit from
+        many threads. New items of an unbounded queue are appended to an inbox,
+        deque.append is atomic so the mutex is only taken to wake a get() that
+        is waiting on an empty queue."""
+        if self.maxsize > 0 or not self.buffered:
+            return self.put(payload, True, timeout)
+        item = QueueItem(payload, backoff=self._backoff)
+        self._inbox.append(item)
+        if self._waiters:
+            with self.mutex:
+                self.not_empty.notify()
         return item
 
+    def _admit(self, item):
+        self._put(item)
+        self.unfinished_tasks += 1
+        self.not_empty.notify()
+
+    def _overflow(self, item):
+        """Makes room for item in a full queue according to the overflow
+        policy. Returns False when item is to be dropped instead."""
+        policy = self.overflow_policy
+        evicted = None
+
+        if policy == 'drop_oldest':
+            evicted = self.queue.evict()
+        elif policy == 'drop_priority':
+            if self._sheddable(item):
+                self._evict_pair(item)
+            else:
+                evicted = self.queue.evict(self._sheddable) or self.queue.evict()
+                if evicted is not None:
+                    self._evict_pair(evicted)
+        elif policy == 'sample':
+            # Reservoir sampling, the n-th item put while full replaces a
+            # random ready item with a probability of MAX_SIZE / n.
+            self._overflowed += 1
+            index = random.randrange(self.maxsize + self._overflowed)
+            if index < len(self.queue.ready):
+                evicted = self.queue.ready[index]
+                del self.queue.ready[index]
+
+        self.shed[policy] += 1
+        if evicted is None:
+            return False
+        self._evicted(evicted)
+        return True
+
+    def _evicted(self, item):
+        self.unfinished_tasks -= 1
+        self.bytes -= _payload_size(item.payload)
+
+    def _evict_pair(self, item):
+        """Evicts the queued event paired with item, which is being shed, such
+        as the close event of an open event with the same tid."""
+        pairing = self._pairing(item)
+        if pairing is None:
+            return
+        evicted = self.queue.evict(lambda other: (self._pairing(other) or (None,))[0] == pairing[1])
+        if evicted is not None:
+            self.shed[self.overflow_policy] += 1
+            self._evicted(evicted)
+
+    def _pairing(self, item):
+        """Returns a tuple of the keys of item and of the event paired with it,
+        or None if item is not one of paired_names."""
+        pairing = getattr(item, 'pairing', False)
+        if pairing is False:
+            pairing = None
+            (prefix, _, last) = _payload_field(item.payload, 'name', _payload_name).rpartition('.')
+            for pair in self.paired_names:
+                if last in pair:
+                    tid = _payload_field(item.payload, 'tid', _payload_tid)
+                    pairing = ((tid, prefix, last), (tid, prefix, pair[1 - pair.index(last)]))
+            item.pairing = pairing
+        return pairing
+
+    def _sheddable(self, item):
+        sheddable = getattr(item, 'sheddable', None)
+        if sheddable is None:
+            name = _payload_field(item.payload, 'name', _payload_name)
+            sheddable = item.sheddable = name.rsplit('.', 1)[-1] in self.shed_names
+        return sheddable
+
     def put_head(self, payload, block=True, timeout=None):
         return self.put(
             payload, block, timeout, queue_item_class=HeadQueueItem)
@@ -114,7 +408,7 @@ class Queue(queue.Queue):
                     raise Empty
             elif timeout is None:
                 while not item:
-                    self.not_empty.wait()
+                    self._wait(self._wait_time())
                     item = self._get()
             elif timeout < 0:
                 raise ValueError("'timeout' must be a non-negative number")
@@ -125,55 +419,412 @@ class Queue(queue.Queue):
                     remaining = endtime - time.time()
                     if remaining <= 0.0:
                         raise Empty
-                    self.not_empty.wait(remaining)
+                    self._wait(self._wait_time(remaining))
                     item = self._get()
+            self.bytes -= _payload_size(item.payload)
             self.not_full.notify()
             return item
 
+    def task_done(self, item=None):
+        """Indicate a formerly enqueued task is complete, `item` is the item
+        that was returned by get() for queues that track them."""
+        queue.Queue.task_done(self)
+
+    def persist(self):
+        """Called by workers exiting with items left in the queue, queues able
+        to keep them beyond this process do so here. Returns the number of
+        items persisted."""
+        return 0
+
+    def join(self):
+        with self.mutex:
+            self._drain()
+        queue.Queue.join(self)
+
     def stat(self):
         with self.mutex:
-            self._sort()
+            self._drain()
             return QueueStat(self)
 
     def reset(self):
         with self.mutex:
             log('Queue.reset() - resetting queue')
+            self._drain()
             for item in self.queue:
                 item.reset()
+            self.queue.requeue()
 
     def clear(self):
         with self.mutex:
             log('Queue.clear() - clearing all items from queue')
-            del self.queue[:]
+            self._inbox.clear()
+            self.queue.clear()
             self.all_tasks_done.notify_all()
             self.unfinished_tasks = 0
-
-    def _sort(self):
-        self.queue.sort(key=operator.attrgetter('attempts', 'last_attempt'))
+            self.bytes = 0
+
+    def _wait_time(self, remaining=None):
+        """Returns the seconds get() may wait for a new item before the next
+        retry item expires, capped at remaining. None means wait forever."""
+        expires = self.queue.expires()
+
+        if expires is None:
+            return remaining
+        wait = max((expires - datetime.utcnow()).total_seconds(), 0)
+        return wait if remaining is None else min(wait, remaining)
+
+    def _wait(self, timeout):
+        """Waits on not_empty for up to timeout, called with the mutex held.
+        The waiter is counted before the inbox is checked, so put() either
+        appended before the check or sees the waiter and notifies."""
+        self._waiters += 1
+        try:
+            if not self._inbox:
+                self.not_empty.wait(timeout)
+        finally:
+            self._waiters -= 1
+
+    def _drain(self):
+        """Moves the items in the inbox into the schedule, called with the
+        mutex held."""
+        inbox = self._inbox
+        while inbox:
+            self._put(inbox.popleft())
+            self.unfinished_tasks += 1
 
     def _init(self, maxsize):
-        self.queue = []
+        self.queue = QueueSchedule()
+        self._inbox = deque()
+        self._waiters = 0
+
+        # Bytes of the string payloads held, see utils._payload_size
+        self.bytes = 0
+
+        # New items put into the schedule, counted with the mutex held so the
+        # enqueued metric of a transport costs emit nothing. Offered items are
+        # counted once they are moved out of the inbox.
+        self.enqueued = 0
 
     def _qsize(self, len=len):
-        return len(self.queue)
+        return len(self.queue) + len(self._inbox)
 
     def _put(self, item):
         log('Queue._put() - put item {} into queue'.format(item))
         self.queue.append(item)
+        self.bytes += _payload_size(item.payload)
+        if not (item.attempts or item.counted):
+            item.counted = True
+            self.enqueued += 1
+
+    def _get(self):
+        self._drain()
+        return self.queue.popleft()
+
+
+class _Segment(object):
+    """Append only file of framed payloads for a `SpillQueue`. Each record is
+    the payload length and it's crc32 as big endian unsigned ints followed by
+    the payload bytes."""
+    frame = struct.Struct('>II')
+
+    def __repr__(self):
+        return '_Segment(path={0}, written={1}, read={2}, acked={3})'.format(
+            self.path, self.written, self.read, self.acked)
+
+    def __init__(self, path, seq):
+        self.path = path
+        self.seq = seq
+        self.written = 0
+        self.read = 0
+        self.acked = 0
+        self.size = 0
+        self.offset = 0
+        self.writer = None
+        self.reader = None
+        self.removed = False
+
+    @classmethod
+    def create(cls, path, seq):
+        segment = cls(path, seq)
+        segment.writer = open(path, 'ab')
+        return segment
+
+    @classmethod
+    def recover(cls, path, seq):
+        """Returns the segment at path holding every record up to the first
+        frame that is truncated or fails it's checksum."""
+        segment = cls(path, seq)
+
+        with open(path, 'rb') as f:
+            while True:
+                payload = segment._read_record(f)
+                if payload is None:
+                    break
+                segment.written += 1
+                segment.size += segment.frame.size + len(payload)
+        return segment
+
+    @property
+    def done(self):
+        """True once every record is written, read and acknowledged."""
+        return self.writer is None and self.acked >= self.written
+
+    def append(self, payload):
+        if isinstance(payload, unicode):
+            payload = payload.encode('utf-8')
+        self.writer.write(self.frame.pack(
+            len(payload), zlib.crc32(payload) & 0xffffffff) + payload)
+        self.writer.flush()
+        self.written += 1
+        self.size += self.frame.size + len(payload)
+
+    def next(self):
+        """Returns the next unread payload, None when the segment is exhausted."""
+        if self.read >= self.written:
+            return None
+        if self.reader is None:
+            self.reader = open(self.path, 'rb')
+        payload = self._read_record(self.reader)
+        if payload is None:
+            log.error('SpillQueue - segment {0} is corrupt after {1} records, '
+                      'dropping the remaining {2}'.format(
+                          self.path, self.read, self.written - self.read))
+            self.acked += self.written - self.read
+            self.written = self.read
+            return None
+        self.read += 1
+        self.offset += self.frame.size + len(payload)
+        return payload
+
+    def seal(self):
+        """Stops writing, the records are synced to disk before returning."""
+        if self.writer is not None:
+            os.fsync(self.writer.fileno())
+            self.writer.close()
+            self.writer = None
+
+    def remove(self):
+        if self.removed:
+            return
+        self.removed = True
+        self.seal()
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            log('SpillQueue - unable to remove segment {0}'.format(self.path))
+            log.exception(e)
+
+    def _read_record(self, f):
+        header = f.read(self.frame.size)
+        if len(header) < self.frame.size:
+            return None
+        (length, crc) = self.frame.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or (zlib.crc32(payload) & 0xffffffff) != crc:
+            return None
+        return payload
+
+
+class SpillQueue(Queue):
+    """Queue holding at most `memory_size` items in memory, new string payloads
+    past that are appended to segment files within `directory` and read back
+    in order as room is made. Segments left by an earlier process are replayed
+    first when the queue is created, a segment is deleted once every record in
+    it has been acknowledged through task_done().
+
+    Delivery is at least once, records of a segment that was not fully
+    acknowledged when the process exited are replayed again. Payloads that are
+    not strings, such as worker sentinels, and items returned for a retry are
+    always kept in memory. The directory must not be shared by other queues."""
+    MEMORY_SIZE = 10000
+    SEGMENT_SIZE = 16 * 1024 * 1024  # Bytes written before starting a new segment
+
+    # Items are spilled as they are offered, never buffered in an inbox
+    buffered = False
+
+    def __repr__(self):
+        return '{0}(size={1}, spilled={2}, backoff={3})'.format(
+            self.__class__.__name__, self._qsize(), self._spilled, self._backoff)
+
+    def __init__(self, **kwargs):
+        self.directory = kwargs.get('directory') or conf.spill_dir
+        if not self.directory:
+            raise ValueError('SpillQueue requires a `directory` or conf.spill_dir')
+        self.memory_size = kwargs.get('memory_size', SpillQueue.MEMORY_SIZE)
+        self.segment_size = kwargs.get('segment_size', SpillQueue.SEGMENT_SIZE)
+        Queue.__init__(self, **kwargs)
+
+        # Replayed items count as enqueued tasks
+        self.unfinished_tasks = self._spilled
+
+    def _init(self, maxsize):
+        Queue._init(self, maxsize)
+
+        # Segments with unread records in the order they are read, the last
+        # one may be the tail new records are appended to.
+        self._segments = deque()
+        self._tail = None
+        self._spilled = 0
+
+        # Lowest and highest segment numbers, persist() writes below the first
+        self._first = 0
+        self._last = -1
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('segment-') and name.endswith('.log'):
+                try:
+                    segments.append((int(name[8:-4]), name))
+                except ValueError:
+                    pass
+        for (seq, name) in sorted(segments):
+            self._recover(seq, name)
+
+    def _recover(self, seq, name):
+        path = os.path.join(self.directory, name)
+        self._first = min(self._first, seq)
+        self._last = max(self._last, seq)
+        try:
+            segment = _Segment.recover(path, seq)
+        except IOError as e:
+            log.error('SpillQueue - unable to recover segment {0}'.format(path))
+            log.exception(e)
+            return
+        if not segment.written:
+            segment.remove()
+            return
+        log('SpillQueue - replaying {0} items from segment {1}'.format(
+            segment.written, path))
+        self._segments.append(segment)
+        self._spilled += segment.written
+        self.bytes += segment.size - segment.frame.size * segment.written
+
+    def _segment(self, seq):
+        """Returns a new segment, seq orders it among the others. Persisted
+        segments are read before the first one so seq may go below zero."""
+        self._first = min(self._first, seq)
+        self._last = max(self._last, seq)
+        name = 'segment-{0:020d}.log'.format(seq)
+        return _Segment.create(os.path.join(self.directory, name), seq)
+
+    def _spillable(self, item):
+        return type(item) is QueueItem and item.attempts == 0 and \
+            isinstance(item.payload, basestring)
+
+    def _qsize(self, len=len):
+        return len(self.queue) + self._spilled
+
+    def _put(self, item):
+        if getattr(item, 'segment', None) is not None:
+            item.queued = True
+        if self._spillable(item) and (
+                self._spilled or len(self.queue) >= self.memory_size):
+            self._append(item.payload)
+            self.bytes += _payload_size(item.payload)
+            if not item.counted:
+                self.enqueued += 1
+            return
+        Queue._put(self, item)
+
+    def _append(self, payload):
+        if self._tail is None or self._tail.size >= self.segment_size:
+            if self._tail is not None:
+                self._seal(self._tail)
+            self._tail = self._segment(self._last + 1)
+            self._segments.append(self._tail)
+        self._tail.append(payload)
+        self._spilled += 1
+
+    def _seal(self, segment):
+        if segment is self._tail:
+            self._tail = None
+        segment.seal()
 
     def _get(self):
-        self._sort()
-
-        for (index, item) in enumerate(self.queue):
-            if item.attempts > 0:
-                if item.expired():
-                    log.debug('Queue._get() - {} has {} attempts, elapsed is {} making it eligible for retry'.format(
-                        item, item.attempts, item.elapsed()))
-                    return self.queue.pop(index)
-                else:
-                    log.debug('Queue._get() - {} has {} attempts and is ineligible for retry until {}'.format(
-                        item, item.attempts, item.expires()))
+        self._fill()
+        item = self.queue.popleft()
+        if getattr(item, 'segment', None) is not None:
+            item.queued = False
+        return item
+
+    def _fill(self):
+        """Moves records from the segments into memory until it is full."""
+        while self._spilled and len(self.queue) < self.memory_size:
+            segment = self._segments[0]
+            unread = segment.written - segment.read
+            unread_bytes = segment.size - segment.offset - segment.frame.size * unread
+            payload = segment.next()
+
+            if payload is None:
+                self._spilled -= unread
+                self.bytes -= unread_bytes
             else:
-                log.debug('Queue._get() - {} is ready for first attempt'.format(item))
-                return self.queue.pop(index)
-        return None
+                self._spilled -= 1
+                item = QueueItem(payload, backoff=self._backoff)
+                item.segment = segment
+                item.queued = True
+                item.counted = True
+                self.queue.append(item)
+            if segment.read >= segment.written:
+                self._segments.popleft()
+                self._seal(segment)
+                self._release(segment)
+
+    def _release(self, segment):
+        """Removes segment once it is fully read and acknowledged."""
+        if segment.done and not (segment in self._segments):
+            segment.remove()
+
+    def _ack(self, item):
+        segment = item.segment
+        item.segment = None
+        segment.acked += 1
+        self._release(segment)
+
+    def task_done(self, item=None):
+        with self.all_tasks_done:
+            if getattr(item, 'segment', None) is not None and not item.queued:
+                self._ack(item)
+        Queue.task_done(self, item)
+
+    def persist(self):
+        """Writes the string payloads held in memory to a new segment that is
+        read before every other one and syncs it. Returns the number of items
+        written."""
+        with self.mutex:
+            items = [item for item in self.queue if isinstance(item.payload, basestring)]
+            if not len(items):
+                return 0
+            segment = self._segment(self._first - 1)
+
+            for item in items:
+                segment.append(item.payload)
+            segment.seal()
+            self._segments.appendleft(segment)
+            self._spilled += segment.written
+
+            # Each item now has a copy in the new segment
+            keep = [item for item in self.queue if not isinstance(item.payload, basestring)]
+            self.queue.clear()
+            for item in keep:
+                self.queue.append(item)
+            for item in items:
+                if getattr(item, 'segment', None) is not None:
+                    self._ack(item)
+            log('SpillQueue.persist() - wrote {0} items to {1}'.format(
+                len(items), segment.path))
+            return len(items)
+
+    def clear(self):
+        with self.mutex:
+            for segment in self._segments:
+                segment.remove()
+            self._segments.clear()
+            self._tail = None
+            self._spilled = 0
+        Queue.clear(self)
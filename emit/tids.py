@@ -0,0 +1,112 @@
+import os
+import time
+import struct
+import threading
+from uuid import uuid4, uuid5, UUID, NAMESPACE_URL
+from .utils import LruCache
+
+
+TidGenerators = ['TidGenerator', 'Uuid7TidGenerator', 'Uuid5TidGenerator']
+
+
+__all__ = TidGenerators + ['TidGenerators', 'EntropyPool']
+
+
+class EntropyPool(object):
+    """Thread safe buffer of random bytes, reading `size` bytes at a time from
+    os.urandom so callers needing a few bytes don't make a read each."""
+    def __repr__(self):
+        return 'EntropyPool(size={0})'.format(self.size)
+
+    def __init__(self, size=4096):
+        if size <= 0:
+            raise ValueError('`size` must be greater than zero')
+        self.size = size
+        self.lock = threading.Lock()
+        self.buffer = ''
+        self.offset = 0
+
+    def read(self, n):
+        """Returns `n` random bytes, refilling the pool when it runs out."""
+        with self.lock:
+            if self.offset + n > len(self.buffer):
+                self.buffer = os.urandom(max(self.size, n))
+                self.offset = 0
+            start, self.offset = self.offset, self.offset + n
+            return self.buffer[start:self.offset]
+
+
+class TidGenerator(object):
+    """Calling a tid generator returns a new transaction id string. This base
+    class returns a random RFC 4122 version 4 uuid like str(uuid4()). Generators
+    that derive tids from shared state use `name`, others ignore it."""
+    def __repr__(self):
+        return '{0}()'.format(self.__class__.__name__)
+
+    def __call__(self, name=None):
+        return str(uuid4())
+
+
+class Uuid7TidGenerator(TidGenerator):
+    """Returns time ordered uuids in the version 7 layout, a 48 bit unix time in
+    milliseconds followed by a 12 bit counter and 62 random bits. Ids from one
+    generator are strictly increasing, within a millisecond the counter is
+    incremented and once it overflows the time is advanced by a millisecond.
+    Random bits are read from an `EntropyPool`."""
+    counter_bits = 12
+
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else EntropyPool()
+        self.lock = threading.Lock()
+        self.last = 0
+        self.counter = 0
+
+    def __call__(self, name=None):
+        random, seed = struct.unpack('>QH', self.pool.read(10))
+        now = int(time.time() * 1000)
+
+        with self.lock:
+            if now > self.last:
+                self.last = now
+
+                # Seed below the midpoint to leave room for increments
+                self.counter = seed >> (16 - self.counter_bits + 1)
+            else:
+                self.counter += 1
+                if self.counter >> self.counter_bits:
+                    self.last += 1
+                    self.counter = 0
+            millis, counter = self.last, self.counter
+
+        random &= 0x3fffffffffffffff
+        return '{0:08x}-{1:04x}-{2:04x}-{3:04x}-{4:012x}'.format(
+            millis >> 16, millis & 0xffff, 0x7000 | counter,
+            0x8000 | (random >> 48), random & 0xffffffffffff)
+
+
+class Uuid5TidGenerator(TidGenerator):
+    """Returns RFC 4122 version 5 uuids derived from `name` within `namespace`,
+    so each touch point of a transaction may compute the same tid from state it
+    shares. Tids are cached by name, without a name `fallback` is called."""
+    def __repr__(self):
+        return '{0}(namespace={1})'.format(self.__class__.__name__, self.namespace)
+
+    def __init__(self, namespace=None, maxsize=1024, fallback=None):
+        if namespace is None:
+            namespace = NAMESPACE_URL
+        elif not isinstance(namespace, UUID):
+            namespace = UUID(namespace)
+        self.namespace = namespace
+        self.fallback = fallback if fallback is not None else Uuid7TidGenerator()
+        self.cache = LruCache(maxsize)
+
+    def __call__(self, name=None):
+        if name is None:
+            return self.fallback()
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        tid = self.cache.get(name)
+        if tid is None:
+            tid = str(uuid5(self.namespace, name))
+            self.cache.put(name, tid)
+        return tid
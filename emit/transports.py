@@ -1,19 +1,32 @@
+import os
+import re
+import json
+import zlib
+import itertools
 import threading
+from collections import Counter
 from datetime import timedelta, datetime
 from .queue import Empty
-from .utils import Backoff, Tracker, _timeout_delta
-from .globals import log, ConfigDescriptor
-from .adapters import (AdapterError, AdapterClosedError, AdapterEmitError, AdapterEmitPermanentError)
+from .utils import Backoff, Tracker, _timeout_delta, _timeout_seconds, _payload_size
+from .globals import log, conf, ConfigDescriptor
+from .event import Event, EventRecord
+from .metrics import Registry
+from .adapters import (
+    AdapterError, AdapterClosedError, AdapterEmitError, AdapterEmitPermanentError, ProcessAdapter)
 
 
 Transports = ['Transport', 'Group']
-Workers = ['Worker', 'ThreadedWorker']
+Workers = ['Worker', 'ThreadedWorker', 'ProcessWorker', 'WorkerPool']
 
 
 __all__ = Transports + Workers + [
     'Transports', 'Workers', 'WorkerError', 'WorkerStoppedError']
 
 
+# Transaction id held in a json payload, used to partition a WorkerPool
+_payload_tid = re.compile(r'"tid":\s*"((?:[^"\\]|\\.)*)"')
+
+
 class WorkerError(Exception):
     """Base error for workers to share."""
     def __init__(self, trigger=None):
@@ -24,6 +37,74 @@ class WorkerStoppedError(WorkerError):
     """Indicates the worker has stopped abnormally."""
 
 
+class _WorkerRegistry(object):
+    """Running ThreadedWorkers by their transport, at most one may run for a
+    transport at a time. The first worker to register starts a daemon thread
+    that joins the main thread, once it exits every registered worker is asked
+    to stop. The interpreter waits for non-daemon threads such as workers
+    before atexit hooks run, so a hook would be too late."""
+    def __repr__(self):
+        return '_WorkerRegistry(workers={0})'.format(len(self.workers))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.watchdog = None
+        self.pid = os.getpid()
+
+    def register(self, worker):
+        """Registers worker, returns False if another running worker that is
+        not stopping belongs to the same transport."""
+        if self.pid != os.getpid():
+            self.forked()
+        with self.lock:
+            other = self.workers.get(worker.t)
+            if other is not None and other is not worker and \
+                    other.is_alive() and not other._stopping.isSet():
+                return False
+            self.workers[worker.t] = worker
+
+            if self.watchdog is None or not self.watchdog.is_alive():
+                main = [t for t in threading.enumerate() if isinstance(t, threading._MainThread)]
+                self.watchdog = threading.Thread(
+                    target=self.watch, args=main, name='emit-watchdog')
+                self.watchdog.daemon = True
+                self.watchdog.start()
+            return True
+
+    def forked(self):
+        """Resets the registry within a forked child. The workers and watchdog
+        inherited from the parent are not running in the child, and the lock
+        may have been held by a thread which no longer exists."""
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.watchdog = None
+        self.pid = os.getpid()
+
+    def unregister(self, worker):
+        with self.lock:
+            if self.workers.get(worker.t) is worker:
+                del self.workers[worker.t]
+
+    def watch(self, main=None):
+        """Watchdog thread target, there is nothing to watch when the main
+        thread is unknown such as within an embedded interpreter."""
+        if main is None:
+            return
+        main.join()
+        self.main_thread_exited()
+
+    def main_thread_exited(self):
+        with self.lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.main_thread_exited()
+
+
+# Registry of running workers
+_workers = _WorkerRegistry()
+
+
 class Worker(object):
     def __init__(self, transport, tracker=None):
         self.tracker = tracker if tracker is not None else Tracker(Backoff(10))
@@ -48,6 +129,16 @@ class Worker(object):
         """Forwards to transports adapter."""
         return self.transport.adapter
 
+    @property
+    def metrics(self):
+        """Forwards to transports metrics."""
+        return self.transport.metrics
+
+    def offer(self, payload, timeout=None):
+        """Called from transport thread. Puts payload into the queue this
+        worker delivers from, see `Queue.offer`."""
+        return self.q.offer(payload, timeout)
+
     def flush(self, timeout):
         """Forwards to adapter flush."""
         try:
@@ -67,6 +158,8 @@ class Worker(object):
         self.work(timeout)
         self.flush(self.t.max_flush_time)
         self.adapter.close()
+        if not self.q.empty():
+            self.q.persist()
 
     def halt(self):
         """Halts worker immediately without flushing any items."""
@@ -119,16 +212,19 @@ class Worker(object):
             log.exception(e)
 
     def process_queue(self, timeout):
-        item = None
+        items = []
 
         try:
-            item = self.fetch_item()
+            items = self.fetch_items()
 
             # check the adapter
             self.check_adapter(timeout)
 
-            # Process our item
-            self.process_item(item)
+            # Process our items, a batch of one takes the regular emit path
+            if len(items) > 1:
+                self.process_batch(items)
+            else:
+                self.process_item(items[0])
 
             # We may have more items remaining since we were not empty
             return True
@@ -137,12 +233,36 @@ class Worker(object):
             return False
 
         finally:
-            if item:
-                self.q.task_done()
+            for item in items:
+                self.q.task_done(item)
 
     def fetch_item(self):
         return self.q.get(False)
 
+    def fetch_items(self):
+        """Fetches the next item with fetch_item, then keeps taking ready items
+        from the queue until the batch holds max_batch_size items or at least
+        max_batch_bytes of payload. Once the batch has it's first item we wait
+        at most max_batch_linger for more to arrive. A max_batch_size of 1 uses
+        the batch_size of the adapter instead."""
+        items = [self.fetch_item()]
+        max_items = self.t.max_batch_size
+        if max_items == 1:
+            max_items = getattr(self.adapter, 'batch_size', 1)
+        max_bytes = self.t.max_batch_bytes
+        size = _payload_size(items[0].payload)
+        expires = datetime.utcnow() + timedelta(
+            seconds=_timeout_seconds(self.t.max_batch_linger))
+
+        while len(items) < max_items and (max_bytes <= 0 or size < max_bytes):
+            remaining = (expires - datetime.utcnow()).total_seconds()
+            try:
+                items.append(self.q.get(remaining > 0, remaining))
+            except Empty:
+                break
+            size += _payload_size(items[-1].payload)
+        return items
+
     def check_adapter(self, timeout):
         """Ensures the adapter is ready to emit messages. Returns True when the
         adapter is ready, False otherwise. May raise any adapter exception."""
@@ -175,31 +295,101 @@ class Worker(object):
         # We have an open adapter
         return True
 
+    def encode_item(self, item):
+        """Serializes the payload of an item holding an `Event` or `EventRecord`,
+        which is what an `Emitter` with defer_serialization enqueues. Returns
+        False when the event was invalid and has been dropped."""
+        if not isinstance(item.payload, (Event, EventRecord)):
+            return True
+        try:
+            item.payload.validate()
+            item.payload = item.payload.json
+            return True
+        except ValueError as e:
+            log.error('TransportWorker.encode_item - dropping invalid event for'
+                      ' item({0}): {1}'.format(item, e))
+            self.metrics['failed'].inc()
+            return False
+
+    def item_delivered(self, item):
+        """Records the delivery of item in the transport metrics."""
+        self.metrics['delivered'].inc()
+        self.metrics['delivery_seconds'].record(
+            (datetime.utcnow() - item.created).total_seconds())
+
+    def retry_item(self, item):
+        """Returns item to the queue to be attempted again after it's backoff."""
+        self.q.put_item(item)
+        self.metrics['retried'].inc()
+
     def process_item(self, item):
-        if item is None:
+        if item is None or not self.encode_item(item):
             return
         try:
 
             # attempt to deliver the item via adapter
             item.attempt()
-            self.adapter.emit(item.payload)
+            with self.metrics['emit_seconds'].time():
+                self.adapter.emit(item.payload)
             item.reset()
+            self.item_delivered(item)
 
         # Event can't be sent, we won't return it to the queue
         except AdapterEmitPermanentError:
             log.error('TransportWorker.process_queue - permanent failure for item({0})'.format(item))
+            self.metrics['failed'].inc()
 
         # Event wasn't sent, but adapter doesn't think the error is
         # permanent so return it to queue, no need to raise.
         except AdapterEmitError:
-            self.q.put_item(item)
+            self.retry_item(item)
 
         # Return this item to the queue and notify caller the adapter
         # has been closed unexpectedly.
         except AdapterClosedError:
-            self.q.put_item(item)
+            self.retry_item(item)
             raise
 
+    def process_batch(self, items):
+        """Delivers the payloads of items with a single adapter emit_batch call.
+        The outcome of each item is handled the same way process_item handles
+        the error raised by emit, except a AdapterClosedError is raised only
+        after every item has been accounted for."""
+        items = [item for item in items if self.encode_item(item)]
+        if not len(items):
+            return
+        for item in items:
+            item.attempt()
+        try:
+            with self.metrics['emit_seconds'].time():
+                errors = self.adapter.emit_batch([item.payload for item in items])
+
+        # Nothing was sent, every item is returned to the queue.
+        except AdapterClosedError:
+            for item in items:
+                self.retry_item(item)
+            raise
+        closed = None
+
+        for (item, error) in zip(items, errors):
+            if error is None:
+                item.reset()
+                self.item_delivered(item)
+
+            # Event can't be sent, we won't return it to the queue
+            elif isinstance(error, AdapterEmitPermanentError):
+                log.error('TransportWorker.process_batch - permanent failure for item({0})'.format(item))
+                self.metrics['failed'].inc()
+
+            # Return the item to the queue, if the adapter was closed we raise
+            # once the rest of the batch is accounted for.
+            else:
+                self.retry_item(item)
+                if isinstance(error, AdapterClosedError):
+                    closed = error
+        if closed is not None:
+            raise closed
+
 
 class ThreadedWorker(Worker, threading.Thread):
 
@@ -223,6 +413,13 @@ class ThreadedWorker(Worker, threading.Thread):
         self._stopping = threading.Event()
         self._stopping_timer = None
 
+        # Set by start() and cleared once run() returns, so the work() done
+        # by every emit is an attribute read and a pid check. The pid is the
+        # process that started the thread, a forked child inherits _live but
+        # not the thread.
+        self._live = False
+        self._pid = None
+
     @property
     def adapter(self):
         """We use a copy of the adapter instead of the transports."""
@@ -233,7 +430,13 @@ class ThreadedWorker(Worker, threading.Thread):
         has already been started."""
         if not self._started.isSet():
             self._started.set()
-            threading.Thread.start(self)
+            self._live = True
+            self._pid = os.getpid()
+            try:
+                threading.Thread.start(self)
+            except Exception:
+                self._live = False
+                raise
 
     def stop(self, timeout):
         """Called from transport thread. Asks the worker to stop. We will put a
@@ -263,8 +466,12 @@ class ThreadedWorker(Worker, threading.Thread):
 
     def work(self, timeout):
         """Called from transport thread. Check if alive and raise if not."""
-        if (not self._started.isSet()) or (self._started.isSet() and not self.is_alive()):
-            # If we already "started" the thread should be alive.
+        if not self._live:
+            # Not started yet, or run() has returned
+            raise WorkerStoppedError
+        if self._pid != os.getpid():
+            # Started by the parent of a forked process
+            self._live = False
             raise WorkerStoppedError
 
     def run(self):
@@ -272,10 +479,11 @@ class ThreadedWorker(Worker, threading.Thread):
         process = super(ThreadedWorker, self).process
 
         try:
+            self.check_orphaned()
+
             # Just work() until we are orphaned or stopping event
             while not self._stopping.isSet():
                 process(self.t.max_work_time)
-                self.check_orphaned()
                 self.check_flush()
 
             try:
@@ -300,36 +508,35 @@ class ThreadedWorker(Worker, threading.Thread):
                 if not self.q.empty():
                     log('ThreadedWorker.run - worker exiting with {}'
                         ' items stil in the queue'.format(len(self.q)))
+                    self.q.persist()
             finally:
                 if self._stopping_timer:
                     self._stopping_timer.cancel()
         except Exception as e:
             log('ThreadedWorker.run - uncaught exception')
             log.exception(e)
+        finally:
+            _workers.unregister(self)
+            self._live = False
 
     def check_orphaned(self):
-        """Check to see if we are an orphan or starting on top of ourself, if so
-        we will stop / halt."""
-        if self._stopping.isSet():
-            return
-        for t in threading.enumerate():
-            if isinstance(t, self.__class__) and t != self and t.t == self.t and t.is_alive():
-                with t.t.lock:
-                    if not t._stopping.isSet():
-                        self._stopping.set()
-                        self._halting.set()
-                        log('ThreadedWorker.check_orphaned - found another '
-                            'worker belonging to this transport, halting')
-                        return
-            if isinstance(t, threading._MainThread) and not t.is_alive():
-                stop_seconds = self.t.max_stopping_time.total_seconds()
-                msg = 'ThreadedWorker.check_orphaned - main thread has ' \
-                      'died, flushing queue for up to {} seconds'
-                log(msg.format(stop_seconds))
-                self._stopping.set()
-                self._stopping_timer = threading.Timer(
-                    stop_seconds, self._halting.set)
-                return
+        """Called once the thread starts running, registers the worker with
+        the registry of workers by transport. If the transport already has a
+        running worker we are starting on top of it and will halt."""
+        if not _workers.register(self):
+            self._stopping.set()
+            self._halting.set()
+            log('ThreadedWorker.check_orphaned - found another '
+                'worker belonging to this transport, halting')
+
+    def main_thread_exited(self):
+        """Called by the registry watchdog once the main thread has exited,
+        asks the worker to flush the queue for up to max_stopping_time."""
+        stop_seconds = self.t.max_stopping_time.total_seconds()
+        msg = 'ThreadedWorker.main_thread_exited - main thread has ' \
+              'died, flushing queue for up to {} seconds'
+        log(msg.format(stop_seconds))
+        self.q.put_head(self.StopWorker(seconds=stop_seconds))
 
     def check_flush(self):
         """This just checks a flag _flush_pending to be called when the worker
@@ -344,8 +551,19 @@ class ThreadedWorker(Worker, threading.Thread):
                 self._flush_pending = False
 
     def fetch_item(self):
-        """We override the Worker.fetch_item to make the request blocking."""
-        return self.q.get(True, self.t.max_work_time.total_seconds())
+        """We override the Worker.fetch_item to make the request blocking. Once
+        the queue is idle the adapter is flushed, then we wait without a
+        timeout: Queue.get wakes for a new item, a sentinel or the next retry
+        item in it's schedule. While stopping the wait is capped at
+        max_work_time so the stopping timer is noticed."""
+        try:
+            return self.q.get(False)
+        except Empty:
+            self.check_flush()
+        timeout = None
+        if self._stopping.isSet():
+            timeout = self.t.max_work_time.total_seconds()
+        return self.q.get(True, timeout)
 
     def process_item(self, item):
         """Override fetch item to check for our sentinels."""
@@ -362,6 +580,199 @@ class ThreadedWorker(Worker, threading.Thread):
             super(ThreadedWorker, self).process_item(item)
             self._flush_pending = True
 
+    def process_batch(self, items):
+        """Override process batch to give our sentinels to process_item before
+        the remaining items are given to the adapter."""
+        sentinels = (self.StopWorker, self.HaltWorker, self.FlushWorker)
+        batch = []
+
+        for item in items:
+            if isinstance(item.payload, sentinels):
+                self.process_item(item)
+            else:
+                batch.append(item)
+        if not len(batch):
+            return
+
+        # A halt was found within the batch, return the rest to the queue.
+        if self._halting.isSet():
+            for item in batch:
+                self.q.put_item(item)
+            return
+        super(ThreadedWorker, self).process_batch(batch)
+        self._flush_pending = True
+
+
+class ProcessWorker(ThreadedWorker):
+    """ThreadedWorker delivering through a `ProcessAdapter`, the transport
+    adapter is called within a child process that does the network I/O so
+    delivery keeps up while this interpreter is busy. Pair it with a
+    max_batch_size above 1 so each frame sent to the child holds a batch. The
+    child is closed once the worker exits."""
+    def __init__(self, transport):
+        ThreadedWorker.__init__(self, transport)
+        self._adapter = ProcessAdapter(self.transport.adapter)
+
+    def run(self):
+        try:
+            super(ProcessWorker, self).run()
+        finally:
+            self.adapter.close()
+
+
+class _Partition(object):
+    """View of a transport for one worker of a `WorkerPool`, it has it's own
+    queue and forwards everything else to the transport."""
+    def __repr__(self):
+        return '_Partition(queue={0}, transport={1})'.format(self.queue, self.transport)
+
+    def __init__(self, transport, queue):
+        self.transport = transport
+        self.queue = queue
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class WorkerPool(Worker):
+    """Runs worker_pool_size workers of `worker_class` for a transport, each
+    with it's own adapter from the transport adapter's __call__ and it's own
+    partition queue built like the transport queue. Emitted items are offered
+    straight to the partition the crc32 of their tid selects, so the events of
+    a transaction are delivered in order by a single worker. Items without a
+    tid are spread across the partitions in turn. Items already in the
+    transport queue are distributed when the pool starts, flushes and stops.
+
+    Stop, halt and flush are sent to every worker before waiting on any of
+    them, items a worker leaves in it's partition are returned to the
+    transport queue once it exits."""
+    worker_class = ConfigDescriptor('pool_worker_class')
+
+    def __repr__(self):
+        return '{0}(size={1}, transport={2})'.format(
+            self.__class__.__name__, self.size, self.transport)
+
+    def __init__(self, transport, tracker=None, worker_class=None):
+        Worker.__init__(self, transport, tracker)
+        if worker_class is not None:
+            self.worker_class = worker_class
+        self.size = transport.worker_pool_size
+        if self.size <= 0:
+            raise ValueError('`worker_pool_size` must be greater than zero')
+        self.partitions = [_Partition(transport, self.new_queue(i)) for i in range(self.size)]
+        self.workers = [self.worker_class(partition) for partition in self.partitions]
+        self._counter = itertools.count()
+
+    def new_queue(self, index):
+        """Returns the queue of partition index from the transport's queue
+        factory, a `SpillQueue` spills into a directory of it's own below the
+        transport queue's."""
+        directory = getattr(self.q, 'directory', None) or conf.spill_dir
+        if directory:
+            directory = os.path.join(directory, 'partition-{0}'.format(index))
+        return self.transport.new_queue(directory=directory)
+
+    @property
+    def queues(self):
+        """Partition queues, in the order of workers."""
+        return [partition.queue for partition in self.partitions]
+
+    def partition(self, payload):
+        """Returns the index of the partition payload belongs to, which only
+        depends on it's tid so callers need no lock to route items."""
+        if isinstance(payload, basestring):
+            match = _payload_tid.search(payload)
+            tid = match.group(1) if match else None
+            if tid and '\\' in tid:
+                tid = json.loads('"{0}"'.format(tid))
+        else:
+            tid = getattr(payload, 'tid', None)
+        if not tid:
+            return next(self._counter) % self.size
+        if isinstance(tid, unicode):
+            tid = tid.encode('utf-8')
+        return (zlib.crc32(tid) & 0xffffffff) % self.size
+
+    def offer(self, payload, timeout=None):
+        """Puts payload into the queue of it's partition."""
+        return self.partitions[self.partition(payload)].queue.offer(payload, timeout)
+
+    def distribute(self):
+        """Moves the ready items of the transport queue to their partitions,
+        returns the number of items moved. Called with the transport lock held,
+        which keeps items of the same tid from being reordered."""
+        moved = 0
+        timeout = _timeout_seconds(None, self.t.max_block_time)
+
+        while True:
+            try:
+                item = self.q.get(False)
+            except Empty:
+                return moved
+            try:
+                self.partitions[self.partition(item.payload)].queue.put_item(item, True, timeout)
+            finally:
+                self.q.task_done(item)
+            moved += 1
+
+    def reclaim(self):
+        """Returns the items left in the partitions to the transport queue and
+        retires the partition counts into the transport totals, so the enqueued
+        and dropped metrics don't go back once the partitions are gone."""
+        for partition in self.partitions:
+            while True:
+                try:
+                    item = partition.queue.get(False)
+                except Empty:
+                    break
+                self.q.put_item(item)
+                partition.queue.task_done(item)
+            self.t.retire(partition.queue)
+
+    def alive(self):
+        """Returns the workers that were started and are still running."""
+        return [w for w in self.workers if w._started.isSet() and w.is_alive()]
+
+    def start(self):
+        for w in self.workers:
+            w.start()
+        self.distribute()
+
+    def stop(self, timeout):
+        """Asks every worker to stop within timeout and joins them, then any
+        items left are persisted by the transport queue."""
+        self.distribute()
+        alive = self.alive()
+        for w in alive:
+            w.q.put_head(w.StopWorker(seconds=timeout.total_seconds()))
+        for w in alive:
+            w.join()
+        self.reclaim()
+        if not self.q.empty():
+            self.q.persist()
+        if len(alive) < len(self.workers):
+            raise WorkerStoppedError
+
+    def halt(self):
+        alive = self.alive()
+        for w in alive:
+            w.q.put_head(w.HaltWorker())
+        for w in alive:
+            w.join()
+        self.reclaim()
+        if len(alive) < len(self.workers):
+            raise WorkerStoppedError
+
+    def flush(self, timeout):
+        self.distribute()
+        for w in self.workers:
+            w.flush(timeout)
+
+    def work(self, timeout):
+        """Raises WorkerStoppedError if a worker is no longer running."""
+        for w in self.workers:
+            w.work(timeout)
+
 
 class Transport(object):
     adapter_class = ConfigDescriptor('adapter_class')
@@ -371,11 +782,20 @@ class Transport(object):
     max_flush_time = ConfigDescriptor('max_flush_time')
     max_work_time = ConfigDescriptor('max_work_time')
     max_queue_size = ConfigDescriptor('max_queue_size')
+    max_block_time = ConfigDescriptor('max_block_time')
+    overflow_policy = ConfigDescriptor('overflow_policy')
+    max_batch_size = ConfigDescriptor('max_batch_size')
+    max_batch_bytes = ConfigDescriptor('max_batch_bytes')
+    max_batch_linger = ConfigDescriptor('max_batch_linger')
+    worker_pool_size = ConfigDescriptor('worker_pool_size')
 
     def __init__(
             self, adapter=None, worker=None, queue=None, max_queue_size=None,
             max_flush_time=None, max_work_time=None, max_stopping_time=None,
-            adapter_class=None, worker_class=None, queue_class=None):
+            adapter_class=None, worker_class=None, queue_class=None,
+            max_batch_size=None, max_batch_bytes=None, max_batch_linger=None,
+            max_block_time=None, overflow_policy=None, metrics=None,
+            worker_pool_size=None):
         if adapter_class is not None:
             self.adapter_class = adapter_class
         if worker_class is not None:
@@ -390,12 +810,30 @@ class Transport(object):
             self.max_work_time = max_work_time
         if max_stopping_time is not None:
             self.max_stopping_time = max_stopping_time
-
-        self.queue = queue if queue is not None else self.queue_class()
+        if max_batch_size is not None:
+            self.max_batch_size = max_batch_size
+        if max_batch_bytes is not None:
+            self.max_batch_bytes = max_batch_bytes
+        if max_batch_linger is not None:
+            self.max_batch_linger = max_batch_linger
+        if max_block_time is not None:
+            self.max_block_time = max_block_time
+        if overflow_policy is not None:
+            self.overflow_policy = overflow_policy
+        if worker_pool_size is not None:
+            self.worker_pool_size = worker_pool_size
+
+        self.queue = queue if queue is not None else self.new_queue()
         self.adapter = adapter if adapter is not None else self.adapter_class()
+        self.metrics = metrics if metrics is not None else Registry()
         self.lock = threading.RLock()
         self.worker = worker
 
+        # Enqueued and dropped counts of queues the transport no longer reads,
+        # such as the partitions of a stopped `WorkerPool`, see retire
+        self.retired = Counter()
+        self.register_metrics()
+
     def __repr__(self):
         return '{}(running={}, queue={}, adapter={})'.format(
             self.__class__.__name__, self.running, self.queue, self.adapter)
@@ -410,6 +848,55 @@ class Transport(object):
     def running(self):
         return self.worker is not None
 
+    def register_metrics(self):
+        """Creates the metrics the transport and it's worker record into. The
+        enqueued count, queue depth and bytes are read from the queue when
+        collected."""
+        self.metrics.counter(
+            'enqueued', 'Items put into the queue.',
+            lambda: self.retired['enqueued'] + sum(
+                getattr(q, 'enqueued', 0) for q in self.queues()))
+        self.metrics.counter('delivered', 'Items delivered by the adapter.')
+        self.metrics.counter('retried', 'Items returned to the queue after a failed attempt.')
+        self.metrics.counter('failed', 'Items that permanently failed or were invalid.')
+        self.metrics.counter(
+            'dropped', 'Items shed by the queue overflow policy.',
+            lambda: self.retired['dropped'] + sum(
+                sum(getattr(q, 'shed', {}).values()) for q in self.queues()))
+        self.metrics.gauge(
+            'queue_depth', 'Items held by the queue.',
+            lambda: sum(len(q) for q in self.queues()))
+        self.metrics.gauge(
+            'queue_bytes', 'Bytes of string payloads held by the queue.',
+            lambda: sum(getattr(q, 'bytes', 0) for q in self.queues()))
+        self.metrics.histogram(
+            'delivery_seconds', 'Seconds from creating an item to it\'s delivery.')
+        self.metrics.histogram(
+            'emit_seconds', 'Seconds spent in each adapter emit or emit_batch call.')
+
+    def new_queue(self, **kwargs):
+        """Returns a new queue of queue_class with the max_queue_size and
+        overflow_policy of the transport, kwargs are given to the queue."""
+        kwargs.setdefault('max_size', max(self.max_queue_size, 0))
+        kwargs.setdefault('overflow_policy', self.overflow_policy)
+        return self.queue_class(**kwargs)
+
+    def retire(self, queue):
+        """Moves the enqueued and shed counts of a queue that is going away
+        into the retired totals of the transport."""
+        with queue.mutex:
+            if hasattr(queue, 'enqueued'):
+                self.retired['enqueued'] += queue.enqueued
+                queue.enqueued = 0
+            if hasattr(queue, 'shed'):
+                self.retired['dropped'] += sum(queue.shed.values())
+                queue.shed.clear()
+
+    def queues(self):
+        """Returns the transport queue followed by the queues of the worker,
+        such as the partitions of a `WorkerPool`."""
+        return [self.queue] + list(getattr(self.worker, 'queues', []))
+
     def start(self):
         with self.lock:
             if self.worker is not None:
@@ -458,12 +945,13 @@ class Transport(object):
                 self.halt()
 
     def emit(self, item, timeout=None):
-        """Places a message into the queue then notifies the worker."""
-        self.queue.put(item, True, timeout)
-
+        """Places a message into the queue of the worker then notifies it. When
+        the queue is full it's overflow policy applies, with the block policy it
+        waits at most `timeout` or max_block_time for room."""
         if self.worker is None:
             log('Transport.emit - starting worker')
             self.start()
+        self.worker.offer(item, _timeout_seconds(timeout, self.max_block_time))
         try:
             timeout = _timeout_delta(timeout, self.max_work_time)
             self.worker.work(timeout)
@@ -1,13 +1,34 @@
+import re
 import time
 import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 from .globals import conf
 
 
 __all__ = [
-    'Backoff', 'Tracker', 'Called', '_debug_assert', '_is_string', '_is_value',
-    '_timeout_seconds', '_timeout_delta']
+    'Backoff', 'Tracker', 'Called', 'LruCache', '_debug_assert', '_is_string',
+    '_is_value', '_payload_size', '_timeout_seconds', '_timeout_delta']
+
+
+# Full RFC 3339 date-time, i.e. 2016-01-01T00:00:00.000000Z
+_rfc3339 = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[Tt ]([01]\d|2[0-3]):([0-5]\d):([0-5]\d)(\.\d+)?'
+    r'([Zz]|[+-](?:[01]\d|2[0-3]):[0-5]\d)$')
+
+
+def _is_rfc3339(value):
+    """Returns True if `value` is a valid RFC 3339 date-time string."""
+    match = _rfc3339.match(value)
+    if match is None:
+        return False
+    try:
+        datetime(*map(int, match.group(1, 2, 3)))
+        return True
+    except ValueError:
+        return False
 
 
 def _is_date(value):
@@ -15,24 +36,81 @@ def _is_date(value):
         return True
     if not _is_string(value):
         return False
-    try:
-        return isinstance(parse(value), datetime)
-    except (ValueError, OverflowError):
-        return False
+    if _is_rfc3339(value):
+        return True
+
+    # Anything else takes the slow dateutil parser, results are memoized since
+    # date fields tend to repeat the same handful of formats and values.
+    is_date = _is_date_cache.get(value)
+    if is_date is None:
+        try:
+            is_date = isinstance(parse(value), datetime)
+        except (ValueError, OverflowError):
+            is_date = False
+        _is_date_cache.put(value, is_date)
+    return is_date
 
 
 def _is_string(value):
     return isinstance(value, (str, unicode, basestring))
 
 
+def _payload_size(payload):
+    """Size of a queue item payload when counting towards max_batch_bytes."""
+    return len(payload) if _is_string(payload) else 0
+
+
 def _is_value(value):
+    """Returns True for datetimes and any sized value that isn't empty. Strings
+    are never parsed as dates here, a datetime is the only unsized value."""
+    if value is None:
+        return False
+    if isinstance(value, datetime):
+        return True
     try:
-        return value is not None and \
-          (_is_date(value) or len(value) > 0)
+        return len(value) > 0
     except TypeError:
         return False
 
 
+# Datetimes by the seconds prefix of a time string, cleared once it holds
+# _time_seconds_size prefixes. Events emitted in the same second share one.
+_time_seconds = {}
+_time_seconds_size = 4096
+
+
+def _time_format(value):
+    """Returns the datetime `value` as it is written to event json."""
+    return value.isoformat('T') + 'Z'
+
+
+def _time_parse(value):
+    """Returns a naive datetime for the time string `value`. RFC 3339 strings
+    are parsed strictly, building the seconds from a cache and only parsing the
+    fraction, anything else goes through dateutil. Like dateutil results with
+    tzinfo dropped, the offset is discarded rather than applied."""
+    match = _rfc3339.match(value)
+    if match is None:
+        return parse(value).replace(tzinfo=None)
+
+    seconds = _time_seconds.get(value[:19])
+    if seconds is None:
+        try:
+            seconds = datetime(*map(int, match.group(1, 2, 3, 4, 5, 6)))
+        except ValueError:
+            return parse(value).replace(tzinfo=None)
+        if len(_time_seconds) >= _time_seconds_size:
+            _time_seconds.clear()
+        _time_seconds[value[:19]] = seconds
+
+    fraction = match.group(7)
+    if fraction is None:
+        return seconds
+    if len(fraction) > 7:
+        return parse(value).replace(tzinfo=None)
+    return seconds.replace(microsecond=int(fraction[1:].ljust(6, '0')))
+
+
 def _timeout_seconds(timeout, default=None):
     """Timeout functions here are used where `timeout` arguments are accepted. I
     don't differentiate anywhere in the API between seconds and timedeltas and
@@ -160,6 +238,54 @@ class Tracker(object):
         self.last_attempt = None
 
 
+class LruCache(object):
+    """Bounded thread safe mapping, once it holds `maxsize` keys putting a new
+    key evicts the least recently used one."""
+    def __repr__(self):
+        return 'LruCache(size={0}, maxsize={1})'.format(len(self), self.maxsize)
+
+    def __init__(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError('`maxsize` must be greater than zero')
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """Returns the value for `key` marking it as most recently used, or
+        `default` if it does not exist."""
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            self.data[key] = value
+            return value
+
+    def put(self, key, value):
+        """Sets the value for `key`, evicting the least recently used key if the
+        cache is full."""
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+# Memoized dateutil results for _is_date
+_is_date_cache = LruCache(4096)
+
+
 class Called(list):
     def __call__(self, *args, **kwargs):
         self.append([args, kwargs])
@@ -2,9 +2,12 @@ import pytest
 import py  # needed by pytest, I use it for term width
 import logging
 import os
+import shutil
+import tempfile
 from datetime import datetime
 from emit.globals import log
 from emit import transports, adapters, emitters, event
+from .helpers import TServer
 
 
 _root_dir = os.path.abspath(
@@ -59,6 +62,20 @@ def logs(request):
             del log.handlers[index:]
 
 
+@pytest.yield_fixture
+def server(request):
+    tserver = TServer()
+    yield tserver
+    tserver.close()
+
+
+@pytest.yield_fixture
+def spill_dir(request):
+    path = tempfile.mkdtemp(prefix='emit-spill-')
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
 @pytest.yield_fixture
 def a(request):
     if not hasattr(request.cls, 'adapter_class'):
@@ -1,4 +1,6 @@
 import sys
+import threading
+import BaseHTTPServer
 from uuid import uuid4
 from datetime import datetime
 from emit.adapters import ListAdapter
@@ -165,6 +167,53 @@ class StderrCapturing(object):
         sys.stderr = sys.__stderr__
 
 
+class TServer(object):
+    """Local http server for adapter tests. Each request is recorded as a
+    Request and answered by `respond(request)`, which returns a tuple of
+    (status, body)."""
+    class Request(object):
+        def __init__(self, method, path, headers, body):
+            self.method = method
+            self.path = path
+            self.headers = headers
+            self.body = body
+
+        @property
+        def lines(self):
+            return self.body.splitlines()
+
+    def __init__(self, respond=None):
+        self.requests = []
+        self.respond = respond if respond is not None else (lambda request: (200, ''))
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                request = server.Request(self.command, self.path, dict(self.headers), body)
+                server.requests.append(request)
+                (status, out) = server.respond(request)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+            do_PUT = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.httpd.server_port)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
 class TestCase(object):
     pass
 
@@ -1,7 +1,8 @@
 import pytest
+import threading
 from datetime import datetime
-from uuid import uuid4
-from emit import transports, adapters, event
+from uuid import uuid4, UUID
+from emit import transports, adapters, event, tids
 from emit.globals import conf
 from emit.event import Event
 from emit.emitters import Emitter, EmittingEventContext
@@ -161,6 +162,18 @@ class TestEmitterInit(EmitterTestCase):
         assert emitter.transport_class == TClass
         assert isinstance(emitter.transport, TClass)
 
+    def test__init__tid_generator_class(self):
+        emitter = Emitter(tid_generator_class=tids.Uuid7TidGenerator)
+        assert Emitter.tid_generator_class == tids.TidGenerator
+        assert emitter.tid_generator_class == tids.Uuid7TidGenerator
+        assert isinstance(emitter.tid_generator, tids.Uuid7TidGenerator)
+        assert isinstance(Emitter().tid_generator, tids.TidGenerator)
+
+    def test__init__tid_generator(self):
+        generator = tids.Uuid5TidGenerator()
+        emitter = Emitter(tid_generator=generator)
+        assert emitter.tid_generator is generator
+
     def test__init__callbacks(self):
         callbacks = [lambda event: event]
         emitter = Emitter(callbacks=callbacks)
@@ -347,20 +360,35 @@ class TestEmitterMethods(EmitterTestCase):
         assert got == want
 
     def test_ping(self):
-        conf.debug = True
+        restore = conf.debug
 
-        emitter = temitter()
-        result = emitter.ping()
+        try:
+            conf.debug = True
 
-        assert len(emitter.transport.adapter) == 3
-        for expect in ['open', 'ping', 'close']:
-            e = emitter.transport.adapter.pop(0)
-            e = Event.from_json(e)
-            assert e.name == expect
-            assert e.tid == result
-            assert e.system == 'test.pyemit'
-            assert e.component == 'emitter'
-            assert e.operation == 'ping'
+            emitter = temitter()
+            result = emitter.ping()
+
+            assert len(emitter.transport.adapter) == 3
+            for expect in ['open', 'ping', 'close']:
+                e = emitter.transport.adapter.pop(0)
+                e = Event.from_json(e)
+                assert e.name == expect
+                assert e.tid == result
+                assert e.system == 'test.pyemit'
+                assert e.component == 'emitter'
+                assert e.operation == 'ping'
+        finally:
+            conf.debug = restore
+
+    def test_new_tid(self):
+        emitter = Emitter(tid_generator=tids.Uuid5TidGenerator())
+        assert emitter.new_tid('test_new_tid') == emitter.new_tid('test_new_tid')
+        assert emitter.new_tid() != emitter.new_tid()
+
+        emitter = temitter(tid_generator=tids.Uuid7TidGenerator())
+        tid = emitter.ping()
+        assert UUID(tid).version == 7
+        assert Event.from_json(emitter.transport.adapter[0]).tid == tid
 
     def test_emit_throws(self):
         restore = conf.debug
@@ -375,6 +403,44 @@ class TestEmitterMethods(EmitterTestCase):
         finally:
             conf.debug = restore
 
+    def test_emit_defer_serialization(self):
+        emitter = temitter(defer_serialization=True)
+        event, expect = teventr_expect()
+        emitter.emit(event)
+        assert len(emitter.transport.adapter) == 1
+
+        got = Event.from_json(emitter.transport.adapter[0])
+        want = (emitter.event_stack | Event(**expect))
+        assert got == want
+
+    def test_emit_defer_serialization_uncopyable(self):
+        emitter = temitter(defer_serialization=True)
+        with emitter.enter('called', data=dict(lock=threading.Lock())):
+            emitter('hello')
+        assert len(emitter.transport.adapter) == 3
+
+        got = Event.from_json(emitter.transport.adapter[1])
+        assert got.name == 'base.one.two.three.called.hello'
+        assert 'lock' in got.data
+
+    def test_emit_defer_serialization_invalid(self):
+        emitter = temitter(event_stack=event.EventStack(), defer_serialization=True)
+        emitter.emit('foo')
+        assert len(emitter.transport.adapter) == 0
+        assert len(emitter.transport.queue) == 0
+
+    def test_emit_json(self):
+        emitter = temitter()
+        event, expect = teventr_expect()
+
+        for i in range(3):
+            emitter.emit(event)
+        assert len(emitter.transport.adapter) == 3
+
+        want = (emitter.event_stack | Event(**expect))
+        for record in emitter.transport.adapter:
+            assert record.json == want.json
+
     def test_callbacks(self):
         events = []
 
@@ -550,6 +616,19 @@ class TestEmitterContext(EmitterTestCase):
             assert e.name == '{}.{}'.format('base.one.two.three', expect)
         assert len(emitter.transport.adapter) == 0
 
+    def test__enter__uncopyable_data(self):
+        emitter = temitter()
+
+        with emitter.enter('called', data=dict(lock=threading.Lock())):
+            emitter('hello')
+            emitter('hello')
+        for expect in ['called.enter', 'called.hello', 'called.hello', 'called.exit']:
+            e = emitter.transport.adapter.pop(0)
+            e = Event.from_json(e)
+            assert e.name == '{}.{}'.format('base.one.two.three', expect)
+            assert 'lock' in e.data
+        assert len(emitter.transport.adapter) == 0
+
     def test__enter__without_valid_ctx(self):
         restore = conf.debug
 
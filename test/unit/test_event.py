@@ -1,12 +1,19 @@
 import pytest
 import itertools
 import json
+import time
+import threading
+from StringIO import StringIO
 import emit
+from collections import Mapping
+from emit import adapters, transports
+from emit.emitters import Emitter
 from emit.globals import conf
 from datetime import datetime
-from emit.event import Event, EventJsonEncoder, EventProperty, EventStack
+from emit.event import (
+    Event, EventEncoder, EventJsonEncoder, EventProperty, EventRecord, EventStack)
 from ..helpers import (
-    TestCase, tevent, tevent_expect, teventf, teventf_expect, tevent_stack)
+    TestCase, tevent, tevent_expect, teventf, teventf_expect, teventr, tevent_stack)
 
 
 keys_allowed = ['name', 'operation', 'component', 'system', 'tid', 'fields', 'data', 'tags', 'replay', 'time']
@@ -581,6 +588,44 @@ class TestEventFields(TestCase):
         run_cases(False, [{k: vals} for k, vals in iterswap(iteraf())])
 
 
+    def test_fields_lookup(self):
+        cases = dict(
+            string=['t', 'tstring', 't_string', 'updated', 'longitude', 'date_created', 'array_count'],
+            array=['array', 't_array', 'tstring_array'],
+            array_string=['t_array_string', 'tstring_array_string'],
+            long=['long', 't_long', 'tlong_long', 't_array_date_long'],
+            array_long=['array_long', 't_array_long'],
+            date=['date', 't_date', 'tstr_date'],
+            array_date=['t_array_date', 'tstrmix_array_date'],
+            boolean=['t_boolean'],
+            double=['t_double'])
+        event = Event()
+
+        for expect, names in cases.iteritems():
+            for name in names:
+                assert event.fields_lookup(name) == expect, name
+                assert event.fields_lookup(name) == expect, name
+
+    def test_fields_lookup_memo_bounded(self):
+        event = Event()
+        Event._fields_memo.clear()
+        for i in range(Event._fields_memo_size + 10):
+            assert event.fields_lookup('t{}_long'.format(i)) == 'long'
+            assert len(Event._fields_memo) <= Event._fields_memo_size
+
+    def test_fields_validate_array_short_circuits(self):
+        seen = []
+
+        def values():
+            for v in [1, 'a', 2]:
+                seen.append(v)
+                yield v
+
+        event = Event()
+        assert not event.fields_validate('t_array_long', values())
+        assert seen == [1, 'a']
+
+
 @pytest.mark.name_properties
 class TestEventProperties(TestCase):
 
@@ -752,6 +797,37 @@ class TestEventMethods(TestCase):
         event = tevent()
         assert repr(event) == 'Event(tid=test.tid)'
 
+    def test_from_json(self):
+        for event in [tevent(), teventf(), teventr(replay='')]:
+            got = Event.from_json(event.json)
+            assert type(got) is Event
+            assert got == event.to_event
+
+    def test_iter_from_ndjson(self):
+        events = [tevent(), teventf(), tevent(time=datetime(2016, 1, 1))]
+        lines = [json.dumps(e.to_dict, cls=EventJsonEncoder) for e in events]
+        fileobj = StringIO('\n'.join([lines[0], '', lines[1], '  ', lines[2], '']))
+
+        got = Event.iter_from_ndjson(fileobj)
+        assert not isinstance(got, list)
+        got = list(got)
+        assert len(got) == 3
+        for event, expect in zip(got, events):
+            assert type(event) is Event
+            assert event == expect.to_event
+
+        got = list(EventRecord.iter_from_ndjson(StringIO(lines[1])))
+        assert type(got[0]) is EventRecord
+        assert got[0].as_event() == events[1].to_event
+
+    def test_iter_from_ndjson_invalid(self):
+        line = json.dumps(tevent().to_dict, cls=EventJsonEncoder)
+        got = Event.iter_from_ndjson(StringIO(line + '\n{"name": \n'))
+        assert next(got).name == tevent().name
+
+        with pytest.raises(ValueError):
+            next(got)
+
     def test_canonicalize(self):
         assert Event(name='end').canonicalized('a.b.c') == 'a.b.c.end'
         # Existing stutter isnt removed in canonicalized
@@ -917,6 +993,95 @@ class TestEventMethods(TestCase):
             got = event._list_from_sequence_by_allowed(given)
             assert got == expect
 
+    def test_derive(self):
+        events = [Event(), tevent(), teventf(), teventr(replay='')]
+        events[1].tags = set()
+        events[1].fields = dict()
+
+        for event in events:
+            got = event()
+            assert type(got) is type(event)
+            assert got == Event(event)
+            assert got is not event
+            if 'tags' in got:
+                assert got.tags is not event.tags
+            assert not ('tags' in events[1]())
+            assert not ('fields' in events[1]())
+
+    def test_derive_missing_and_extra_keys(self):
+        event = teventf()
+        dict.__delitem__(event, 'system')
+        dict.__delitem__(event, 'time')
+        dict.__setitem__(event, 'extra', 'test_derive_missing_and_extra_keys')
+
+        got = event()
+        assert got.system == ''
+        assert isinstance(got.time, datetime)
+        assert not ('extra' in got)
+        assert got.extra == 'test_derive_missing_and_extra_keys'
+
+    def test_derive_attributes(self):
+        event_stack = EventStack()
+        ctx = event_stack(name='test_derive_attributes')
+        got = ctx()
+        assert got.event_stack is event_stack
+        assert got.name == 'test_derive_attributes'
+
+    def test_merge(self):
+        tags = set(['tag'])
+        event = Event('a', system='system')
+        event |= Event('b', tags=tags, component='', fields=dict())
+        assert event.name == 'a.b'
+        assert event.system == 'system'
+        assert event.tags == tags and not (event.tags is tags)
+        assert not ('fields' in event)
+        event += Event('c', system='system_c')
+        assert event.name == 'c'
+        assert event.system == 'system_c'
+
+    def test_detach(self):
+        fields = dict(my_lookup_str='foo')
+        data = dict(key='value')
+        base = Event(fields=fields, data=data)
+        event = base(name='detached')
+        assert event.fields is fields
+        assert event.detach() is event
+        assert event.fields == fields and event.fields is not fields
+        assert event.data == data and event.data is not data
+
+        fields['my_lookup_str'] = 'bar'
+        assert event.fields['my_lookup_str'] == 'foo'
+        assert not ('fields' in Event().detach())
+
+    def test_detach_nested(self):
+        data = dict(key=dict(nested=['a']))
+        fields = dict(my_lookup_array=['a'])
+        base = Event(fields=fields, data=data, tags=['tag_a'])
+        event = base(name='detached').detach()
+        json = event.json
+
+        # Mutating the source afterwards leaves the detached event as it was
+        data['key']['nested'].append('b')
+        fields['my_lookup_array'][0] = 'b'
+        base.tags.add('tag_b')
+        assert event.data == dict(key=dict(nested=['a']))
+        assert event.fields == dict(my_lookup_array=['a'])
+        assert event.tags == set(['tag_a'])
+        assert event.json == json
+
+    def test_detach_uncopyable(self):
+        lock = threading.Lock()
+        data = dict(lock=lock, key=['a'])
+        base = Event(data=data, tags=['tag_a'])
+        event = base(name='detached').detach()
+        assert event.data == data and event.data is not data
+        assert event.data['lock'] is lock
+        assert event.tags == set(['tag_a'])
+
+        # Shallow copy, the container itself is no longer shared
+        data['other'] = 'value'
+        assert event.data == dict(lock=lock, key=['a'])
+
 
 @pytest.mark.event_mutations
 class TestEventMutation(TestCase):
@@ -1416,6 +1581,81 @@ class TestEventValidation(TestCase):
             event.validate()
         assert '`Event` had extraneous keys: extra_key' == str(excinfo.value)
 
+    def test_validation_neg_valid(self):
+        event = teventf()
+        event['extra_key'] = 'test_validation_neg_valid'
+        assert event.valid is False
+
+        event = teventf()
+        event.fields['t_long'] = 'test_validation_neg_valid'
+        assert event.valid is False
+
+    def test_validator_compiled_per_class(self):
+        class TEvent(Event):
+            pass
+
+        validator = Event._validator()
+        assert Event._validator() is validator
+        assert TEvent._validator() is not validator
+        assert TEvent._validator() is TEvent._validator()
+        assert TEvent(teventf()).validate() is True
+
+    def test_validator_uses_class_validators(self):
+        def validate_replay(self, replay, final=False):
+            if final and replay == 'test_validator_uses_class_validators':
+                raise ValueError('`replay` is not allowed')
+
+        class TEvent(Event):
+            replay = Event.replay.validate(validate_replay)
+
+        event = TEvent(teventf(), replay='test_validator_uses_class_validators')
+        with pytest.raises(ValueError) as excinfo:
+            event.validate()
+        assert '`replay` is not allowed' == str(excinfo.value)
+        assert Event(event).valid is True
+
+
+@pytest.mark.slow
+@pytest.mark.event
+@pytest.mark.event_benchmark
+class TestEventBenchmark(TestCase):
+    """Prints the per event cost of validation, deriving and merging."""
+    events = 10000
+
+    def latency(self, func, *args):
+        start = time.time()
+        for i in range(self.events):
+            func(*args)
+        return (time.time() - start) / self.events
+
+    def test_validate(self):
+        events = [teventf() for i in range(self.events)]
+
+        start = time.time()
+        for event in events:
+            event.validate()
+        latency = (time.time() - start) / self.events
+        print('Event.validate latency: {0:.2f}us'.format(latency * 1000000))
+        assert latency < .001
+
+    def test_derive(self):
+        """Deriving copies the keys in one pass instead of going through update
+        and every setter again like constructing from the event does."""
+        event = teventf()
+        derived = self.latency(event)
+        constructed = self.latency(Event, event)
+        print('Event derive latency: {0:.2f}us, through update: {1:.2f}us'.format(
+            derived * 1000000, constructed * 1000000))
+        assert derived < constructed
+
+    def test_merge(self):
+        (left, right) = (teventf(), teventf(name='right'))
+        merged = self.latency(left.__or__, right)
+        updated = self.latency(lambda: Event(left).update(right))
+        print('Event merge latency: {0:.2f}us, through update: {1:.2f}us'.format(
+            merged * 1000000, updated * 1000000))
+        assert merged < updated
+
 
 @pytest.mark.event
 class TestEventJsonEncoder(TestCase):
@@ -1467,6 +1707,220 @@ class TestEventJsonEncoder(TestCase):
         assert encoded['message'].startswith(expect_starts_with)
 
 
+def tencoder_backends():
+    try:
+        import simplejson  # noqa
+        return ['json', 'simplejson']
+    except ImportError:
+        return ['json']
+
+
+def tencoder_events():
+    events = [Event(), tevent(), teventf()]
+    events.append(teventf(
+        tags=['test.tag', 'test.tag2', u'test.\u2603'],
+        fields={'my_lookup_long': 10, 'my_lookup_double': 1.1, 'my_lookup_boolean': True},
+        data={
+            'when': datetime.utcnow(), 'set': set([1, 2]), 'none': None,
+            'unicode': u'\u2603', 'nested': {'list': [1.5, 'two', [3]], 'tuple': (1, 2)}}))
+    events.append(tevent(data={
+        'inf': float('inf'), '-inf': float('-inf'), 'nan': float('nan'), 'list': [float('inf')]}))
+    return events
+
+
+@pytest.mark.event
+class TestEventEncoder(TestCase):
+    def test_compat(self):
+        for backend in tencoder_backends():
+            for event in tencoder_events():
+                got = EventEncoder(backend).encode(event.to_dict)
+                assert got == json.dumps(event.to_dict, cls=EventJsonEncoder)
+
+    def test_compat_pretty(self):
+        for backend in tencoder_backends():
+            for event in tencoder_events():
+                got = EventEncoder(backend, pretty=True).encode(event.to_dict)
+                assert got == json.dumps(
+                    event.to_dict, cls=EventJsonEncoder, indent=2, separators=(',', ': '))
+
+    def test_compat_json(self):
+        restore = conf.json_encoder, conf.debug
+
+        try:
+            conf.debug = False
+            for backend in tencoder_backends() + ['auto']:
+                conf.json_encoder = backend
+                for event in tencoder_events():
+                    assert event.json == json.dumps(event.to_dict, cls=EventJsonEncoder)
+        finally:
+            conf.json_encoder, conf.debug = restore
+
+    def test_encode_converts_time_and_tags(self):
+        event = teventf()
+        out = event.to_dict
+        EventEncoder('json').encode(out)
+        assert out['time'] == event.time.isoformat('T') + 'Z'
+        assert isinstance(out['tags'], list)
+        assert isinstance(event.tags, set)
+
+    def test_default_not_called(self):
+        calls = []
+        encoder = EventEncoder('json')
+        default = encoder.encoder.default
+        encoder.encoder.default = lambda obj: calls.append(obj) or default(obj)
+        encoder.encode(teventf().to_dict)
+        assert calls == []
+
+    def test_auto(self):
+        assert EventEncoder().backend == tencoder_backends()[-1]
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            EventEncoder('unknown')
+
+    def test_repr(self):
+        assert repr(EventEncoder('json')) == 'EventEncoder(backend=json, pretty=False)'
+
+
+@pytest.mark.event
+@pytest.mark.event_record
+class TestEventRecord(TestCase):
+
+    def test_init(self):
+        record = EventRecord()
+        assert isinstance(record, Mapping)
+        assert not hasattr(record, '__dict__')
+        assert sorted(record.keys()) == sorted(keys_required)
+        assert isinstance(record.time, datetime)
+        for key in ['tid', 'system', 'component', 'operation', 'name']:
+            assert record[key] == ''
+
+    def test_init_args(self):
+        event, expect = teventf_expect(time=datetime.utcnow())
+        record = EventRecord(**expect)
+        assert record == Event(**expect)
+        assert Event(**expect) == record
+        assert record != Event(**dict(expect, name='other'))
+
+        record = EventRecord('a', 'b', time=expect['time'])
+        assert record == Event('a', 'b', time=expect['time'])
+
+    def test_repr(self):
+        assert repr(EventRecord(tid='tid')) == 'EventRecord(tid=tid)'
+
+    def test_mapping(self):
+        record = EventRecord(tid='tid', replay='replay')
+        assert record['tid'] == 'tid'
+        assert record.get('tid') == 'tid'
+        assert record.get('data', False) is False
+        assert 'replay' in record
+        assert not ('data' in record)
+        assert not ('extra' in record)
+        assert len(record) == 7
+        assert dict(record.iteritems()) == dict(record.items())
+        assert record.values() == list(record.itervalues())
+        assert list(record) == [key for key in EventRecord.keys_allowed if key in record]
+
+        with pytest.raises(KeyError):
+            record['data']
+        with pytest.raises(KeyError):
+            record['extra']
+
+        del record['replay']
+        assert not ('replay' in record)
+        with pytest.raises(KeyError):
+            del record['replay']
+
+    def test_mapping_not_allowed(self):
+        record = EventRecord()
+        with pytest.raises(KeyError) as excinfo:
+            record['extra'] = 1
+        assert '`extra` key is not allowed' in str(excinfo.value)
+
+    def test_containers_lazy(self):
+        record = EventRecord()
+        for key in keys_optional:
+            assert not (key in record)
+        assert record.tags == set()
+        assert record.fields == dict()
+        assert record.data == dict()
+        assert record.replay == ''
+        for key in keys_optional:
+            assert key in record
+
+    def test_validation(self):
+        event, expect = teventf_expect()
+        record = EventRecord(**expect)
+        assert record.validate() is True
+        assert record.valid is True
+
+        record.name = ''
+        assert record.valid is False
+        with pytest.raises(ValueError) as excinfo:
+            record.validate()
+        assert '`name` must not be empty' == str(excinfo.value)
+
+        with pytest.raises(ValueError) as excinfo:
+            record.system = False
+        assert '`system` must be a string' == str(excinfo.value)
+
+    def test_json(self):
+        event, expect = teventf_expect(data=dict(key='value'), time=datetime.utcnow())
+        record = EventRecord(**expect)
+        assert record.json == Event(**expect).json
+        assert record.to_dict == Event(**expect).to_dict
+        assert isinstance(record.to_dict, dict)
+
+    def test_from_event(self):
+        event = teventf()
+        record = EventRecord.from_event(event)
+        assert isinstance(record, EventRecord)
+        assert record == event
+
+    def test_as_event(self):
+        event, expect = teventf_expect()
+        record = EventRecord(**expect)
+        got = record.as_event()
+        assert type(got) is Event
+        assert got == record
+        assert got.json == record.json
+
+    def test_derive(self):
+        record = EventRecord('a', system='system_a')
+        assert isinstance(record(), EventRecord)
+        assert (record | Event('b')).name == 'a.b'
+        assert (record | EventRecord('b')).name == 'a.b'
+        assert (Event('b') | record).name == 'b.a'
+        assert isinstance(Event() | record, Event)
+        assert (record + EventRecord('b', system='system_b')).system == 'system_b'
+
+    def test_event_stack(self):
+        event_stack = EventStack([
+            EventRecord(system='system_a', tid='tid'), Event(component='component_a'),
+            EventRecord('a', operation='operation_a')])
+        assert isinstance(event_stack.to_event, EventRecord)
+        assert event_stack['system'] == 'system_a'
+        assert event_stack.to_event.component == 'component_a'
+        assert 'operation' in event_stack
+        assert (event_stack | EventRecord('b')).name == 'a.b'
+        assert str(event_stack).startswith('EventStack(tid)')
+
+        event_stack.top.name = 'c'
+        assert event_stack.to_event.name == 'c'
+
+    def test_emitter(self):
+        adapter = adapters.ListAdapter()
+        emitter = Emitter(
+            event_class=EventRecord,
+            transport=transports.Transport(adapter, worker_class=transports.Worker),
+            system='system', component='component', tid='tid')
+        emitter.emit('name')
+        assert len(adapter) == 1
+        got = json.loads(adapter[0].json)
+        assert got['name'] == 'name'
+        assert got['system'] == 'system'
+
+
 @pytest.mark.event_stack
 class TestEventStack(TestCase):
 
@@ -1758,3 +2212,88 @@ class TestEventStack(TestCase):
                     assert event.name == '3'
                     assert event_stack.name == '3'
                     assert event_stack.to_event.name == '1.2.3'
+
+    def test_to_event_copy(self):
+        event_stack = EventStack([Event('a', system='system_a')])
+        event = event_stack.to_event
+        event.system = 'changed'
+        assert event_stack.to_event.system == 'system_a'
+        assert event_stack.to_event is not event_stack.to_event
+
+    def test_rollup_cached(self):
+        event_stack = EventStack([Event('a'), Event('b'), Event('c')])
+        rollup = event_stack._rollup()
+        assert rollup.name == 'a.b.c'
+        assert event_stack._rollup() is rollup
+        assert len(event_stack._rollups) == 3
+
+    def test_rollup_push_pop(self):
+        event_stack = EventStack([Event('a'), Event('b')])
+        base = event_stack._rollups
+        assert event_stack.to_event.name == 'a.b'
+        prefix = base[0][2]
+
+        with event_stack(name='c'):
+            assert event_stack.to_event.name == 'a.b.c'
+            assert event_stack._rollups[0][2] is prefix
+        assert event_stack.to_event.name == 'a.b'
+        assert len(event_stack._rollups) == 2
+        assert event_stack._rollups[0][2] is prefix
+
+        event_stack.pop()
+        assert event_stack.to_event.name == 'a'
+        event_stack.append(Event('d'))
+        assert event_stack.to_event.name == 'a.d'
+        event_stack[1] = Event('e')
+        assert event_stack.to_event.name == 'a.e'
+        event_stack.insert(0, Event('z'))
+        assert event_stack.to_event.name == 'z.a.e'
+        del event_stack[:]
+        assert event_stack.to_event.name == ''
+
+    def test_rollup_mutated_frame(self):
+        bot = Event('a', system='system_a')
+        top = Event('b')
+        event_stack = EventStack([bot, top])
+        assert event_stack.to_event.system == 'system_a'
+
+        bot.system = 'system_b'
+        assert event_stack.to_event.system == 'system_b'
+        assert event_stack['system'] == 'system_b'
+
+        del bot['system']
+        assert event_stack['system'] == ''
+
+        bot.tags.add('tag_a')
+        assert event_stack.to_event.tags == set(['tag_a'])
+        top.fields['key_string'] = 'value'
+        assert event_stack.to_event.fields == dict(key_string='value')
+        top.data['key'] = 'value'
+        assert event_stack.to_event.data == dict(key='value')
+
+    def test_rollup_mutated_in_place(self):
+        bot = Event('a', tags=['tag_a'], fields=dict(key_string='a'))
+        top = Event('b', data=dict(key=['a']))
+        event_stack = EventStack([bot, top])
+        assert event_stack.to_event.tags == set(['tag_a'])
+
+        # Changes keeping the size of the container are seen
+        bot.tags.remove('tag_a')
+        bot.tags.add('tag_b')
+        assert event_stack.to_event.tags == set(['tag_b'])
+        bot.fields['key_string'] = 'b'
+        assert event_stack.to_event.fields == dict(key_string='b')
+        top.data['key'][0] = 'b'
+        assert event_stack.to_event.data == dict(key=['b'])
+
+    def test_rollup_uncopyable(self):
+        lock = threading.Lock()
+        bot = Event('a', data=dict(lock=lock))
+        top = Event('b')
+        event_stack = EventStack([bot, top])
+        assert event_stack.to_event.data == dict(lock=lock)
+        assert event_stack.to_event.data == dict(lock=lock)
+
+        # A frame that can't be copied is merged again on every rollup
+        bot.data['key'] = 'value'
+        assert event_stack.to_event.data == dict(lock=lock, key='value')
@@ -0,0 +1,164 @@
+import pytest
+import random
+from emit.metrics import Metric, Counter, Gauge, Histogram, Registry
+from ..helpers import TestCase
+
+
+@pytest.mark.metrics
+@pytest.mark.metric
+class TestMetric(TestCase):
+
+    def test_counter(self):
+        c = Counter('a', 'help a')
+        assert c.name == 'a' and c.help == 'help a'
+        assert c.value == 0
+        c.inc()
+        c.inc(5)
+        assert c.value == 6
+        assert c.snapshot() == 6
+        assert repr(c) == 'Counter(name=a, value=6)'
+        assert list(c.samples()) == [('_total', {}, 6)]
+
+    def test_gauge(self):
+        g = Gauge('a')
+        g.set(10)
+        g.inc(2)
+        g.dec(5)
+        assert g.value == 7
+        assert list(g.samples()) == [('', {}, 7)]
+
+    def test_func(self):
+        values = [3]
+        for metric_class in [Metric, Counter, Gauge]:
+            assert metric_class('a', func=lambda: values[0]).value == 3
+
+
+@pytest.mark.metrics
+@pytest.mark.histogram
+class TestHistogram(TestCase):
+
+    def test_init(self):
+        h = Histogram('a')
+        assert h.count == h.value == 0
+        assert h.min is None and h.max is None
+        assert h.quantile(.5) is None
+
+        with pytest.raises(ValueError):
+            Histogram('a', sub_bucket_bits=0)
+
+    def test_index(self):
+        h = Histogram('a', sub_bucket_bits=3)
+        assert [h.index(v) for v in range(8)] == range(8)
+        assert [h.index(v) for v in range(8, 16)] == [8, 8, 9, 9, 10, 10, 11, 11]
+        assert [h.index(v) for v in range(16, 32, 4)] == [12, 13, 14, 15]
+
+        # Every bucket is contiguous and highest() is the last value in it
+        for v in range(1, 5000):
+            index = h.index(v)
+            assert h.index(h.highest(index)) == index
+            assert h.index(h.highest(index) + 1) == index + 1
+
+    def test_record(self):
+        h = Histogram('a')
+        for seconds in [.002, .001, .003]:
+            h.record(seconds)
+        assert h.count == 3
+        assert h.min == .001 and h.max == .003
+        assert abs(h.sum - .006) < 1e-9
+
+        # Negative durations from clock adjustments land in the first bucket
+        h.record(-1)
+        assert h.buckets[0] == 1
+
+    def test_quantile(self):
+        h = Histogram('a')
+        values = [random.uniform(0, 10) for i in range(10000)]
+        for v in values:
+            h.record(v)
+        values.sort()
+
+        for q in [.01, .5, .9, .99, .999]:
+            expect = values[int(q * len(values)) - 1]
+            assert abs(h.quantile(q) - expect) <= expect / 16.0 + 1e-6
+        assert h.quantile(1) == h.max == values[-1]
+
+    def test_time(self):
+        h = Histogram('a')
+        with h.time():
+            pass
+        with pytest.raises(ValueError):
+            with h.time():
+                raise ValueError
+        assert h.count == 2
+        assert 0 <= h.max < 1
+
+    def test_snapshot(self):
+        h = Histogram('a')
+        h.record(.5)
+        snapshot = h.snapshot()
+        assert list(snapshot) == ['count', 'sum', 'min', 'max', 'p50', 'p90', 'p99', 'p999']
+        assert snapshot['count'] == 1
+        assert abs(snapshot['p99'] - .5) <= .5 / 16
+
+
+@pytest.mark.metrics
+@pytest.mark.registry
+class TestRegistry(TestCase):
+
+    def test_register(self):
+        r = Registry()
+        c = r.counter('a')
+        assert r.counter('a') is c
+        assert r['a'] is c
+        assert 'a' in r and len(r) == 1
+        assert list(r) == [c]
+        assert repr(r) == "Registry(prefix=emit, metrics=['a'])"
+
+        with pytest.raises(TypeError):
+            r.gauge('a')
+
+    def test_snapshot(self):
+        r = Registry()
+        r.counter('a').inc(2)
+        r.gauge('b', func=lambda: 3)
+        r.histogram('c')
+        snapshot = r.snapshot()
+        assert list(snapshot) == ['a', 'b', 'c']
+        assert snapshot['a'] == 2 and snapshot['b'] == 3
+        assert snapshot['c']['count'] == 0
+
+    def test_prometheus(self):
+        r = Registry()
+        r.counter('a', 'Help for a.').inc(2)
+        r.gauge('b').set(1.5)
+        r.histogram('c_seconds', 'Help for c.').record(.25)
+
+        assert r.prometheus().splitlines() == [
+            '# HELP emit_a_total Help for a.',
+            '# TYPE emit_a_total counter',
+            'emit_a_total 2',
+            '# TYPE emit_b gauge',
+            'emit_b 1.5',
+            '# HELP emit_c_seconds Help for c.',
+            '# TYPE emit_c_seconds summary',
+            'emit_c_seconds{quantile="0.5"} 0.25',
+            'emit_c_seconds{quantile="0.9"} 0.25',
+            'emit_c_seconds{quantile="0.99"} 0.25',
+            'emit_c_seconds{quantile="0.999"} 0.25',
+            'emit_c_seconds_sum 0.25',
+            'emit_c_seconds_count 1']
+
+    def test_prometheus_labels(self):
+        r = Registry(prefix='')
+        r.histogram('a')
+        r.counter('b')
+
+        assert r.prometheus(labels={'t': 'x"\\\n'}).splitlines()[1:] == [
+            'a{quantile="0.5",t="x\\"\\\\\\n"} NaN',
+            'a{quantile="0.9",t="x\\"\\\\\\n"} NaN',
+            'a{quantile="0.99",t="x\\"\\\\\\n"} NaN',
+            'a{quantile="0.999",t="x\\"\\\\\\n"} NaN',
+            'a_sum{t="x\\"\\\\\\n"} 0.0',
+            'a_count{t="x\\"\\\\\\n"} 0',
+            '# TYPE b_total counter',
+            'b_total{t="x\\"\\\\\\n"} 0']
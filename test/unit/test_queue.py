@@ -1,10 +1,18 @@
 import pytest
+import os
 import sys
+import time
+import threading
 from datetime import datetime, timedelta
+from emit.adapters import ListAdapter, AdapterEmitError
 from emit.decorators import defer
+from emit.globals import conf
+from emit.transports import Transport, Worker
 from emit.utils import Backoff
 from emit.queue import (
-    Queue, Empty, QueueStat, QueueItem, TailQueueItem, HeadQueueItem)
+    Queue, Empty, QueueStat, QueueItem, TailQueueItem, HeadQueueItem,
+    QueueSchedule, SpillQueue)
+from emit.event import Event
 from ..helpers import TestCase, tevent
 
 
@@ -59,9 +67,9 @@ class TestQueue(TestCase):
     def test_private_init(self):
         q = Queue()
         q.queue = 'test_private_init'
-        assert not isinstance(q.queue, list)
+        assert not isinstance(q.queue, QueueSchedule)
         q._init(q.maxsize)
-        assert isinstance(q.queue, list)
+        assert isinstance(q.queue, QueueSchedule)
 
     def test_private_qsize(self):
         q = Queue()
@@ -280,6 +288,44 @@ class TestQueue(TestCase):
         assert len(q.queue) == q._qsize()
         assert (after - before).total_seconds() >= wait_seconds
 
+    def test_get_blocking_wakes_on_retry_expiry(self):
+        q = Queue()
+        qi = QueueItem(tevent().json)
+        qi.attempt()
+        qi.last_attempt -= timedelta(seconds=1.95)
+        q.put_item(qi)
+
+        before = datetime.utcnow()
+        assert q.get(True, 5) == qi
+        assert (datetime.utcnow() - before).total_seconds() < 1
+
+    @pytest.mark.slow
+    def test_get_blocking_forever_wakes_on_retry_expiry(self):
+        q = Queue()
+        qi = QueueItem(tevent().json)
+        qi.attempt()
+        qi.last_attempt -= timedelta(seconds=1.9)
+        q.put_item(qi)
+
+        before = datetime.utcnow()
+        assert q.get(True) == qi
+        assert (datetime.utcnow() - before).total_seconds() < 1
+
+    def test_private_wait_time(self):
+        q = Queue()
+        assert q._wait_time() is None
+        assert q._wait_time(5) == 5
+
+        qi = QueueItem(tevent().json)
+        qi.attempt()
+        q.put_item(qi)
+        assert 1 < q._wait_time() <= 2
+        assert q._wait_time(.5) == .5
+
+        qi.last_attempt -= timedelta(seconds=10)
+        q.queue.requeue()
+        assert q._wait_time() == 0
+
     def test_get_blocking_timeout_neg(self):
         q = Queue()
         with pytest.raises(ValueError) as excinfo:
@@ -316,6 +362,393 @@ class TestQueue(TestCase):
             if q._qsize() == 0:
                 break
 
+    def test_bytes(self):
+        q = Queue()
+        assert q.bytes == 0
+        q.put('abc')
+        q.put(u'de')
+        q.put(tevent())
+        q.put_head(None)
+        assert q.bytes == 5
+
+        q.get(False)
+        assert q.bytes == 5
+        item = q.get(False)
+        assert q.bytes == 2
+        item.attempt()
+        q.put_item(item)
+        assert q.bytes == 5
+
+        q.clear()
+        assert q.bytes == 0
+
+    def test_offer(self):
+        q = Queue()
+        qi = q.offer('abc')
+        assert isinstance(qi, QueueItem)
+        assert len(q.queue) == 0
+        assert len(q) == 1 and not q.empty()
+
+        assert q.get(False) is qi
+        assert q.unfinished_tasks == 1
+        assert q.bytes == 0
+        q.task_done(qi)
+        assert q.unfinished_tasks == 0
+
+    def test_enqueued(self):
+        q = Queue()
+        q.offer('a')
+        q.put('b')
+        q.put_head('head')
+        q.put_tail('tail')
+        assert q.enqueued == 2
+
+        # Retried items were counted when first put
+        item = q.get(False)
+        item.attempt()
+        q.put_item(item)
+        assert q.enqueued == 2
+
+    def test_offer_order(self):
+        q = Queue()
+        q.offer('a')
+        q.put_tail('tail')
+        q.offer('b')
+        q.put('c')
+        q.put_head('head')
+        got = [q.get(False).payload for i in range(5)]
+        assert got == ['head', 'a', 'b', 'c', 'tail']
+
+    def test_offer_stat_reset_clear(self):
+        q = Queue()
+        q.offer('a')
+        assert q.stat().size == 1
+        q.offer('b')
+        q.reset()
+        assert len(q.queue) == 2
+        q.offer('c')
+        q.clear()
+        assert len(q) == 0 and q.unfinished_tasks == 0
+
+    def test_offer_bounded(self):
+        q = Queue(max_size=1, overflow_policy='drop_newest')
+        assert q.offer('a') is not None
+        assert q.offer('b') is None
+        assert q.shed['drop_newest'] == 1
+        assert len(q.queue) == 1
+
+    def test_offer_wakes_get(self):
+        q = Queue()
+        sleep_delta = timedelta(0, 0, 0, 50)
+
+        @defer(duration=sleep_delta)
+        def deferred():
+            q.offer('a')
+
+        before = time.time()
+        deferred()
+        assert q.get(True, 5).payload == 'a'
+        assert time.time() - before < 2
+        assert q._waiters == 0
+
+    def test_offer_threads(self):
+        q = Queue()
+        got = []
+
+        def offer(n):
+            for i in range(500):
+                q.offer((n, i))
+
+        def get():
+            while len(got) < 4000:
+                try:
+                    got.append(q.get(True, 5).payload)
+                except Empty:
+                    return
+
+        consumer = threading.Thread(target=get)
+        consumer.start()
+        producers = [threading.Thread(target=offer, args=(n,)) for n in range(8)]
+        map(lambda t: t.start(), producers)
+        map(lambda t: t.join(), producers)
+        consumer.join()
+
+        assert len(got) == 4000
+        for n in range(8):
+            assert [i for (m, i) in got if m == n] == range(500)
+
+
+@pytest.mark.queue
+@pytest.mark.queue_schedule
+class TestQueueSchedule(TestCase):
+
+    def test_repr(self):
+        schedule = QueueSchedule()
+        assert str(schedule) == 'QueueSchedule(head=0, ready=0, retry=0, tail=0)'
+
+    def test_order(self):
+        schedule = QueueSchedule()
+        tail_item = TailQueueItem()
+        retry_item = QueueItem('retry')
+        retry_item.attempt()
+        retry_item.last_attempt -= timedelta(seconds=2)
+        ready_items = [QueueItem('ready'), QueueItem('ready')]
+        head_item = HeadQueueItem()
+
+        for item in [tail_item, ready_items[0], retry_item, ready_items[1], head_item]:
+            schedule.append(item)
+        assert len(schedule) == 5
+        assert schedule[0] == head_item
+        assert schedule[-1] == tail_item
+
+        expect = [head_item] + ready_items + [retry_item, tail_item]
+        for item in expect:
+            assert schedule.popleft() == item
+        assert schedule.popleft() is None
+        assert len(schedule) == 0
+
+    def test_retry_ordered_by_expiry(self):
+        schedule = QueueSchedule()
+        items = [QueueItem(i) for i in range(5)]
+
+        for (index, seconds) in enumerate([7, 9, 5, 10, 8]):
+            items[index].attempt()
+            items[index].last_attempt -= timedelta(seconds=seconds)
+            schedule.append(items[index])
+        expect = [items[i] for i in [3, 1, 4, 0, 2]]
+        assert [schedule.popleft() for item in items] == expect
+        assert schedule.popleft() is None
+
+    def test_retry_not_expired(self):
+        schedule = QueueSchedule()
+        item = QueueItem('retry')
+        item.attempt()
+        schedule.append(item)
+        assert schedule.popleft() is None
+        assert len(schedule) == 1
+
+    def test_attempted_in_ready(self):
+        schedule = QueueSchedule()
+        items = [QueueItem(i) for i in range(3)]
+        for item in items:
+            schedule.append(item)
+        items[0].attempt()
+        assert schedule.popleft() == items[1]
+        assert len(schedule.retry) == 1
+        assert len(schedule) == 2
+
+    def test_evict(self):
+        schedule = QueueSchedule()
+        items = [QueueItem(i) for i in range(4)]
+        items[0].attempt()
+        head, tail = HeadQueueItem(), TailQueueItem()
+        for item in items + [head, tail]:
+            schedule.append(item)
+
+        assert schedule.evict(lambda item: item.payload == 3) is items[3]
+        assert schedule.evict(lambda item: item.payload == 0) is items[0]
+        assert schedule.evict(lambda item: False) is None
+        assert schedule.evict() is items[1]
+        assert schedule.evict() is items[2]
+        assert schedule.evict() is None
+        assert list(schedule) == [head, tail]
+
+    def test_requeue(self):
+        schedule = QueueSchedule()
+        item = QueueItem('retry')
+        item.attempt()
+        schedule.append(item)
+        item.reset()
+        schedule.requeue()
+        assert len(schedule.ready) == 1
+        assert schedule.popleft() == item
+
+    def test_clear(self):
+        schedule = QueueSchedule()
+        for item in [HeadQueueItem(), QueueItem(1), TailQueueItem()]:
+            schedule.append(item)
+        schedule.clear()
+        assert len(schedule) == 0
+        assert list(schedule) == []
+
+
+@pytest.mark.queue
+@pytest.mark.queue_overflow
+class TestQueueOverflow(TestCase):
+
+    def test_init(self):
+        q = Queue()
+        assert q.overflow_policy == Queue.OVERFLOW_POLICY == 'block'
+        assert len(q.shed) == 0
+
+        for policy in Queue.overflow_policies:
+            assert Queue(overflow_policy=policy).overflow_policy == policy
+        with pytest.raises(ValueError):
+            Queue(overflow_policy='unknown')
+
+    def test_unbounded(self):
+        for policy in Queue.overflow_policies:
+            q = Queue(overflow_policy=policy)
+            for i in range(100):
+                assert q.put(i) is not None
+            assert len(q) == 100
+            assert len(q.shed) == 0
+
+    def test_block(self):
+        q = Queue(max_size=2)
+        q.put(0)
+        q.put(1)
+
+        start = time.time()
+        assert q.put(2, True, .05) is None
+        assert time.time() - start < 1
+        assert q.put(3, False) is None
+        assert q.shed['block'] == 2
+        assert [q.get(False).payload for i in range(2)] == [0, 1]
+
+    def test_drop_newest(self):
+        q = Queue(max_size=2, overflow_policy='drop_newest')
+        for i in range(5):
+            q.put(i)
+
+        assert len(q) == 2
+        assert q.shed['drop_newest'] == 3
+        assert [q.get(False).payload for i in range(2)] == [0, 1]
+
+    def test_drop_oldest(self):
+        q = Queue(max_size=2, overflow_policy='drop_oldest')
+        for i in range(5):
+            assert q.put(i).payload == i
+
+        assert len(q) == 2
+        assert q.unfinished_tasks == 2
+        assert q.bytes == 0
+        assert q.shed['drop_oldest'] == 3
+        assert [q.get(False).payload for i in range(2)] == [3, 4]
+
+    def test_drop_oldest_retry(self):
+        q = Queue(max_size=2, overflow_policy='drop_oldest')
+        for i in range(2):
+            item = QueueItem(i)
+            item.attempt()
+            q.put_item(item)
+        q.put(2)
+
+        assert len(q) == 2
+        assert sorted(item.payload for item in q.queue) == [1, 2]
+
+    def test_drop_priority(self):
+        q = Queue(max_size=3, overflow_policy='drop_priority')
+        q.put(tevent(name='a.open', tid='1').json)
+        q.put(tevent(name='a.enter', tid='2').json)
+        q.put(tevent(name='a.b').json)
+
+        # Sheddable items are dropped when the queue is full
+        assert q.put(tevent(name='a.exit', tid='3').json) is None
+
+        # Others evict the oldest sheddable item, then the oldest item
+        assert q.put(tevent(name='a.close', tid='4').json) is not None
+        assert q.put(tevent(name='a.c').json) is not None
+
+        assert len(q) == 3
+        assert q.shed['drop_priority'] == 3
+        got = [Event.from_json(q.get(False).payload).name for i in range(3)]
+        assert got == ['a.b', 'a.close', 'a.c']
+
+    def test_drop_priority_pairs(self):
+        q = Queue(max_size=3, overflow_policy='drop_priority')
+        q.put(tevent(name='a.open', tid='1').json)
+        q.put(tevent(name='a.b').json)
+        q.put(tevent(name='a.close', tid='1').json)
+
+        # Evicting the open event evicts its queued close event with it
+        assert q.put(tevent(name='a.c').json) is not None
+        assert len(q) == 2
+        assert q.shed['drop_priority'] == 2
+
+        # Dropping an exit event evicts its queued enter event
+        q.put(tevent(name='a.enter', tid='2'))
+        assert q.put(tevent(name='a.exit', tid='2')) is None
+        assert len(q) == 2
+        assert q.unfinished_tasks == 2
+        assert q.shed['drop_priority'] == 4
+
+        got = [Event.from_json(q.get(False).payload).name for i in range(2)]
+        assert got == ['a.b', 'a.c']
+
+    def test_drop_priority_unpaired(self):
+        q = Queue(max_size=2, overflow_policy='drop_priority')
+        q.put(tevent(name='a.open', tid='1').json)
+        q.put(tevent(name='b.close', tid='1').json)
+        q.put(tevent(name='a.c').json)
+
+        assert q.shed['drop_priority'] == 1
+        got = [Event.from_json(q.get(False).payload).name for i in range(2)]
+        assert got == ['b.close', 'a.c']
+
+    def test_drop_priority_events(self):
+        q = Queue(max_size=1, overflow_policy='drop_priority')
+        q.put(tevent(name='exit'))
+        q.put(tevent(name='a.close'))
+        assert q.get(False).payload.name == 'a.close'
+
+    def test_sample(self):
+        q = Queue(max_size=10, overflow_policy='sample')
+        for i in range(1000):
+            q.put(i)
+
+        assert len(q) == 10
+        assert q.unfinished_tasks == 10
+        assert q.shed['sample'] == 990
+        got = [q.get(False).payload for i in range(10)]
+        assert got == sorted(got)
+        assert max(got) >= 10
+
+    def test_admits_attempted_and_control_items(self):
+        for policy in Queue.overflow_policies:
+            q = Queue(max_size=1, overflow_policy=policy)
+            q.put(0)
+            item = QueueItem(1)
+            item.attempt()
+            q.put_item(item)
+            q.put_head(2)
+            q.put_tail(3)
+            assert len(q) == 4
+            assert len(q.shed) == 0
+
+
+@pytest.mark.slow
+@pytest.mark.queue
+@pytest.mark.queue_benchmark
+class TestQueueBenchmark(TestCase):
+    """Get latency should stay flat as the number of backed-off items grows."""
+    depths = [1000, 10000, 100000]
+    gets = 1000
+
+    def get_latency(self, depth):
+        q = Queue()
+
+        # A collector outage, every item is backed off and can't be retried
+        for i in range(depth):
+            item = QueueItem(i)
+            item.attempt()
+            q.queue.append(item)
+        for i in range(self.gets):
+            q.queue.append(QueueItem(i))
+
+        start = time.time()
+        for i in range(self.gets):
+            q.get(False)
+        return (time.time() - start) / self.gets
+
+    def test_get_latency_flat(self):
+        latencies = [self.get_latency(depth) for depth in self.depths]
+
+        for (depth, latency) in zip(self.depths, latencies):
+            print('Queue.get latency at depth {0}: {1:.2f}us'.format(
+                depth, latency * 1000000))
+        assert latencies[-1] < max(latencies[0] * 10, .0001)
+
 
 @pytest.mark.queue
 @pytest.mark.queue_stat
@@ -472,3 +905,304 @@ class TestTailQueueItem(TestCase):
 
             if item == tail_item:
                 assert q._qsize() == 0
+
+
+def spill_payloads(count, prefix='item'):
+    return ['{0}-{1}'.format(prefix, i) for i in range(count)]
+
+
+def spill_segments(spill_dir):
+    return sorted(name for name in os.listdir(spill_dir) if name.endswith('.log'))
+
+
+def drain_queue(q, ack=True):
+    payloads = []
+    while True:
+        try:
+            item = q.get(False)
+        except Empty:
+            return payloads
+        payloads.append(item.payload)
+        if ack:
+            q.task_done(item)
+
+
+@pytest.mark.queue
+@pytest.mark.spill_queue
+class TestSpillQueue(TestCase):
+
+    def test_init(self, spill_dir):
+        q = SpillQueue(directory=spill_dir)
+        assert q.directory == spill_dir
+        assert q.memory_size == SpillQueue.MEMORY_SIZE
+        assert q.segment_size == SpillQueue.SEGMENT_SIZE
+        assert str(q).startswith('SpillQueue(size=0, spilled=0,')
+
+    def test_init_directory_required(self):
+        restore = conf.spill_dir
+
+        try:
+            conf.spill_dir = ''
+            with pytest.raises(ValueError):
+                SpillQueue()
+        finally:
+            conf.spill_dir = restore
+
+    def test_init_conf_directory(self, spill_dir):
+        restore = conf.spill_dir
+
+        try:
+            conf.spill_dir = os.path.join(spill_dir, 'conf')
+            q = SpillQueue()
+            assert q.directory == conf.spill_dir
+            assert os.path.isdir(conf.spill_dir)
+        finally:
+            conf.spill_dir = restore
+
+    def test_spill(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        payloads = spill_payloads(10)
+        for payload in payloads:
+            q.put(payload)
+
+        assert len(q) == 10
+        assert len(q.queue) == 3
+        assert q._spilled == 7
+        assert len(spill_segments(spill_dir)) == 1
+        assert drain_queue(q) == payloads
+        assert len(q) == 0
+        assert spill_segments(spill_dir) == []
+
+    def test_spill_offer(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        payloads = spill_payloads(10)
+        for payload in payloads:
+            q.offer(payload)
+
+        assert len(q.queue) == 3
+        assert q._spilled == 7
+        assert drain_queue(q) == payloads
+
+    def test_spill_keeps_order(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        payloads = spill_payloads(20)
+        got = []
+
+        # Room made in memory does not let new items pass the spilled ones
+        for payload in payloads[:10]:
+            q.put(payload)
+        got.append(q.get(False).payload)
+        for payload in payloads[10:]:
+            q.put(payload)
+        got.extend(drain_queue(q, ack=False))
+        assert got == payloads
+
+    def test_spill_memory_only(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        q.put('a')
+        q.put(dict(payload='b'))
+        q.put_tail('c')
+        item = QueueItem('d')
+        item.attempt()
+        q.put_item(item)
+        assert q._spilled == 0
+        assert len(q.queue) == 4
+
+    def test_spill_unicode(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        q.put('a')
+        q.put(u'\xe9')
+        assert drain_queue(q) == ['a', u'\xe9'.encode('utf-8')]
+
+    def test_segment_rotation(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1, segment_size=30)
+        payloads = spill_payloads(10)
+        for payload in payloads:
+            q.put(payload)
+
+        assert len(spill_segments(spill_dir)) > 2
+        assert drain_queue(q) == payloads
+        assert spill_segments(spill_dir) == []
+
+    def test_ack_removes_segment(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        for payload in spill_payloads(4):
+            q.put(payload)
+
+        items = [q.get(False) for i in range(4)]
+        assert len(spill_segments(spill_dir)) == 1
+        for item in items[:-1]:
+            q.task_done(item)
+        assert len(spill_segments(spill_dir)) == 1
+        q.task_done(items[-1])
+        assert spill_segments(spill_dir) == []
+
+    def test_ack_after_retry(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        for payload in spill_payloads(2):
+            q.put(payload)
+        q.task_done(q.get(False))
+
+        # A returned item is only acknowledged once it leaves the queue
+        item = q.get(False)
+        q.put_item(item)
+        q.task_done(item)
+        assert len(spill_segments(spill_dir)) == 1
+        item = q.get(False)
+        q.task_done(item)
+        assert spill_segments(spill_dir) == []
+
+    def test_replay(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        payloads = spill_payloads(10)
+        for payload in payloads:
+            q.put(payload)
+
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        assert len(q) == 7
+        assert drain_queue(q) == payloads[3:]
+        assert spill_segments(spill_dir) == []
+
+    def test_replay_unacknowledged(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+        assert drain_queue(q, ack=False) == payloads
+
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        assert drain_queue(q) == payloads[1:]
+
+    def test_replay_truncated(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+
+        path = os.path.join(spill_dir, spill_segments(spill_dir)[0])
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        assert drain_queue(q) == payloads[1:-1]
+
+    def test_replay_checksum(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+
+        path = os.path.join(spill_dir, spill_segments(spill_dir)[0])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            f.seek(data.index('item-3'))
+            f.write('xtem-3')
+
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        assert drain_queue(q) == payloads[1:3]
+
+    def test_bytes(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+        assert q.bytes == 30
+        q.get(False)
+        assert q.bytes == 24
+
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        assert q.bytes == 18
+        drain_queue(q)
+        assert q.bytes == 0
+
+    def test_bytes_corrupt(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+
+        path = os.path.join(spill_dir, spill_segments(spill_dir)[0])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            f.seek(data.index('item-3'))
+            f.write('xtem-3')
+        assert drain_queue(q) == payloads[:3]
+        assert q.bytes == 0
+
+    def test_persist(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        payloads = spill_payloads(6)
+        for payload in payloads:
+            q.put(payload)
+        q.put_head(Queue.MAX_SIZE)
+
+        assert q.persist() == 3
+        assert len(q.queue) == 1
+        assert len(q) == 7
+        assert len(spill_segments(spill_dir)) == 2
+
+        # Persisted items are read before the spilled ones
+        q = SpillQueue(directory=spill_dir, memory_size=3)
+        assert drain_queue(q) == payloads
+        assert spill_segments(spill_dir) == []
+
+    def test_persist_acknowledges_copies(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        payloads = spill_payloads(4)
+        for payload in payloads:
+            q.put(payload)
+        q.task_done(q.get(False))
+        q.task_done(q.get(False))
+        item = q.get(False)
+
+        # Only items held in memory are persisted
+        assert q.persist() == 1
+        assert drain_queue(q) == payloads[3:]
+        assert len(spill_segments(spill_dir)) == 1
+        q.task_done(item)
+        assert spill_segments(spill_dir) == []
+
+    def test_persist_empty(self, spill_dir):
+        q = SpillQueue(directory=spill_dir)
+        assert q.persist() == 0
+        assert Queue().persist() == 0
+
+    def test_clear(self, spill_dir):
+        q = SpillQueue(directory=spill_dir, memory_size=1)
+        for payload in spill_payloads(4):
+            q.put(payload)
+        q.get(False)
+        item = q.get(False)
+        q.clear()
+
+        assert len(q) == 0
+        assert spill_segments(spill_dir) == []
+        assert item.segment.removed
+
+    def test_transport(self, spill_dir):
+        adapter = ListAdapter()
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        t = Transport(adapter, queue=q, worker_class=Worker)
+        payloads = spill_payloads(10)
+        for payload in payloads:
+            q.put(payload)
+
+        t.start()
+        t.flush(timedelta(seconds=5))
+        assert [record.json for record in adapter] == payloads
+        assert spill_segments(spill_dir) == []
+
+    def test_transport_persists_on_stop(self, spill_dir):
+        class TAdapter(ListAdapter):
+            def emit(self, event):
+                raise AdapterEmitError
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        t = Transport(TAdapter(), queue=q, worker_class=Worker)
+        payloads = spill_payloads(5)
+        for payload in payloads:
+            q.put(payload)
+        t.start()
+        t.stop(timedelta())
+
+        q = SpillQueue(directory=spill_dir, memory_size=2)
+        assert sorted(drain_queue(q)) == payloads
@@ -0,0 +1,119 @@
+import pytest
+import threading
+from uuid import UUID, uuid5, NAMESPACE_DNS, NAMESPACE_URL
+from emit import tids
+from emit.tids import EntropyPool, TidGenerator, Uuid7TidGenerator, Uuid5TidGenerator
+from emit.utils import Called
+from ..helpers import TestCase
+
+
+@pytest.mark.tids
+@pytest.mark.entropy_pool
+class TestEntropyPool(TestCase):
+
+    def test_init(self):
+        pool = EntropyPool()
+        assert pool.size == 4096
+        assert repr(pool) == 'EntropyPool(size=4096)'
+
+        with pytest.raises(ValueError):
+            EntropyPool(0)
+
+    def test_read(self):
+        restore = tids.os.urandom
+
+        try:
+            tids.os.urandom = Called(restore)
+            pool = EntropyPool(16)
+            got = [pool.read(4) for i in range(8)]
+            assert all(len(b) == 4 for b in got)
+            assert len(tids.os.urandom) == 2
+            assert len(pool.read(32)) == 32
+            assert len(tids.os.urandom) == 3
+        finally:
+            tids.os.urandom = restore
+
+
+@pytest.mark.tids
+@pytest.mark.tid_generator
+class TestTidGenerator(TestCase):
+
+    def test_call(self):
+        generator = TidGenerator()
+        got = generator()
+        assert UUID(got).version == 4
+        assert got != generator()
+        assert str(generator) == 'TidGenerator()'
+
+    def test_uuid7(self):
+        generator = Uuid7TidGenerator()
+        got = [generator() for i in range(10000)]
+        assert got == sorted(got)
+        assert len(set(got)) == len(got)
+
+        for tid in got[:10]:
+            assert len(tid) == 36
+            assert UUID(tid).version == 7
+            assert UUID(tid).variant == 'specified in RFC 4122'
+
+    def test_uuid7_time(self):
+        restore = tids.time.time
+
+        try:
+            tids.time.time = lambda: 1451606400.0
+            generator = Uuid7TidGenerator()
+            assert int(generator().replace('-', '')[:12], 16) == 1451606400000
+        finally:
+            tids.time.time = restore
+
+    def test_uuid7_counter_overflow(self):
+        restore = tids.time.time
+
+        try:
+            tids.time.time = lambda: 1451606400.0
+            generator = Uuid7TidGenerator()
+            got = [generator() for i in range(5000)]
+            assert got == sorted(got)
+            assert len(set(got)) == len(got)
+            assert int(got[-1].replace('-', '')[:12], 16) > 1451606400000
+
+            # Clock moving backwards still increments
+            tids.time.time = lambda: 1451606300.0
+            assert generator() > got[-1]
+        finally:
+            tids.time.time = restore
+
+    def test_uuid7_threads(self):
+        generator = Uuid7TidGenerator()
+        got = []
+
+        def gen():
+            got.extend([generator() for i in range(2000)])
+
+        threads = [threading.Thread(target=gen) for i in range(4)]
+        map(lambda t: t.start(), threads)
+        map(lambda t: t.join(), threads)
+        assert len(set(got)) == 8000
+
+    def test_uuid5(self):
+        generator = Uuid5TidGenerator()
+        assert generator('a') == str(uuid5(NAMESPACE_URL, 'a'))
+        assert generator('a') == generator('a')
+        assert generator(u'a') == generator('a')
+        assert generator(u'\xe9') == str(uuid5(NAMESPACE_URL, u'\xe9'.encode('utf-8')))
+        assert repr(generator) == 'Uuid5TidGenerator(namespace={0})'.format(NAMESPACE_URL)
+
+    def test_uuid5_namespace(self):
+        for namespace in [NAMESPACE_DNS, str(NAMESPACE_DNS)]:
+            generator = Uuid5TidGenerator(namespace)
+            assert generator('a') == str(uuid5(NAMESPACE_DNS, 'a'))
+
+    def test_uuid5_cache(self):
+        generator = Uuid5TidGenerator(maxsize=2)
+        for name in ['a', 'b', 'c', 'a']:
+            assert generator(name) == str(uuid5(NAMESPACE_URL, name))
+        assert len(generator.cache) == 2
+
+    def test_uuid5_fallback(self):
+        assert UUID(Uuid5TidGenerator()()).version == 7
+        assert Uuid5TidGenerator(fallback=lambda: 'tid')() == 'tid'
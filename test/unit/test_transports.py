@@ -1,15 +1,21 @@
 import pytest
+import os
 import threading
 from time import sleep
 from datetime import datetime, timedelta
-from emit import queue
+from emit import queue, transports
 from emit.decorators import defer, delay
 from emit.transports import (
-    Transport, Worker, Group, ThreadedWorker, WorkerError, WorkerStoppedError)
+    Transport, Worker, Group, ThreadedWorker, ProcessWorker, WorkerPool, WorkerError,
+    WorkerStoppedError)
 from emit.queue import Queue
+from emit.metrics import Registry
 from emit.utils import Called
+from emit.emitters import Emitter
+from emit.event import Event, EventRecord, EventStack
 from emit.adapters import (
-    Adapter, ListAdapter, AdapterEmitError, AdapterClosedError, AdapterEmitPermanentError)
+    Adapter, ListAdapter, FileAdapter, ProcessAdapter, AdapterEmitError, AdapterClosedError,
+    AdapterEmitPermanentError)
 from ..helpers import (
     TestCase, tevent, tjson)
 
@@ -162,6 +168,56 @@ class TestCaseWorker(TestCase):
             assert len(w.q) == 1
             assert item.attempts == 1
 
+    def test_process_item_metrics(self, w):
+        with w.adapter:
+            w.process_item(queue.QueueItem(tjson()))
+            w.process_item(queue.QueueItem(AdapterEmitError))
+            w.process_item(queue.QueueItem(AdapterEmitPermanentError))
+            w.process_item(queue.QueueItem(tevent(name='')))
+            with pytest.raises(AdapterClosedError):
+                w.process_item(queue.QueueItem(AdapterClosedError))
+
+        assert w.metrics is w.t.metrics
+        snapshot = w.metrics.snapshot()
+        assert snapshot['delivered'] == 1
+        assert snapshot['retried'] == 2
+        assert snapshot['failed'] == 2
+        assert snapshot['delivery_seconds']['count'] == 1
+        assert snapshot['emit_seconds']['count'] == 4
+
+    def test_process_item_encodes_event(self, w):
+        event = tevent()
+        item = queue.QueueItem(event)
+
+        with w.adapter:
+            w.process_item(item)
+            assert w.adapter == [event.json]
+            assert item.payload == event.json
+
+    def test_process_item_encodes_event_record(self, w):
+        record = EventRecord.from_event(tevent())
+        item = queue.QueueItem(record)
+
+        with w.adapter:
+            w.process_item(item)
+            assert w.adapter == [record.json]
+            assert item.payload == record.json
+
+    # encode_item
+    def test_encode_item(self, w):
+        event = tevent()
+        item = queue.QueueItem(event)
+        assert w.encode_item(item) is True
+        assert item.payload == event.json
+        assert w.encode_item(item) is True
+        assert item.payload == event.json
+
+    def test_encode_item_invalid(self, w, logs):
+        item = queue.QueueItem(tevent(name=''))
+        assert w.encode_item(item) is False
+        assert logs.pop().getMessage().startswith(
+            'TransportWorker.encode_item - dropping invalid event')
+
     # check_adapter
     def test_check_adapter_opens_when_closed_if_queue_exists(self, w):
         assert w.adapter.closed is True
@@ -318,6 +374,122 @@ class TestCaseWorker(TestCase):
             assert item.attempts == 1
             assert w.adapter.closed is True
 
+    # fetch_items
+    def test_fetch_items_single_by_default(self, w):
+        expect = [tjson(), tjson()]
+        for event_json in expect:
+            w.q.put(event_json, True, None)
+        items = w.fetch_items()
+        assert [item.payload for item in items] == expect[:1]
+        assert len(w.q) == 1
+
+    def test_fetch_items_max_batch_size(self, w):
+        w.t.max_batch_size = 3
+        expect = [tjson() for i in range(5)]
+        for event_json in expect:
+            w.q.put(event_json, True, None)
+        assert [item.payload for item in w.fetch_items()] == expect[:3]
+        assert [item.payload for item in w.fetch_items()] == expect[3:]
+        with pytest.raises(queue.Empty):
+            w.fetch_items()
+
+    def test_fetch_items_adapter_batch_size(self, w):
+        w.adapter.batch_size = 3
+        expect = [tjson() for i in range(5)]
+        for event_json in expect:
+            w.q.put(event_json, True, None)
+        assert [item.payload for item in w.fetch_items()] == expect[:3]
+
+        # The transport max_batch_size takes precedence
+        w.t.max_batch_size = 2
+        w.q.put(tjson(), True, None)
+        assert [item.payload for item in w.fetch_items()] == expect[3:]
+
+    def test_fetch_items_max_batch_bytes(self, w):
+        expect = [tjson() for i in range(5)]
+        w.t.max_batch_size = 10
+        w.t.max_batch_bytes = len(expect[0]) + 1
+        for event_json in expect:
+            w.q.put(event_json, True, None)
+        assert len(w.fetch_items()) == 2
+        assert len(w.q) == 3
+
+    def test_fetch_items_max_batch_linger(self, w):
+        w.t.max_batch_size = 3
+        w.t.max_batch_linger = TDM * 20
+        expect = [tjson(), tjson()]
+        w.q.put(expect[0], True, None)
+        threading.Timer(
+            (TDM * 5).total_seconds(), w.q.put, args=(expect[1], True, None)).start()
+
+        now = datetime.utcnow()
+        items = w.fetch_items()
+        assert [item.payload for item in items] == expect
+        assert (datetime.utcnow() - now) >= TDM * 20
+
+    # process_batch
+    def test_process_batch_outcomes(self, w):
+        expect = [tjson(), tjson()]
+        items = [
+            queue.QueueItem(expect[0]), queue.QueueItem(AdapterEmitError),
+            queue.QueueItem(AdapterEmitPermanentError), queue.QueueItem(expect[1])]
+
+        with w.adapter:
+            w.process_batch(items)
+            assert w.adapter == expect
+            assert len(w.q) == 1
+            assert w.q.queue[0] is items[1]
+            assert [item.attempts for item in items] == [0, 1, 1, 0]
+
+    def test_process_batch_metrics(self, w):
+        items = [
+            queue.QueueItem(tjson()), queue.QueueItem(AdapterEmitError),
+            queue.QueueItem(AdapterEmitPermanentError), queue.QueueItem(tevent(name=''))]
+
+        with w.adapter:
+            w.process_batch(items)
+        snapshot = w.metrics.snapshot()
+        assert snapshot['delivered'] == 1
+        assert snapshot['retried'] == 1
+        assert snapshot['failed'] == 2
+        assert snapshot['delivery_seconds']['count'] == 1
+        assert snapshot['emit_seconds']['count'] == 1
+
+    def test_process_batch_encodes_events(self, w):
+        events = [tevent(), tevent(name=''), tevent()]
+        items = [queue.QueueItem(event) for event in events]
+
+        with w.adapter:
+            w.process_batch(items)
+            assert w.adapter == [events[0].json, events[2].json]
+            assert len(w.q) == 0
+
+    def test_process_batch_adapter_closed_error(self, w):
+        expect = tjson()
+        items = [
+            queue.QueueItem(expect), queue.QueueItem(AdapterClosedError),
+            queue.QueueItem(tjson())]
+
+        with w.adapter:
+            with pytest.raises(AdapterClosedError):
+                w.process_batch(items)
+            assert w.adapter == [expect]
+            assert len(w.q) == 2
+            assert items[2].attempts == 1
+
+    def test_process_queue_batches(self, w):
+        w.t.max_batch_size = 3
+        expect = [tjson() for i in range(5)]
+        for event_json in expect:
+            w.q.put(event_json, True, None)
+
+        w.process_queue(TDS)
+        assert w.adapter == expect[:3]
+        w.process_queue(TDS)
+        assert w.adapter == expect
+        assert len(w.q) == 0
+        assert w.q.unfinished_tasks == 0
+
     # work
     def test_work(self, w):
         expect_json = tjson()
@@ -484,6 +656,35 @@ class TestCaseThreadedWorker(TestCase):
         with pytest.raises(WorkerStoppedError):
             w.work(TDM)
 
+    def test_work_after_run_returns(self, w):
+        w.start()
+        assert w._live is True
+        w.halt()
+        assert w._live is False
+        with pytest.raises(WorkerStoppedError):
+            w.work(TDM)
+
+    def test_work_after_fork(self):
+        t = Transport(ListAdapter(), worker_class=ThreadedWorker)
+        t.emit(tjson(name='parent'))
+        eventually(lambda: t.metrics['delivered'].value == 1, _eventually_delta=TDS)
+        worker = t.worker
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                t.emit(tjson(name='child1'))
+                t.emit(tjson(name='child2'))
+                t.stop()
+                if worker._live is False and t.metrics['delivered'].value == 3:
+                    code = 0
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert worker._live is True
+        t.stop()
+
     def test_halt_no_started(self, w):
         with pytest.raises(WorkerStoppedError):
             w.halt()
@@ -498,6 +699,35 @@ class TestCaseThreadedWorker(TestCase):
         assert w.is_alive()
         w.flush(TDM)
 
+    def test_fetch_item_idle_waits_without_timeout(self, w):
+        calls = []
+        get = w.q.get
+
+        def recording_get(block=True, timeout=None):
+            calls.append((block, timeout))
+            return get(block, timeout)
+        w.q.get = recording_get
+
+        w.start()
+        eventually(lambda: (True, None) in calls)
+        w.stop(TDM * 20)
+        assert all(timeout is None for (block, timeout) in calls if block)
+
+    def test_fetch_item_flushes_on_idle(self, w):
+        event_json = tjson()
+        w.q.put(event_json)
+        w._flush_pending = True
+
+        # Items ready are returned without flushing
+        assert w.fetch_item().payload == event_json
+        assert w._flush_pending is True
+
+        # Stopping caps the wait at max_work_time
+        w._stopping.set()
+        with pytest.raises(queue.Empty):
+            w.fetch_item()
+        assert w._flush_pending is False
+
     def test_check_flush_error(self, w):
         w.start()
         w._flush_pending = True
@@ -571,6 +801,39 @@ class TestCaseThreadedWorker(TestCase):
             lambda: not w.is_alive(),
             _eventually_delta=TDM*100)
 
+    @pytest.mark.slow
+    def test_stop_batched(self, w):
+        w.t.max_batch_size = 3
+        events_json = [tjson() for i in range(7)]
+
+        for event_json in events_json:
+            w.q.put(event_json, True, None)
+
+        w.start()
+        w.stop(TDM * 20)
+        eventually(
+            check_delivered, w, events_json,
+            expect_flushed=True, _eventually_delta=TDM*40)
+        eventually(
+            lambda: not w.is_alive(),
+            _eventually_delta=TDM*60)
+
+    def test_process_batch_sentinels(self, w):
+        expect = tjson()
+        items = [
+            queue.QueueItem(expect),
+            queue.QueueItem(w.FlushWorker()),
+            queue.QueueItem(w.HaltWorker()),
+            queue.QueueItem(tjson())]
+
+        with w.adapter:
+            w.process_batch(items)
+            assert w._flush_pending is True
+            assert w._halting.isSet()
+            assert len(w.adapter) == 0
+            assert len(w.q) == 2
+            assert w.q.get(False).payload == expect
+
     @pytest.mark.slow
     def test_halt(self, w):
         events_json = [tjson() for i in range(5)]
@@ -623,34 +886,286 @@ class TestCaseThreadedWorker(TestCase):
         assert 5 == len([expect_str in log.getMessage() for log in logs])
         assert there_can_only_be_one()
 
-    @pytest.mark.slow
-    def test_halt_when_main_thread_dead(self, w):
-        '''
-        @TODO: Not sure how to mock this.
-
-        def set_is_alive(to):
-            for t in threading.enumerate():
-                if isinstance(t, threading._MainThread):
-                    was = t.is_alive
-                    t.is_alive = to
-                    return was
+    def test_check_orphaned_registers(self, w):
+        w.start()
+        eventually(lambda: transports._workers.workers.get(w.t) is w)
+        assert transports._workers.watchdog.daemon is True
 
+        w.stop(TDM * 20)
+        assert w.t not in transports._workers.workers
+
+        # Once stopping another worker may take over the transport
+        twin = ThreadedWorker(w.t)
+        assert transports._workers.register(twin) is True
+        transports._workers.unregister(twin)
+
+    def test_register_after_fork(self, w):
+        registry = transports._WorkerRegistry()
+        assert registry.register(w) is True
+        watchdog = registry.watchdog
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                twin = ThreadedWorker(w.t)
+                if registry.register(twin) and registry.workers == {w.t: twin} and \
+                        registry.watchdog is not watchdog and registry.watchdog.is_alive():
+                    code = 0
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert registry.workers == {w.t: w}
+
+    def test_halt_when_main_thread_dead(self, w, logs):
         events_json = [tjson() for i in range(5)]
         for event_json in events_json:
             w.q.put(event_json, True, None)
 
         w.start()
-        try:
-            restore = set_is_alive(lambda: False)
-            eventually(w._stopping.isSet)
-            eventually(w._halting.isSet)
-            eventually(
-                lambda: not w.is_alive(),
-                _eventually_delta=TDS*5)
-        finally:
-            set_is_alive(restore)
-        '''
-        pass
+        eventually(lambda: w.t in transports._workers.workers)
+        transports._workers.main_thread_exited()
+        eventually(
+            check_delivered, w, events_json,
+            expect_flushed=True, _eventually_delta=TDS)
+        eventually(w._halting.isSet, _eventually_delta=TDS)
+        eventually(lambda: not w.is_alive(), _eventually_delta=TDS)
+
+        expect_str = 'main thread has died, flushing queue'
+        assert any(expect_str in log.getMessage() for log in logs)
+
+    def test_watch_without_main_thread(self, w):
+        registry = transports._WorkerRegistry()
+        registry.workers[w.t] = w
+        registry.watch(None)
+        assert len(w.q) == 0
+
+
+@pytest.mark.process_worker
+class TestCaseProcessWorker(TestCase):
+
+    def test__init__(self):
+        adapter = ListAdapter()
+        w = ProcessWorker(Transport(adapter))
+        assert isinstance(w.adapter, ProcessAdapter)
+        assert w.adapter.adapter is adapter
+        assert w.adapter.closed is True
+
+    def test_transport(self, spill_dir):
+        path = os.path.join(spill_dir, 'events')
+        t = Transport(
+            lambda: FileAdapter(path, 'a'), worker_class=ProcessWorker, max_batch_size=10)
+        expect = ['event-{0}'.format(i) for i in range(50)]
+
+        with t:
+            w = t.worker
+            for payload in expect:
+                t.emit(payload)
+
+        # The child closes the file once the worker stops
+        assert not w.is_alive()
+        assert w.adapter.process is None
+        assert t.metrics['delivered'].value == 50
+        with open(path) as f:
+            assert f.read().splitlines() == expect
+
+
+@pytest.mark.worker_pool
+class TestCaseWorkerPool(TestCase):
+
+    def transport(self, **kwargs):
+        kwargs.setdefault('worker_pool_size', 3)
+        return Transport(ListAdapter(), worker_class=WorkerPool, **kwargs)
+
+    def delivered(self, t, workers):
+        return sum(len(w.adapter) for w in workers)
+
+    def test__init__(self):
+        t = self.transport()
+        w = WorkerPool(t)
+        assert w.size == 3
+        assert len(w.workers) == len(w.partitions) == len(w.queues) == 3
+        assert all(isinstance(worker, ThreadedWorker) for worker in w.workers)
+        assert len(set(id(q) for q in w.queues + [t.queue])) == 4
+        assert len(set(id(worker.adapter) for worker in w.workers + [t])) == 4
+        assert str(w).startswith('WorkerPool(size=3, transport=')
+
+        with pytest.raises(ValueError):
+            WorkerPool(self.transport(worker_pool_size=0))
+
+    def test__init__worker_class(self):
+        w = WorkerPool(self.transport(), worker_class=ProcessWorker)
+        assert all(isinstance(worker, ProcessWorker) for worker in w.workers)
+        assert all(isinstance(worker.adapter, ProcessAdapter) for worker in w.workers)
+
+        class TWorkerPool(WorkerPool):
+            worker_class = ProcessWorker
+
+        w = TWorkerPool(self.transport())
+        assert all(isinstance(worker, ProcessWorker) for worker in w.workers)
+
+    def test_partition_queues(self):
+        class TQueue(Queue):
+            pass
+
+        t = self.transport(queue_class=TQueue, max_queue_size=5, overflow_policy='drop_newest')
+        w = WorkerPool(t)
+        for q in w.queues:
+            assert isinstance(q, TQueue)
+            assert q.maxsize == 5
+            assert q.overflow_policy == 'drop_newest'
+
+    def test_partition_spill_queues(self, spill_dir):
+        t = self.transport(queue=queue.SpillQueue(directory=spill_dir), queue_class=queue.SpillQueue)
+        w = WorkerPool(t)
+        assert sorted(q.directory for q in w.queues) == [
+            os.path.join(spill_dir, 'partition-{0}'.format(i)) for i in range(3)]
+
+    def test_partition_view(self):
+        t = self.transport(max_batch_size=7)
+        w = WorkerPool(t)
+        for worker in w.workers:
+            assert worker.t.max_batch_size == 7
+            assert worker.metrics is t.metrics
+            assert worker.q is not t.queue
+
+    def test_partition(self):
+        w = WorkerPool(self.transport())
+        for tid in ['a', 'b', 'c', u'\xe9']:
+            index = w.partition(tjson(tid=tid))
+            assert index == w.partition(tevent(tid=tid))
+            assert index == w.partition(tjson(tid=tid))
+
+        # Items without a tid take turns
+        got = [w.partition(None) for i in range(6)]
+        assert sorted(got) == [0, 0, 1, 1, 2, 2]
+
+    def test_distribute(self):
+        t = self.transport()
+        w = WorkerPool(t)
+        expect = dict((tid, [tjson(tid=tid, name='n{0}'.format(i)) for i in range(5)])
+                      for tid in ['a', 'b', 'c', 'd'])
+        for i in range(5):
+            for tid in sorted(expect):
+                t.queue.put(expect[tid][i])
+
+        assert w.distribute() == 20
+        assert len(t.queue) == 0
+        assert t.queue.unfinished_tasks == 0
+        assert t.metrics['queue_depth'].value == 0
+
+        t.worker = w
+        assert t.metrics['queue_depth'].value == 20
+        assert t.metrics['enqueued'].value == 20
+        for tid in expect:
+            q = w.queues[w.partition(expect[tid][0])]
+            assert [item.payload for item in q.queue if item.payload in expect[tid]] == expect[tid]
+
+    def test_offer(self):
+        t = self.transport()
+        w = WorkerPool(t)
+        for tid in ['a', 'b', 'c', 'd']:
+            payload = tjson(tid=tid)
+            item = w.offer(payload)
+            assert w.queues[w.partition(payload)].get(False) is item
+        assert len(t.queue) == 0
+
+    def test_reclaim(self):
+        t = self.transport()
+        w = WorkerPool(t)
+        for i in range(10):
+            t.queue.put(tjson(tid=str(i)))
+        w.distribute()
+        w.reclaim()
+        assert len(t.queue) == 10
+        assert t.queue.unfinished_tasks == 10
+        assert sum(len(q) for q in w.queues) == 0
+
+    def test_metrics_survive_stop(self):
+        t = self.transport(max_queue_size=1, overflow_policy='drop_newest')
+        w = WorkerPool(t)
+        t.worker = w
+        for i in range(6):
+            w.offer(tjson(tid='a'))
+        assert t.metrics['enqueued'].value == 1
+        assert t.metrics['dropped'].value == 5
+
+        # Counts move to the transport with the reclaimed items
+        w.reclaim()
+        t.worker = None
+        assert len(t.queue) == 1
+        assert t.retired == dict(enqueued=1, dropped=5)
+        assert t.metrics['enqueued'].value == 1
+        assert t.metrics['dropped'].value == 5
+
+        t.max_queue_size = 0
+        with t:
+            for i in range(3):
+                t.emit(tjson(tid=str(i)))
+        assert t.metrics['enqueued'].value == 4
+        assert t.metrics['dropped'].value == 5
+
+    def test_emit_keeps_tid_order(self):
+        t = self.transport()
+        tids = [str(i) for i in range(12)]
+        expect = [tjson(tid=tid, name='n{0}'.format(i)) for i in range(10) for tid in tids]
+        with t:
+            workers = t.worker.workers
+            for event_json in expect:
+                t.emit(event_json)
+
+        assert self.delivered(t, workers) == len(expect)
+        for tid in tids:
+            want = [e for e in expect if '"tid": "{0}"'.format(tid) in e]
+            got = [[r.json for r in w.adapter if r.json in want] for w in workers]
+            assert sorted(got, key=len)[-1] == want
+            assert sum(len(records) for records in got) == len(want)
+        assert sum(len(set(tid for tid in tids if any(
+            '"tid": "{0}"'.format(tid) in r.json for r in w.adapter)))
+            for w in workers) == len(tids)
+
+    def test_flush(self):
+        t = self.transport()
+        t.start()
+        workers = t.worker.workers
+        for i in range(6):
+            t.emit(tjson(tid=str(i)))
+        t.flush()
+
+        eventually(lambda: self.delivered(t, workers) == 6, _eventually_delta=TDS)
+        eventually(lambda: all(
+            r.flushed for w in workers for r in w.adapter), _eventually_delta=TDS)
+        t.stop()
+        assert not any(w.is_alive() for w in workers)
+
+    def test_halt(self):
+        t = self.transport()
+        t.start()
+        pool = t.worker
+        t.halt()
+        assert t.worker is None
+        assert not any(w.is_alive() for w in pool.workers)
+
+    def test_stop_when_stopped(self):
+        w = WorkerPool(self.transport())
+        with pytest.raises(WorkerStoppedError):
+            w.stop(TDM)
+        with pytest.raises(WorkerStoppedError):
+            w.halt()
+        with pytest.raises(WorkerStoppedError):
+            w.work(TDM)
+
+    def test_stop_persists_leftovers(self):
+        t = self.transport()
+        w = WorkerPool(t)
+        t.queue.persist = Called(lambda: 0)
+        for i in range(3):
+            t.queue.put(tjson(tid=str(i)))
+
+        with pytest.raises(WorkerStoppedError):
+            w.stop(TDM)
+        assert len(t.queue) == 3
+        assert len(t.queue.persist) == 1
 
 
 @pytest.mark.transport
@@ -677,10 +1192,16 @@ class TestTransport(TestCase):
             'adapter_class': self.TAdapter,
             'worker_class': self.TWorker,
             'queue_class': self.TQueue,
-            'max_queue_size': timedelta(1),
+            'max_queue_size': 1,
             'max_flush_time': timedelta(2),
             'max_work_time': timedelta(3),
-            'max_stopping_time': timedelta(4)}
+            'max_stopping_time': timedelta(4),
+            'max_batch_size': 5,
+            'max_batch_bytes': 6,
+            'max_batch_linger': timedelta(7),
+            'max_block_time': timedelta(8),
+            'overflow_policy': 'drop_oldest',
+            'worker_pool_size': 9}
 
         for case in cases:
             kwargs = dict()
@@ -719,11 +1240,58 @@ class TestTransport(TestCase):
         assert_transport(t)
         assert t.queue == queue
 
+    def test__init__kwargs_metrics(self):
+        metrics = Registry(prefix='app')
+        t = Transport(metrics=metrics)
+        assert t.metrics is metrics
+        assert 'delivered' in metrics
+
     def test__init__kwargs_queue_class(self):
         t = Transport(queue_class=self.TQueue)
         assert_transport(t)
         assert isinstance(t.queue, self.TQueue)
 
+    def test__init__queue_overflow(self):
+        t = Transport()
+        assert t.queue.maxsize == 0
+        assert t.queue.overflow_policy == 'block'
+
+        t = Transport(max_queue_size=5, overflow_policy='drop_priority')
+        assert t.queue.maxsize == 5
+        assert t.queue.overflow_policy == 'drop_priority'
+
+    def test_emit_full_queue_bounded(self):
+        t = Transport(
+            ListAdapter(), worker_class=Worker, max_queue_size=1,
+            max_block_time=timedelta(seconds=.05))
+        t.queue.put(tevent().json)
+
+        start = datetime.utcnow()
+        t.emit(tevent().json)
+        assert datetime.utcnow() - start < timedelta(seconds=1)
+        assert t.queue.shed['block'] == 1
+
+    def test_metrics(self):
+        t = Transport(ListAdapter(), worker_class=Worker, max_queue_size=2,
+                      overflow_policy='drop_newest')
+        t.queue.put('abc')
+        t.queue.put('de')
+        assert t.metrics['queue_depth'].value == 2
+        assert t.metrics['queue_bytes'].value == 5
+
+        # Dropped by the full queue, then the worker delivers the others
+        t.emit('fgh')
+        assert t.metrics['enqueued'].value == 2
+        assert t.metrics['dropped'].value == 1
+
+        t.emit('ij')
+        snapshot = t.metrics.snapshot()
+        assert snapshot['enqueued'] == 3
+        assert snapshot['delivered'] == 3
+        assert snapshot['queue_depth'] == snapshot['queue_bytes'] == 0
+        assert 0 <= snapshot['delivery_seconds']['max'] < 1
+        assert 'emit_delivered_total 3' in t.metrics.prometheus().splitlines()
+
     def test_start(self, t):
         assert_transport(t)
         assert t.running is False
@@ -838,6 +1406,23 @@ class TestTransport(TestCase):
         t.emit(tjson())
         assert t.running is False
 
+    def test_emit_deferred_event_record(self):
+        t = Transport(ListAdapter(), worker_class=ThreadedWorker)
+        emitted = []
+        emitter = Emitter(
+            transport=t, event_class=EventRecord, event_stack=EventStack(),
+            defer_serialization=True, callbacks=[emitted.append], system='system',
+            component='component', operation='operation')
+
+        with t:
+            emitter.emit('name', tid='tid')
+            worker = t.worker
+            eventually(lambda: len(worker.adapter) == 1)
+        assert isinstance(emitted[0], EventRecord)
+
+        got = Event.from_json(worker.adapter[0].json)
+        assert (got.name, got.tid, got.system) == ('name', 'tid', 'system')
+
     def test_flush(self, t):
         assert_transport(t)
         assert t.running is False
@@ -1,9 +1,11 @@
 import pytest
+import threading
 from datetime import datetime, timedelta
 from time import sleep
+from emit import utils
 from emit.utils import (
-    Backoff, Tracker, Called, _debug_assert, _is_string, _is_value,
-    _timeout_seconds, _timeout_delta)
+    Backoff, Tracker, Called, LruCache, _debug_assert, _is_string, _is_value,
+    _is_date, _time_format, _time_parse, _timeout_seconds, _timeout_delta)
 from emit.globals import conf
 from ..helpers import TestCase
 
@@ -60,6 +62,127 @@ class TestUtilFunctions(TestCase):
             for test in tests:
                 assert _is_value(test) == expect
 
+    def test_is_value_does_not_parse_dates(self):
+        restore = utils.parse
+
+        try:
+            utils.parse = Called()
+            for test in ['a', u'a', '2016-01-01', 'Jan 1 2016', '', u'']:
+                _is_value(test)
+            assert len(utils.parse) == 0
+        finally:
+            utils.parse = restore
+
+    def test_is_date(self):
+        cases = {
+            True: [
+                datetime.utcnow(), '2016-01-01T00:00:00Z', '2016-01-01T00:00:00.123456Z',
+                '2016-01-01 23:59:59+05:30', u'2016-02-29t00:00:00-01:00',
+                '2016-01-01', 'Jan 1 2016', '2016-01-01T00:00:00'],
+            False: [
+                None, 1, [], 'foo', '2015-02-29T00:00:00Z', '2016-13-01T00:00:00Z',
+                '2016-01-01T24:00:00Z']}
+
+        for expect, tests in cases.iteritems():
+            for test in tests:
+                assert _is_date(test) == expect, test
+
+    def test_is_date_rfc3339_does_not_parse(self):
+        restore = utils.parse
+
+        try:
+            utils.parse = Called()
+            assert _is_date('2016-01-01T00:00:00.123Z')
+            assert _is_date('2016-01-01T00:00:00+00:00')
+            assert len(utils.parse) == 0
+        finally:
+            utils.parse = restore
+
+    def test_is_date_memoized(self):
+        restore = utils.parse
+        value = 'Jan 2 2016 test_is_date_memoized'
+
+        try:
+            utils.parse = Called(restore)
+            for i in range(3):
+                assert _is_date(value) is False
+                assert _is_date('Jan 2 2016') is True
+            assert len(utils.parse) <= 2
+        finally:
+            utils.parse = restore
+
+    def test_time_format(self):
+        cases = [
+            datetime.utcnow(), datetime(2016, 1, 1), datetime(2016, 1, 1, 0, 0, 0, 1),
+            datetime(2016, 12, 31, 23, 59, 59, 999999), datetime(999, 1, 1, 1, 1, 1, 10)]
+
+        for test in cases:
+            assert _time_format(test) == test.isoformat('T') + 'Z'
+
+    def test_time_parse(self):
+        cases = [
+            datetime.utcnow(), datetime(2016, 1, 1), datetime(2016, 1, 1, 0, 0, 0, 1),
+            datetime(2016, 12, 31, 23, 59, 59, 999999), datetime(2016, 2, 29, 12)]
+        restore = utils.parse
+
+        try:
+            utils.parse = Called()
+            for test in cases:
+                assert _time_parse(_time_format(test)) == test
+                assert _time_parse(unicode(_time_format(test))) == test
+            assert len(utils.parse) == 0
+        finally:
+            utils.parse = restore
+
+    def test_time_parse_rfc3339(self):
+        cases = {
+            '2016-01-01T00:00:00.123Z': datetime(2016, 1, 1, 0, 0, 0, 123000),
+            '2016-01-01T00:00:00.1234567Z': None,
+            '2016-01-01t00:00:00.1z': datetime(2016, 1, 1, 0, 0, 0, 100000),
+            '2016-01-01 00:00:00.000001Z': datetime(2016, 1, 1, 0, 0, 0, 1),
+            '2016-01-01T05:30:00+05:30': datetime(2016, 1, 1, 5, 30),
+            u'2016-02-29T23:59:59-01:00': datetime(2016, 2, 29, 23, 59, 59)}
+        restore = utils.parse
+
+        try:
+            utils.parse = Called(restore)
+            for test, expect in cases.iteritems():
+                if expect is not None:
+                    assert _time_parse(test) == expect, test
+            assert len(utils.parse) == 0
+
+            # Fractions past microseconds are left to dateutil
+            _time_parse('2016-01-01T00:00:00.1234567Z')
+            assert len(utils.parse) == 1
+        finally:
+            utils.parse = restore
+
+    def test_time_parse_other_formats(self):
+        cases = {
+            '2016-01-01 00:00:00': datetime(2016, 1, 1),
+            '2016-01-01': datetime(2016, 1, 1),
+            'Jan 1 2016': datetime(2016, 1, 1)}
+
+        for test, expect in cases.iteritems():
+            assert _time_parse(test) == expect, test
+
+    def test_time_parse_invalid(self):
+        for test in ['foo', '2015-02-29T00:00:00Z', '2016-13-01T00:00:00.000000Z']:
+            with pytest.raises(ValueError):
+                _time_parse(test)
+
+    def test_time_parse_bounded(self):
+        restore = utils._time_seconds_size
+
+        try:
+            utils._time_seconds_size = 2
+            utils._time_seconds.clear()
+            for i in range(5):
+                assert _time_parse('2001-01-01T00:00:0{}Z'.format(i)).second == i
+                assert len(utils._time_seconds) <= 2
+        finally:
+            utils._time_seconds_size = restore
+
     def test_debug_assert_on(self):
         restore = conf.debug
 
@@ -428,3 +551,59 @@ class TestCalled(TestCase):
             args, kwargs = call
             assert args[0] == 'foo'
             assert kwargs['bar'] == 'foo'
+
+
+@pytest.mark.utils
+@pytest.mark.utils_lru_cache
+class TestLruCache(TestCase):
+
+    def test_init(self):
+        cache = LruCache()
+        assert cache.maxsize == 1024
+        assert len(cache) == 0
+        assert repr(cache) == 'LruCache(size=0, maxsize=1024)'
+
+    def test_init_maxsize_is_zero(self):
+        with pytest.raises(ValueError):
+            LruCache(0)
+
+    def test_get_put(self):
+        cache = LruCache(2)
+        assert cache.get('a') is None
+        assert cache.get('a', False) is False
+        cache.put('a', 1)
+        assert 'a' in cache
+        assert cache.get('a') == 1
+        cache.put('a', 2)
+        assert cache.get('a') == 2
+        assert len(cache) == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert len(cache) == 2
+        assert 'a' in cache
+        assert not ('b' in cache)
+        assert 'c' in cache
+
+    def test_clear(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_threads(self):
+        cache = LruCache(64)
+
+        def fill(offset):
+            for i in range(1000):
+                cache.put(offset + (i % 100), i)
+                cache.get(offset + (i % 50))
+
+        threads = [threading.Thread(target=fill, args=(i * 1000,)) for i in range(4)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert len(cache) == 64